@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+近似最近邻索引的召回率与延迟基准测试
+
+默认使用带簇结构的合成向量；指定--catalog时改用本地目录中电影的真实向量。
+对每个nprobe取值，报告recall@k（与暴力检索结果的重合比例）和单次查询延迟，
+再测试增量插入后的召回率和通过内存映射重新打开索引的耗时。
+
+用法:
+    python benchmarks/bench_ann.py --size 100000 --dim 64
+    python benchmarks/bench_ann.py --catalog data/catalog.db
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.ann import IVFIndex, MovieEmbedder, normalize_rows
+from utils.catalog import MovieCatalog
+
+
+def synthetic_vectors(size: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    """生成围绕若干个随机中心分布的归一化向量"""
+    rng = np.random.default_rng(seed)
+    centers = normalize_rows(rng.standard_normal((clusters, dim)))
+    assignment = rng.integers(0, clusters, size)
+    return normalize_rows(centers[assignment] + 1.4 * rng.standard_normal((size, dim)) / np.sqrt(dim))
+
+
+def catalog_vectors(db_path: str, dim: int):
+    """为本地目录中的电影计算向量"""
+    catalog = MovieCatalog(db_path)
+    embedder = MovieEmbedder(dim)
+    embedder.fit(catalog.iter_movies())
+    return embedder.embed(catalog.iter_movies())
+
+
+def evaluate(index: IVFIndex, queries: np.ndarray, k: int, nprobe_values) -> None:
+    """打印各nprobe下的召回率和延迟"""
+    exact = []
+    start = time.perf_counter()
+    for query in queries:
+        exact.append(set(index.search_exact(query, k)[0].tolist()))
+    exact_ms = (time.perf_counter() - start) / len(queries) * 1000
+    print(f"  {'暴力检索':<10} recall@{k}=1.000  {exact_ms:8.3f} ms/查询")
+
+    for nprobe in nprobe_values:
+        if nprobe > index.meta["nlist"]:
+            break
+        hits = 0
+        latencies = []
+        for query, truth in zip(queries, exact):
+            start = time.perf_counter()
+            ids, _ = index.search(query, k, nprobe=nprobe)
+            latencies.append(time.perf_counter() - start)
+            hits += len(truth.intersection(ids.tolist()))
+        recall = hits / (len(queries) * k)
+        p50 = np.percentile(latencies, 50) * 1000
+        p95 = np.percentile(latencies, 95) * 1000
+        print(f"  nprobe={nprobe:<4} recall@{k}={recall:.3f}  p50 {p50:7.3f} ms  p95 {p95:7.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="近似最近邻索引基准测试")
+    parser.add_argument("--catalog", help="使用本地目录（SQLite路径）中电影的向量")
+    parser.add_argument("--size", type=int, default=100000, help="合成向量数")
+    parser.add_argument("--dim", type=int, default=64, help="向量维度")
+    parser.add_argument("--clusters", type=int, default=500, help="合成数据的簇数")
+    parser.add_argument("--nlist", type=int, help="索引簇数，默认约为4×sqrt(n)")
+    parser.add_argument("--queries", type=int, default=200, help="查询数")
+    parser.add_argument("-k", type=int, default=10, help="每次返回的结果数")
+    parser.add_argument("--insert-ratio", type=float, default=0.05, help="增量插入的比例")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.catalog:
+        ids, vectors = catalog_vectors(args.catalog, args.dim)
+        print(f"目录向量: {len(ids)} 部电影，{args.dim} 维")
+    else:
+        vectors = synthetic_vectors(args.size, args.dim, args.clusters, args.seed)
+        ids = np.arange(1, len(vectors) + 1, dtype=np.int64)
+        print(f"合成向量: {len(ids)} 个，{args.dim} 维，{args.clusters} 个簇")
+    if len(ids) == 0:
+        print("没有可用的向量")
+        return
+
+    rng = np.random.default_rng(args.seed + 1)
+    inserted = rng.random(len(ids)) < args.insert_ratio
+    queries = vectors[rng.choice(len(vectors), min(args.queries, len(vectors)), replace=False)]
+    nprobe_values = (1, 2, 4, 8, 16, 32, 64)
+
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        index = IVFIndex.build(ids[~inserted], vectors[~inserted], directory, nlist=args.nlist, seed=args.seed)
+        print(f"\n构建: {time.perf_counter() - start:.2f} 秒，{index.meta['nlist']} 个簇，{len(index)} 个向量")
+        evaluate(index, queries, args.k, nprobe_values)
+
+        # 增量插入剩余向量，并把一部分已有向量替换为扰动后的新版本
+        updated = np.flatnonzero(~inserted)[:max(1, int(inserted.sum() // 4))]
+        new_ids = np.concatenate([ids[inserted], ids[updated]])
+        new_vectors = np.concatenate([
+            vectors[inserted],
+            normalize_rows(vectors[updated] + 0.05 * rng.standard_normal((len(updated), args.dim)))
+        ])
+        start = time.perf_counter()
+        for offset in range(0, len(new_ids), 1000):
+            index.add(new_ids[offset:offset + 1000], new_vectors[offset:offset + 1000])
+        print(f"\n增量插入 {len(new_ids)} 个向量（含 {len(updated)} 个更新）: "
+              f"{time.perf_counter() - start:.2f} 秒，增量段 {len(index.snapshot().delta_ids)} 个，共 {len(index)} 个向量")
+        evaluate(index, queries, args.k, nprobe_values)
+
+        start = time.perf_counter()
+        reopened = IVFIndex(directory)
+        reopened.search(queries[0], args.k)
+        print(f"\n内存映射重新打开并首次查询: {(time.perf_counter() - start) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+推荐引擎调用模式基准测试
+
+在本地模拟TMDB服务器上重放推荐引擎的真实调用模式（心情推荐 + 时长过滤、
+个性化推荐、观影统计），不需要网络和API密钥。
+
+用法:
+    python benchmarks/bench_recommender.py --latency 0.08 --jitter 0.03
+    python benchmarks/bench_recommender.py --fixtures data/fixtures --no-synthetic
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.api import TMDBApi
+from utils.cache import ResponseCache
+from utils.mock_server import MockTMDBServer
+from utils.recommend import MovieRecommender
+from utils.runtime_index import RuntimeIndex
+
+
+def run_scenarios(recommender: MovieRecommender, rounds: int) -> dict:
+    """依次运行各调用场景，返回每个场景的耗时（秒）"""
+    timings = {}
+
+    def timed(name, func):
+        start = time.perf_counter()
+        func()
+        timings.setdefault(name, []).append(time.perf_counter() - start)
+
+    for _ in range(rounds):
+        for mood in recommender.MOOD_TO_GENRES:
+            timed("mood", lambda: recommender.get_recommendations_by_mood(mood))
+            timed("mood+duration", lambda: recommender.get_recommendations_by_mood(mood, "超长"))
+        timed("personalized", lambda: recommender.get_personalized_recommendations())
+        timed("viewing_stats", lambda: recommender.get_viewing_stats())
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="推荐引擎调用模式基准测试")
+    parser.add_argument("--fixtures", help="夹具目录")
+    parser.add_argument("--no-synthetic", action="store_true", help="只使用夹具")
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟网络延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.02, help="延迟抖动（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="500错误注入概率")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="429注入概率")
+    parser.add_argument("--rounds", type=int, default=2, help="重复轮数（第二轮起可观察缓存效果）")
+    args = parser.parse_args()
+
+    with MockTMDBServer(
+        fixtures_dir=args.fixtures,
+        synthetic=not args.no_synthetic,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate
+    ) as server, tempfile.TemporaryDirectory() as tmp_dir:
+        api = TMDBApi(
+            "benchmark", base_url=server.base_url, cache=ResponseCache(),
+            runtime_index=RuntimeIndex(None), rate_limit=1000, rate_burst=100
+        )
+        recommender = MovieRecommender(api, user_data_path=os.path.join(tmp_dir, "user_data.json"))
+
+        # 构造一些观影记录，让个性化推荐和统计页走完整路径
+        seed_ids = [movie.id for movie in api.get_trending_movies()["results"][:12]]
+        for index, movie_id in enumerate(seed_ids):
+            recommender.add_watched_movie(movie_id, liked=index % 3 != 0)
+
+        start = time.perf_counter()
+        timings = run_scenarios(recommender, args.rounds)
+        total = time.perf_counter() - start
+
+        print(f"{'场景':<16}{'次数':>6}{'平均(ms)':>12}{'最大(ms)':>12}")
+        for name, values in timings.items():
+            print(f"{name:<16}{len(values):>6}{sum(values) / len(values) * 1000:>12.1f}{max(values) * 1000:>12.1f}")
+        print(f"\n总耗时: {total:.2f}s")
+        print(f"服务器请求: {server.stats}")
+        print(f"各终端请求数: {server.endpoint_counts}")
+        print(f"缓存: {api.get_cache_stats()}")
+        print(f"请求合并: {TMDBApi.get_coalescing_stats()}")
+        print(f"限流: {api.get_rate_limit_stats()}")
+        print(f"解码: {api.get_decode_stats()}")
+
+
+if __name__ == "__main__":
+    main()
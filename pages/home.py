@@ -93,8 +93,9 @@ def set_duration(duration):
     
 def show_movie_details(movie_id):
     try:
-        details = st.session_state.tmdb_api.get_movie_details(movie_id)
-        st.session_state.movie_details = details
+        # 首页的详情只显示片长、类型和简介，不需要演职人员
+        bundle = st.session_state.tmdb_api.get_movie_bundle(movie_id, parts=["recommendations"], projection="core")
+        st.session_state.movie_details = bundle['details']
     except Exception as e:
         st.error(f"获取电影详情时出错: {e}")
         
@@ -103,7 +104,7 @@ def mark_as_watched(movie_id, liked=None):
     # 刷新推荐
     get_recommendations()
     # 如果在详情页，关闭它
-    if st.session_state.movie_details and st.session_state.movie_details.get('id') == movie_id:
+    if st.session_state.movie_details and st.session_state.movie_details.id == movie_id:
         st.session_state.movie_details = None
         
 def get_recommendations():
@@ -220,56 +221,53 @@ def show_movie_detail_page():
     col1, col2 = st.columns([1, 2])
     
     with col1:
-        if movie.get('poster_path'):
-            st.image(st.session_state.tmdb_api.get_image_url(movie['poster_path']), width=300)
-        else:
-            st.image("https://via.placeholder.com/300x450?text=No+Image", width=300)
+        poster = st.session_state.tmdb_api.get_poster_html(movie.poster_path, 300, alt=movie.title, lazy=False)
+        st.markdown(poster, unsafe_allow_html=True)
     
     with col2:
-        st.markdown(f"<h1>{movie['title']}</h1>", unsafe_allow_html=True)
+        st.markdown(f"<h1>{movie.title}</h1>", unsafe_allow_html=True)
         
         # 发行日期和时长
-        release_date = movie.get('release_date', '未知')
-        runtime = movie.get('runtime', 0)
+        release_date = movie.release_date or '未知'
+        runtime = movie.runtime
         hours, minutes = divmod(runtime, 60)
         runtime_str = f"{hours}小时{minutes}分钟" if hours > 0 else f"{minutes}分钟"
         
-        st.markdown(f"**发行日期**: {release_date} | **时长**: {runtime_str} | **评分**: {movie['vote_average']}/10")
+        st.markdown(f"**发行日期**: {release_date} | **时长**: {runtime_str} | **评分**: {movie.vote_average}/10")
         
         # 类型
-        genres = [genre['name'] for genre in movie.get('genres', [])]
+        genres = [genre.name for genre in movie.genres]
         st.markdown(f"**类型**: {', '.join(genres)}")
         
         # 简介
         st.markdown("### 简介")
-        st.markdown(movie.get('overview', '暂无简介'))
+        st.markdown(movie.overview or '暂无简介')
         
         # 评价按钮
         col1, col2, col3 = st.columns(3)
         with col1:
             if st.button("👍 喜欢", key="like_detail"):
-                mark_as_watched(movie['id'], True)
+                mark_as_watched(movie.id, True)
                 st.success("已添加到你喜欢的电影！")
                 time.sleep(1)
                 st.rerun()
         with col2:
             if st.button("👎 不喜欢", key="dislike_detail"):
-                mark_as_watched(movie['id'], False)
+                mark_as_watched(movie.id, False)
                 st.success("已记录你的评价！")
                 time.sleep(1)
                 st.rerun()
         with col3:
             if st.button("🕒 稍后再看", key="watch_later"):
-                mark_as_watched(movie['id'])
+                mark_as_watched(movie.id)
                 st.success("已添加到稍后再看！")
                 time.sleep(1)
                 st.rerun()
     
-    # 相似电影推荐
+    # 相似电影推荐（优先使用本地相似度索引，否则使用打开详情页时随详情一起缓存的推荐）
     st.markdown("### 相似电影推荐")
     try:
-        similar = st.session_state.tmdb_api.get_recommended_movies(movie['id'])
-        display_movie_grid(similar['results'][:6])
+        display_movie_grid(st.session_state.recommender.get_similar_movies(movie.id, 6))
     except Exception as e:
         st.error(f"获取相似电影时出错: {e}")
 
@@ -285,34 +283,33 @@ def display_movie_grid(movies, cols=3):
         
         for j, movie in enumerate(row_movies):
             with columns[j]:
-                display_movie_card(movie)
+                # 第一行直接加载，其余海报滚动到附近时才下载
+                display_movie_card(movie, lazy=i > 0)
 
-def display_movie_card(movie):
+def display_movie_card(movie, lazy=True):
     # 卡片容器
     st.markdown(f"<div class='movie-card'>", unsafe_allow_html=True)
     
     # 海报
-    if movie.get('poster_path'):
-        st.image(st.session_state.tmdb_api.get_image_url(movie['poster_path']), width=200)
-    else:
-        st.image("https://via.placeholder.com/200x300?text=No+Image", width=200)
+    poster = st.session_state.tmdb_api.get_poster_html(movie.poster_path, 200, alt=movie.title, lazy=lazy)
+    st.markdown(poster, unsafe_allow_html=True)
     
     # 电影信息
-    st.markdown(f"<p class='movie-title'>{movie['title']}</p>", unsafe_allow_html=True)
+    st.markdown(f"<p class='movie-title'>{movie.title}</p>", unsafe_allow_html=True)
     
     # 评分和发行日期
-    year = movie.get('release_date', '')[:4] if movie.get('release_date') else '未知'
-    st.markdown(f"<p class='movie-info'>⭐ {movie['vote_average']}/10 | {year}</p>", unsafe_allow_html=True)
+    year = movie.year or '未知'
+    st.markdown(f"<p class='movie-info'>⭐ {movie.vote_average}/10 | {year}</p>", unsafe_allow_html=True)
     
     # 简介（截断）
-    overview = movie.get('overview', '暂无简介')
+    overview = movie.overview or '暂无简介'
     if len(overview) > 100:
         overview = overview[:100] + "..."
     st.markdown(f"<p class='movie-overview'>{overview}</p>", unsafe_allow_html=True)
     
     # 按钮
-    if st.button("查看详情", key=f"details_{movie['id']}"):
-        show_movie_details(movie['id'])
+    if st.button("查看详情", key=f"details_{movie.id}"):
+        show_movie_details(movie.id)
         st.rerun()
         
     st.markdown("</div>", unsafe_allow_html=True)
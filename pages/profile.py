@@ -124,10 +124,7 @@ def app():
         
         # 添加海报图片
         def get_poster_html(poster_path):
-            if poster_path:
-                image_url = st.session_state.tmdb_api.get_image_url(poster_path)
-                return f'<img src="{image_url}" width="60">'
-            return '<img src="https://via.placeholder.com/60x90?text=No+Image" width="60">'
+            return st.session_state.tmdb_api.get_poster_html(poster_path, 60)
         
         # 添加状态表情
         def get_status_emoji(status):
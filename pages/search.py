@@ -2,6 +2,9 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime
 import time
+from utils.genres import GenreStore
+from utils.query_plan import MovieQuery, QueryPlan
+from utils.search_index import SearchIndex
 
 def app():
     # 页面配置
@@ -15,13 +18,6 @@ def app():
     if 'search_history' not in st.session_state:
         st.session_state.search_history = []
         
-    if 'search_genres' not in st.session_state:
-        try:
-            genres_response = st.session_state.tmdb_api.get_movie_genres()
-            st.session_state.search_genres = genres_response['genres']
-        except Exception as e:
-            st.error(f"获取电影类型列表失败: {e}")
-            st.session_state.search_genres = []
     
     # 布局：搜索选项卡和高级筛选
     tab1, tab2 = st.tabs(["📝 快速搜索", "⚙️ 高级筛选"])
@@ -54,6 +50,9 @@ def show_basic_search():
                 # 只保留最近10条
                 st.session_state.search_history = st.session_state.search_history[:10]
     
+    # 输入联想：按本地索引列出以当前关键词开头的片名
+    show_suggestions(st.session_state.get("last_query"))
+
     # 显示搜索历史
     if st.session_state.search_history:
         st.markdown("### 最近搜索")
@@ -64,6 +63,22 @@ def show_basic_search():
                 if st.button(term, key=f"history_{i}", use_container_width=True):
                     perform_search(term)
 
+def show_suggestions(query):
+    """显示以关键词开头的电影标题，点击后按该标题搜索"""
+    index = SearchIndex.default() if query else None
+    if index is None:
+        return
+    suggestions = [title for title in index.suggest(query, limit=5) if title != query]
+    if not suggestions:
+        return
+    st.markdown("### 你是不是要找")
+    suggestion_cols = st.columns(len(suggestions))
+
+    for i, title in enumerate(suggestions):
+        with suggestion_cols[i]:
+            if st.button(title, key=f"suggest_{i}", use_container_width=True):
+                perform_search(title)
+
 def show_advanced_search():
     """显示高级搜索界面"""
     with st.form(key="advanced_search_form"):
@@ -87,7 +102,10 @@ def show_advanced_search():
             genre_options = []
             genre_id_map = {}
             
-            for genre in st.session_state.search_genres:
+            # 类型列表来自进程级共享的快照，不需要为每个会话请求TMDB
+            genre_store = GenreStore.default()
+            genre_store.refresh_async(st.session_state.tmdb_api)
+            for genre in genre_store.get_genres():
                 genre_options.append(genre['name'])
                 genre_id_map[genre['name']] = genre['id']
                 
@@ -132,30 +150,16 @@ def show_advanced_search():
         if submit_button:
             with st.spinner("搜索中..."):
                 try:
-                    # 构建发现参数
-                    params = {
-                        "sort_by": sort_by,
-                        "page": 1
-                    }
-                    
-                    if query:
-                        # 如果有关键词，使用搜索API
-                        results = st.session_state.tmdb_api.search_movies(query)
-                    else:
-                        # 否则使用发现API
-                        results = st.session_state.tmdb_api.discover_movies(
-                            genres=genre_ids,
-                            year=year,
-                            sort_by=sort_by
-                        )
-                    
-                    # 过滤评分
-                    filtered_results = []
-                    for movie in results['results']:
-                        if movie['vote_average'] >= min_rating:
-                            if not include_adult and movie.get('adult', False):
-                                continue
-                            filtered_results.append(movie)
+                    # 能交给TMDB的条件放进请求参数，其余条件（如关键词搜索时的类型和评分）在本地过滤
+                    query_filter = MovieQuery(
+                        keyword=query,
+                        genres=genre_ids,
+                        year=year,
+                        min_vote_average=min_rating,
+                        include_adult=include_adult,
+                        sort_by=sort_by
+                    )
+                    filtered_results = QueryPlan.for_query(query_filter).execute(st.session_state.tmdb_api)
                     
                     # 更新结果
                     st.session_state.search_results = filtered_results
@@ -166,14 +170,26 @@ def show_advanced_search():
                 except Exception as e:
                     st.error(f"搜索时出错: {e}")
 
+# 本地索引命中少于该数量时，再请求TMDB补充结果（本地目录可能不全）
+LOCAL_MIN_RESULTS = 5
+
 def perform_search(query):
     """执行搜索并更新结果"""
+    st.session_state.last_query = query
     with st.spinner("搜索中..."):
         try:
-            results = st.session_state.tmdb_api.search_movies(query)
-            st.session_state.search_results = results['results']
+            # 优先使用本地索引（毫秒级且不需要网络），本地结果太少时合并TMDB的搜索结果
+            index = SearchIndex.default()
+            results = index.search(query) if index is not None else []
+            if len(results) < LOCAL_MIN_RESULTS:
+                seen = {movie.id for movie in results}
+                results = results + [
+                    movie for movie in st.session_state.tmdb_api.search_movies(query)['results']
+                    if movie.id not in seen
+                ]
+            st.session_state.search_results = results
             
-            if not results['results']:
+            if not results:
                 st.warning(f"没有找到与 '{query}' 相关的电影")
                 
         except Exception as e:
@@ -207,36 +223,36 @@ def display_movie_grid(movies, cols=3):
         
         for j, movie in enumerate(row_movies):
             with columns[j]:
-                display_movie_card(movie)
+                # 第一行直接加载，其余海报滚动到附近时才下载
+                display_movie_card(movie, lazy=i > 0)
 
-def display_movie_card(movie):
+def display_movie_card(movie, lazy=True):
     """显示单部电影卡片"""
     # 卡片容器
     st.markdown(f"<div class='movie-card'>", unsafe_allow_html=True)
     
     # 海报
-    if movie.get('poster_path'):
-        st.image(st.session_state.tmdb_api.get_image_url(movie['poster_path']), width=200)
-    else:
-        st.image("https://via.placeholder.com/200x300?text=No+Image", width=200)
+    poster = st.session_state.tmdb_api.get_poster_html(movie.poster_path, 200, alt=movie.title, lazy=lazy)
+    st.markdown(poster, unsafe_allow_html=True)
     
     # 电影信息
-    st.markdown(f"<p class='movie-title'>{movie['title']}</p>", unsafe_allow_html=True)
+    st.markdown(f"<p class='movie-title'>{movie.title}</p>", unsafe_allow_html=True)
     
     # 评分和发行日期
-    year = movie.get('release_date', '')[:4] if movie.get('release_date') else '未知'
-    st.markdown(f"<p class='movie-info'>⭐ {movie['vote_average']}/10 | {year}</p>", unsafe_allow_html=True)
+    year = movie.year or '未知'
+    st.markdown(f"<p class='movie-info'>⭐ {movie.vote_average}/10 | {year}</p>", unsafe_allow_html=True)
     
     # 简介（截断）
-    overview = movie.get('overview', '暂无简介')
+    overview = movie.overview or '暂无简介'
     if len(overview) > 100:
         overview = overview[:100] + "..."
     st.markdown(f"<p class='movie-overview'>{overview}</p>", unsafe_allow_html=True)
     
     # 按钮
-    if st.button("查看详情", key=f"search_details_{movie['id']}"):
-        # 跳转到详情页
-        st.session_state.movie_details = st.session_state.tmdb_api.get_movie_details(movie['id'])
+    if st.button("查看详情", key=f"search_details_{movie.id}"):
+        # 跳转到详情页（详情页显示主演和导演）
+        bundle = st.session_state.tmdb_api.get_movie_bundle(movie.id, parts=["recommendations"], projection="credits")
+        st.session_state.movie_details = bundle['details']
         st.rerun()
         
     st.markdown("</div>", unsafe_allow_html=True)
@@ -0,0 +1,713 @@
+import argparse
+import json
+import os
+import threading
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from utils.catalog import MovieCatalog
+from utils.similarity import SimilarityIndex
+
+
+class MovieEmbedder:
+    """把电影转换为定长的稠密向量
+
+    使用与SimilarityIndex相同的稀疏特征，特征名经CRC32散列到固定数量的桶中，
+    再按桶随机（固定种子）投影到dim维并带正负号（特征散列），最后L2归一化。
+    IDF按桶统计并随索引保存，所以增量插入的新电影与已有向量处于同一空间，
+    不受SimilarityIndex每个版本重新编号特征的影响。
+    """
+
+    # 特征散列的桶数
+    HASH_BUCKETS = 1 << 18
+
+    # 每个桶投影到的维度数
+    PROJECTIONS = 2
+
+    def __init__(self, dim: int = 128, idf: Optional[np.ndarray] = None, seed: int = 0):
+        """
+        初始化嵌入器
+
+        参数:
+            dim: 向量维度
+            idf: 按桶的IDF，None表示尚未拟合（全部为1）
+            seed: 投影的随机种子（同一索引必须保持不变）
+        """
+        self.dim = dim
+        self.seed = seed
+        self.idf = idf if idf is not None else np.ones(self.HASH_BUCKETS, dtype=np.float32)
+        rng = np.random.default_rng(seed)
+        self._targets = rng.integers(0, dim, size=(self.HASH_BUCKETS, self.PROJECTIONS), dtype=np.int32)
+        self._signs = rng.choice(np.array([-1.0, 1.0], dtype=np.float32), size=(self.HASH_BUCKETS, self.PROJECTIONS))
+
+    def _hashed(self, movie: Dict) -> Tuple[np.ndarray, np.ndarray]:
+        """一部电影的 (桶号, 权重) 数组"""
+        features = SimilarityIndex.movie_features(movie)
+        buckets = np.fromiter(
+            (zlib.crc32(feature.encode("utf-8")) % self.HASH_BUCKETS for feature in features),
+            dtype=np.int64, count=len(features)
+        )
+        weights = np.fromiter(features.values(), dtype=np.float32, count=len(features))
+        return buckets, weights
+
+    def fit(self, movies: Iterable[Dict]) -> int:
+        """
+        按桶统计文档频率并计算IDF
+
+        参数:
+            movies: MovieCatalog返回的电影字典
+
+        返回:
+            统计的电影数
+        """
+        df = np.zeros(self.HASH_BUCKETS, dtype=np.int64)
+        count = 0
+        for movie in movies:
+            buckets, _ = self._hashed(movie)
+            df[np.unique(buckets)] += 1
+            count += 1
+        self.idf = (np.log((1 + count) / (1 + df)) + 1).astype(np.float32)
+        return count
+
+    def embed(self, movies: Iterable[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        计算向量
+
+        参数:
+            movies: MovieCatalog返回的电影字典
+
+        返回:
+            (电影ID数组, float32向量矩阵)，没有任何特征的电影被跳过
+        """
+        ids: List[int] = []
+        rows: List[np.ndarray] = []
+        buckets: List[np.ndarray] = []
+        weights: List[np.ndarray] = []
+        for movie in movies:
+            movie_buckets, movie_weights = self._hashed(movie)
+            if len(movie_buckets) == 0:
+                continue
+            rows.append(np.full(len(movie_buckets), len(ids), dtype=np.int64))
+            ids.append(movie["id"])
+            buckets.append(movie_buckets)
+            weights.append(movie_weights)
+        if not ids:
+            return np.zeros(0, dtype=np.int64), np.zeros((0, self.dim), dtype=np.float32)
+
+        rows_array = np.concatenate(rows)
+        buckets_array = np.concatenate(buckets)
+        weights_array = np.concatenate(weights) * self.idf[buckets_array]
+        vectors = np.zeros(len(ids) * self.dim, dtype=np.float64)
+        for projection in range(self.PROJECTIONS):
+            flat = rows_array * self.dim + self._targets[buckets_array, projection]
+            vectors += np.bincount(
+                flat, weights=weights_array * self._signs[buckets_array, projection],
+                minlength=len(vectors)
+            )
+        vectors = vectors.reshape(len(ids), self.dim).astype(np.float32)
+        return np.array(ids, dtype=np.int64), normalize_rows(vectors)
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """
+    按行L2归一化（零向量保持为零）
+
+    参数:
+        vectors: 二维矩阵
+
+    返回:
+        float32矩阵
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class _IVFState:
+    """某个提交版本（meta.json）对应的全部数组，创建后不再修改
+
+    查询开始时取一次当前状态并只读它；写入者和refresh构造新状态后在锁内整体替换，
+    查询中途不会看到新旧版本混在一起的数组。
+    """
+
+    def __init__(self, directory: str):
+        """
+        按meta.json打开当前版本
+
+        参数:
+            directory: 索引目录
+        """
+        meta = IVFIndex.read_meta(directory)
+        self.version = IVFIndex.version_of(meta)
+
+        def load(name: str) -> np.ndarray:
+            return np.load(os.path.join(directory, name), mmap_mode="r")
+
+        base, delta = meta["base"], meta["delta"]
+        self.centroids = load(f"{base}.centroids.npy")
+        self.vectors = load(f"{base}.vectors.npy")
+        self.ids = load(f"{base}.ids.npy")
+        self.offsets = load(f"{base}.offsets.npy")
+        # 按ID查找向量用的排序下标（构建时写入；较早构建的索引没有该文件时现场计算）
+        if os.path.exists(os.path.join(directory, f"{base}.id_order.npy")):
+            self.id_order = load(f"{base}.id_order.npy")
+        else:
+            self.id_order = np.argsort(self.ids, kind="stable")
+        if delta:
+            self.delta_vectors = load(f"{delta}.vectors.npy")
+            self.delta_ids = load(f"{delta}.ids.npy")
+            self.delta_lists = load(f"{delta}.lists.npy")
+            self.removed = load(f"{delta}.removed.npy")
+        else:
+            self.delta_vectors = np.zeros((0, meta["dim"]), dtype=np.float32)
+            self.delta_ids = np.zeros(0, dtype=np.int64)
+            self.delta_lists = np.zeros(0, dtype=np.int32)
+            self.removed = np.zeros(0, dtype=np.int64)
+        self.meta = meta
+
+    def __len__(self) -> int:
+        return len(self.ids) - len(self.removed) + len(self.delta_ids)
+
+
+class IVFIndex:
+    """倒排文件（IVF）近似最近邻索引，按内积（归一化向量即余弦）检索
+
+    构建时用球面k-means把向量分成nlist个簇，每个簇的向量连续存放；
+    查询时只扫描与查询最接近的nprobe个簇，nprobe越大召回越高、耗时越长。
+
+    增量插入的向量写入单独的增量段（同样按簇分配），被更新的旧向量记入删除列表；
+    增量段过大时合并进基础段（不重新训练簇中心）。所有数组保存为.npy文件并通过内存映射打开，
+    meta.json是唯一的提交点：写入者先写新文件再原子替换meta.json，
+    多个工作进程共享同一份页缓存，并在下一次查询时自动切换到新版本。
+    """
+
+    DEFAULT_NPROBE = 8
+
+    # 增量段超过基础段的该比例时自动合并
+    COMPACT_RATIO = 0.1
+
+    # 训练k-means时最多使用的样本数
+    TRAIN_SAMPLE = 50000
+
+    # 分配簇时每批计算的向量数（限制临时内存）
+    ASSIGN_BATCH = 8192
+
+    def __init__(self, directory: str):
+        """
+        打开已构建的索引
+
+        参数:
+            directory: 索引目录
+        """
+        self.directory = directory
+        # _lock保护状态的替换，_write_lock让同一实例上的写入依次进行
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._state = self._load()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _load(self) -> _IVFState:
+        """按meta.json打开当前版本的全部数组"""
+        for attempt in range(3):
+            try:
+                return _IVFState(self.directory)
+            except FileNotFoundError:
+                # 读取meta.json之后、打开数组之前写入者提交了新版本并删除了旧文件
+                if attempt == 2:
+                    raise
+
+    def _swap(self, state: _IVFState) -> None:
+        """替换当前状态（并发的refresh可能晚于更新的版本完成，不回退到旧版本）"""
+        with self._lock:
+            if state.version >= self._state.version:
+                self._state = state
+
+    def refresh(self) -> bool:
+        """
+        其他进程写入新版本后重新打开
+
+        返回:
+            是否切换了版本
+        """
+        try:
+            version = self.version_of(self.read_meta(self.directory))
+        except (OSError, ValueError):
+            return False
+        with self._lock:
+            if version <= self._state.version:
+                return False
+        self._swap(self._load())
+        return True
+
+    def snapshot(self) -> _IVFState:
+        """
+        获取当前版本的状态（先检查是否有新版本）
+
+        返回:
+            不再变化的状态对象，同一次查询应只使用这一个快照
+        """
+        self.refresh()
+        with self._lock:
+            return self._state
+
+    @property
+    def meta(self) -> Dict:
+        """当前版本的meta.json内容"""
+        return self.snapshot().meta
+
+    def __len__(self) -> int:
+        return len(self.snapshot())
+
+    @staticmethod
+    def read_meta(directory: str) -> Dict:
+        """读取索引目录当前的meta.json"""
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    @staticmethod
+    def version_of(meta: Dict) -> Tuple[int, int]:
+        """
+        提交版本号：每次重建或合并递增generation，每次写入增量段递增delta_sequence
+
+        不依赖meta.json的修改时间，同一时间刻度内的两次提交或时间戳粒度较粗的文件系统上也能区分
+
+        参数:
+            meta: meta.json内容
+
+        返回:
+            (generation, delta_sequence)，按元组大小比较先后
+        """
+        return meta["generation"], meta.get("delta_sequence", 0)
+
+    @staticmethod
+    def _write_meta(directory: str, meta: Dict) -> None:
+        """原子替换meta.json（提交点）"""
+        tmp_path = os.path.join(directory, f"meta.json.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(directory, "meta.json"))
+
+    @staticmethod
+    def _remove_files(directory: str, prefix: Optional[str]) -> None:
+        """删除不再被meta.json引用的段文件（已打开的内存映射不受影响）"""
+        if not prefix:
+            return
+        for name in os.listdir(directory):
+            if name.startswith(f"{prefix}."):
+                os.remove(os.path.join(directory, name))
+
+    @classmethod
+    def _assign(cls, vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        """把向量分配给内积最大的簇中心"""
+        lists = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), cls.ASSIGN_BATCH):
+            batch = np.asarray(vectors[start:start + cls.ASSIGN_BATCH])
+            lists[start:start + len(batch)] = np.argmax(batch @ centroids.T, axis=1)
+        return lists
+
+    @classmethod
+    def train_centroids(cls, vectors: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+        """
+        球面k-means训练簇中心
+
+        参数:
+            vectors: 归一化后的向量
+            nlist: 簇数
+            iterations: 迭代次数
+            seed: 随机种子
+
+        返回:
+            (nlist, dim) 的簇中心矩阵
+        """
+        rng = np.random.default_rng(seed)
+        if len(vectors) > cls.TRAIN_SAMPLE:
+            sample = np.asarray(vectors[np.sort(rng.choice(len(vectors), cls.TRAIN_SAMPLE, replace=False))])
+        else:
+            sample = np.asarray(vectors)
+        nlist = max(1, min(nlist, len(sample)))
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            lists = cls._assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, lists, sample)
+            counts = np.bincount(lists, minlength=nlist)
+            # 空簇重新取一个随机样本作为中心
+            empty = np.flatnonzero(counts == 0)
+            sums[empty] = sample[rng.choice(len(sample), len(empty))]
+            centroids = normalize_rows(sums)
+        return centroids
+
+    @classmethod
+    def _write_base(cls,
+                    directory: str,
+                    name: str,
+                    centroids: np.ndarray,
+                    ids: np.ndarray,
+                    vectors: np.ndarray,
+                    lists: np.ndarray) -> None:
+        """按簇排序后写入基础段，同时写入按ID查找用的排序下标"""
+        order = np.argsort(lists, kind="stable")
+        offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(lists, minlength=len(centroids)), out=offsets[1:])
+        np.save(os.path.join(directory, f"{name}.centroids.npy"), centroids.astype(np.float32))
+        np.save(os.path.join(directory, f"{name}.vectors.npy"), np.asarray(vectors, dtype=np.float32)[order])
+        sorted_ids = np.asarray(ids, dtype=np.int64)[order]
+        np.save(os.path.join(directory, f"{name}.ids.npy"), sorted_ids)
+        np.save(os.path.join(directory, f"{name}.offsets.npy"), offsets)
+        np.save(os.path.join(directory, f"{name}.id_order.npy"), np.argsort(sorted_ids, kind="stable"))
+
+    @classmethod
+    def build(cls,
+              ids: np.ndarray,
+              vectors: np.ndarray,
+              directory: str,
+              nlist: Optional[int] = None,
+              iterations: int = 10,
+              seed: int = 0,
+              extra_meta: Optional[Dict] = None) -> "IVFIndex":
+        """
+        从向量矩阵构建索引
+
+        参数:
+            ids: 电影ID
+            vectors: 与ids对应的向量（会做L2归一化）
+            directory: 索引目录（已有索引时替换）
+            nlist: 簇数，None表示约为4×sqrt(n)
+            iterations: k-means迭代次数
+            seed: 随机种子
+            extra_meta: 额外写入meta.json的信息（如目录版本号）
+
+        返回:
+            IVFIndex实例
+        """
+        os.makedirs(directory, exist_ok=True)
+        vectors = normalize_rows(vectors)
+        ids = np.asarray(ids, dtype=np.int64)
+        if nlist is None:
+            nlist = max(1, int(4 * np.sqrt(len(vectors))))
+        if len(vectors):
+            centroids = cls.train_centroids(vectors, nlist, iterations, seed)
+            lists = cls._assign(vectors, centroids)
+        else:
+            centroids = np.zeros((1, vectors.shape[1]), dtype=np.float32)
+            lists = np.zeros(0, dtype=np.int32)
+
+        previous = None
+        if os.path.exists(os.path.join(directory, "meta.json")):
+            previous = cls.read_meta(directory)
+        generation = previous["generation"] + 1 if previous else 1
+        base = f"base{generation}"
+        cls._write_base(directory, base, centroids, ids, vectors, lists)
+        meta = dict(extra_meta or {})
+        meta.update({
+            "generation": generation,
+            "dim": int(vectors.shape[1]),
+            "nlist": int(len(centroids)),
+            "base": base,
+            "delta": None
+        })
+        cls._write_meta(directory, meta)
+        if previous:
+            cls._remove_files(directory, previous["base"])
+            cls._remove_files(directory, previous["delta"])
+        return cls(directory)
+
+    def add(self, ids: np.ndarray, vectors: np.ndarray, extra_meta: Optional[Dict] = None) -> int:
+        """
+        增量插入或更新向量（同ID的旧向量被替换）
+
+        参数:
+            ids: 电影ID
+            vectors: 与ids对应的向量（会做L2归一化）
+            extra_meta: 额外写入meta.json的信息
+
+        返回:
+            增量段中的向量数（合并后为0）
+        """
+        with self._write_lock:
+            state = self.snapshot()
+            ids = np.asarray(ids, dtype=np.int64)
+            vectors = normalize_rows(vectors)
+            # 同一批内重复的ID以最后一次为准
+            _, last = np.unique(ids[::-1], return_index=True)
+            keep = np.sort(len(ids) - 1 - last)
+            ids, vectors = ids[keep], vectors[keep]
+
+            old = ~np.isin(state.delta_ids, ids)
+            delta_ids = np.concatenate([np.asarray(state.delta_ids)[old], ids])
+            delta_vectors = np.concatenate([np.asarray(state.delta_vectors)[old], vectors])
+            delta_lists = np.concatenate([
+                np.asarray(state.delta_lists)[old],
+                self._assign(vectors, np.asarray(state.centroids))
+            ])
+            removed = np.union1d(state.removed, ids[np.isin(ids, state.ids)])
+
+            meta = dict(state.meta, **(extra_meta or {}))
+            if len(delta_ids) > self.COMPACT_RATIO * max(len(state.ids), 1):
+                self._compact(state, delta_ids, delta_vectors, delta_lists, removed, meta)
+                return 0
+
+            sequence = meta.get("delta_sequence", 0) + 1
+            delta = f"delta{meta['generation']}_{sequence}"
+            np.save(self._path(f"{delta}.vectors.npy"), delta_vectors.astype(np.float32))
+            np.save(self._path(f"{delta}.ids.npy"), delta_ids)
+            np.save(self._path(f"{delta}.lists.npy"), delta_lists.astype(np.int32))
+            np.save(self._path(f"{delta}.removed.npy"), removed.astype(np.int64))
+            previous_delta = meta["delta"]
+            meta.update({"delta": delta, "delta_sequence": sequence})
+            self._write_meta(self.directory, meta)
+            self._swap(self._load())
+            self._remove_files(self.directory, previous_delta)
+            return len(delta_ids)
+
+    def _compact(self,
+                 state: _IVFState,
+                 delta_ids: np.ndarray,
+                 delta_vectors: np.ndarray,
+                 delta_lists: np.ndarray,
+                 removed: np.ndarray,
+                 meta: Dict) -> None:
+        """把增量段合并进新的基础段（沿用现有簇中心），调用方持有写入锁"""
+        live = ~np.isin(state.ids, removed)
+        base_lists = np.repeat(np.arange(len(state.centroids), dtype=np.int32), np.diff(state.offsets))
+        generation = meta["generation"] + 1
+        base = f"base{generation}"
+        self._write_base(
+            self.directory, base, np.asarray(state.centroids),
+            np.concatenate([np.asarray(state.ids)[live], delta_ids]),
+            np.concatenate([np.asarray(state.vectors)[live], delta_vectors]),
+            np.concatenate([base_lists[live], delta_lists])
+        )
+        previous_base, previous_delta = meta["base"], meta["delta"]
+        meta.update({"generation": generation, "base": base, "delta": None, "delta_sequence": 0})
+        self._write_meta(self.directory, meta)
+        self._swap(self._load())
+        # 正在使用旧快照的查询持有内存映射，删除文件不影响它们
+        self._remove_files(self.directory, previous_base)
+        self._remove_files(self.directory, previous_delta)
+
+    def compact(self) -> None:
+        """立即把增量段合并进基础段"""
+        with self._write_lock:
+            state = self.snapshot()
+            if len(state.delta_ids) or len(state.removed):
+                self._compact(
+                    state, np.asarray(state.delta_ids), np.asarray(state.delta_vectors),
+                    np.asarray(state.delta_lists), np.asarray(state.removed), dict(state.meta)
+                )
+
+    @staticmethod
+    def _vector_of(state: _IVFState, movie_id: int) -> Optional[np.ndarray]:
+        """在给定快照中读取电影的向量（增量段优先）"""
+        matches = np.flatnonzero(state.delta_ids == movie_id)
+        if len(matches):
+            return np.asarray(state.delta_vectors[matches[-1]])
+        position = int(np.searchsorted(state.ids, movie_id, sorter=state.id_order))
+        if position < len(state.ids):
+            index = state.id_order[position]
+            if state.ids[index] == movie_id and movie_id not in state.removed:
+                return np.asarray(state.vectors[index])
+        return None
+
+    def vector_of(self, movie_id: int) -> Optional[np.ndarray]:
+        """
+        读取电影的向量（增量段优先）
+
+        参数:
+            movie_id: 电影ID
+
+        返回:
+            向量，不在索引中时返回None
+        """
+        return self._vector_of(self.snapshot(), movie_id)
+
+    def _top(self, ids: np.ndarray, scores: np.ndarray, k: int,
+             exclude_ids: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """剔除排除的ID后取前k个"""
+        if exclude_ids is not None and len(exclude_ids):
+            valid = ~np.isin(ids, exclude_ids)
+            ids, scores = ids[valid], scores[valid]
+        k = min(k, len(ids))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return ids[top], scores[top]
+
+    def search(self,
+               query: np.ndarray,
+               k: int = 10,
+               nprobe: Optional[int] = None,
+               exclude_ids: Optional[Iterable[int]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        近似检索内积最大的k个向量
+
+        参数:
+            query: 查询向量（会做归一化）
+            k: 返回数量
+            nprobe: 扫描的簇数，None表示DEFAULT_NPROBE；等于nlist时结果与暴力检索一致
+            exclude_ids: 需要排除的电影ID
+
+        返回:
+            (电影ID数组, 得分数组)，按得分降序
+        """
+        return self._search(self.snapshot(), query, k, nprobe, exclude_ids)
+
+    def _search(self,
+                state: _IVFState,
+                query: np.ndarray,
+                k: int,
+                nprobe: Optional[int],
+                exclude_ids: Optional[Iterable[int]]) -> Tuple[np.ndarray, np.ndarray]:
+        """在给定快照中检索，参数同search"""
+        query = normalize_rows(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+        nprobe = min(nprobe or self.DEFAULT_NPROBE, len(state.centroids))
+        centroid_scores = state.centroids @ query
+        probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+
+        starts, ends = state.offsets[probe], state.offsets[probe + 1]
+        lengths = ends - starts
+        total = int(lengths.sum())
+        positions = np.arange(total, dtype=np.int64) + np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        if len(state.removed):
+            # 已被增量段中的新向量替换的旧向量
+            positions = positions[~np.isin(state.ids[positions], state.removed)]
+        base_ids = state.ids[positions]
+        base_scores = state.vectors[positions] @ query
+
+        in_delta = np.isin(state.delta_lists, probe)
+        ids = np.concatenate([base_ids, state.delta_ids[in_delta]])
+        scores = np.concatenate([base_scores, state.delta_vectors[in_delta] @ query])
+        exclude = np.fromiter(exclude_ids, dtype=np.int64) if exclude_ids is not None else None
+        return self._top(ids, scores, k, exclude)
+
+    def search_exact(self,
+                     query: np.ndarray,
+                     k: int = 10,
+                     exclude_ids: Optional[Iterable[int]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        暴力检索（扫描全部向量），用于评估召回率
+
+        参数同search
+
+        返回:
+            (电影ID数组, 得分数组)，按得分降序
+        """
+        state = self.snapshot()
+        query = normalize_rows(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+        live = ~np.isin(state.ids, state.removed)
+        ids = np.concatenate([state.ids[live], state.delta_ids])
+        scores = np.concatenate([(state.vectors @ query)[live], state.delta_vectors @ query])
+        exclude = np.fromiter(exclude_ids, dtype=np.int64) if exclude_ids is not None else None
+        return self._top(ids, scores, k, exclude)
+
+    def similar_ids(self, movie_ids: Iterable[int], k: int = 10, nprobe: Optional[int] = None) -> List[int]:
+        """
+        与一部或一组电影最相似的电影ID
+
+        参数:
+            movie_ids: 电影ID（不在索引中的被忽略）
+            k: 返回数量
+            nprobe: 扫描的簇数
+
+        返回:
+            电影ID列表，不包含输入的电影
+        """
+        state = self.snapshot()
+        movie_ids = list(movie_ids)
+        vectors = [
+            vector for vector in (self._vector_of(state, movie_id) for movie_id in movie_ids)
+            if vector is not None
+        ]
+        if not vectors:
+            return []
+        ids, _ = self._search(state, np.sum(vectors, axis=0), k, nprobe, exclude_ids=movie_ids)
+        return [int(movie_id) for movie_id in ids]
+
+
+def build_from_catalog(catalog: MovieCatalog,
+                       directory: str,
+                       dim: int = 128,
+                       nlist: Optional[int] = None) -> IVFIndex:
+    """
+    为整个目录计算向量并构建索引，嵌入器的IDF随索引保存
+
+    参数:
+        catalog: 本地目录
+        directory: 索引目录
+        dim: 向量维度
+        nlist: 簇数，None表示自动
+
+    返回:
+        IVFIndex实例
+    """
+    version = catalog.version
+    embedder = MovieEmbedder(dim)
+    embedder.fit(catalog.iter_movies())
+    ids, vectors = embedder.embed(catalog.iter_movies())
+    os.makedirs(directory, exist_ok=True)
+    np.save(os.path.join(directory, "idf.npy"), embedder.idf)
+    return IVFIndex.build(ids, vectors, directory, nlist=nlist, extra_meta={"catalog_version": version})
+
+
+def update_from_catalog(catalog: MovieCatalog, directory: str) -> Dict[str, int]:
+    """
+    目录同步后增量更新索引：只为变化过的电影重新计算向量并插入；
+    期间有整体重建时（changed_since返回None）完全重建
+
+    参数:
+        catalog: 本地目录
+        directory: 索引目录
+
+    返回:
+        统计信息（updated为更新的向量数，rebuilt为1表示完全重建）
+    """
+    index = IVFIndex(directory)
+    version = catalog.version
+    changed = catalog.changed_since(index.meta.get("catalog_version", 0))
+    if changed is None:
+        index = build_from_catalog(catalog, directory, dim=index.meta["dim"], nlist=index.meta["nlist"])
+        return {"updated": len(index), "rebuilt": 1}
+    if not changed:
+        return {"updated": 0, "rebuilt": 0}
+    embedder = MovieEmbedder(index.meta["dim"], idf=np.load(os.path.join(directory, "idf.npy")))
+    movies = (catalog.get_movie(movie_id) for movie_id in sorted(changed))
+    ids, vectors = embedder.embed(movie for movie in movies if movie is not None)
+    index.add(ids, vectors, extra_meta={"catalog_version": version})
+    return {"updated": len(ids), "rebuilt": 0}
+
+
+def main():
+    """命令行入口：python -m utils.ann build"""
+    parser = argparse.ArgumentParser(description="电影向量的近似最近邻索引")
+    parser.add_argument("--db", help="SQLite目录路径，默认DATA_DIR/catalog.db")
+    parser.add_argument("--directory", help="索引目录，默认DATA_DIR/ann")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="为整个目录构建索引")
+    build.add_argument("--dim", type=int, default=128, help="向量维度")
+    build.add_argument("--nlist", type=int, help="簇数，默认约为4×sqrt(电影数)")
+    subparsers.add_parser("update", help="目录同步后增量更新")
+    query = subparsers.add_parser("query", help="查询相似电影")
+    query.add_argument("movie_ids", type=int, nargs="+")
+    query.add_argument("--nprobe", type=int, help="扫描的簇数")
+    args = parser.parse_args()
+
+    catalog = MovieCatalog(args.db) if args.db else MovieCatalog.default()
+    directory = args.directory or os.path.join(os.environ.get("DATA_DIR", "data"), "ann")
+    if args.command == "build":
+        index = build_from_catalog(catalog, directory, dim=args.dim, nlist=args.nlist)
+        print(f"索引已构建: {len(index)} 个向量，{index.meta['nlist']} 个簇")
+    elif args.command == "update":
+        stats = update_from_catalog(catalog, directory)
+        print(f"{'完全重建' if stats['rebuilt'] else '增量更新'}: {stats['updated']} 个向量")
+    elif args.command == "query":
+        index = IVFIndex(directory)
+        for movie_id in index.similar_ids(args.movie_ids, nprobe=args.nprobe):
+            movie = catalog.get_movie(movie_id)
+            print(f"{movie_id}\t{movie['title'] if movie else ''}")
+
+
+if __name__ == "__main__":
+    main()
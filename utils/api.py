@@ -1,21 +1,219 @@
 import requests
 import os
-from typing import Dict, List, Optional, Any
+import copy
+import hashlib
+import html
+import math
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, List, Optional, Any, Tuple, Callable, Iterator
+from requests.adapters import HTTPAdapter
+from utils.cache import ResponseCache, make_cache_key
+from utils.singleflight import SingleFlight
+from utils.fixtures import FixtureStore
+from utils.images import ImageProxyServer
+from utils.jsondecode import JSONDecoder
+from utils.models import Movie, MovieSummary, movie_page
+from utils.ratelimit import RateLimiter, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND, parse_retry_after
+from utils.runtime_index import RuntimeIndex
+
 
 class TMDBApi:
     """TMDB API封装类"""
     
     BASE_URL = "https://api.themoviedb.org/3"
-    IMAGE_BASE_URL = "https://image.tmdb.org/t/p/w500"
+    IMAGE_BASE_URL = "https://image.tmdb.org/t/p"
+
+    # TMDB提供的海报宽度档位（像素），按显示宽度×像素比选择能覆盖的最小一档
+    IMAGE_SIZES = (92, 154, 185, 342, 500)
+
+    # 海报的宽高比（高/宽）
+    POSTER_ASPECT = 1.5
+    POSTER_PLACEHOLDER = "https://via.placeholder.com/{width}x{height}?text=No+Image"
+
+    # 服务端临时错误，按指数退避重试
+    RETRY_STATUSES = (500, 502, 503, 504)
+
+    # 进程级共享的连接池，按连接池大小区分
+    _sessions: Dict[int, requests.Session] = {}
+    _sessions_lock = threading.Lock()
+
+    # 进程级共享的批量请求线程池
+    _batch_executor: Optional[ThreadPoolExecutor] = None
+    _batch_executor_lock = threading.Lock()
+    BATCH_MAX_WORKERS = 8
+
+    # 进程级共享的请求合并器：并发的相同请求只发出一次网络调用
+    _single_flight = SingleFlight()
+
+    # 进程级共享的限流器，按(速率, 突发容量)区分
+    _rate_limiters: Dict[Tuple, RateLimiter] = {}
+
+    # 电影详情的投影：每种投影通过append_to_response附带的部分
+    # （Movie只保留演职人员，视频和图片等部分在有字段使用之前不请求）
+    DETAIL_PROJECTIONS = {
+        "core": (),
+        "credits": ("credits",)
+    }
+
+    # 可以通过append_to_response并入详情请求的列表类终端
+    BUNDLE_PARTS = ("recommendations", "similar")
+
+    # 返回电影列表的终端，解码后对results做字段投影
+    LIST_ENDPOINT_PATTERN = re.compile(
+        r"^/(search/|discover/|trending/|movie/\d+/(recommendations|similar)$)"
+    )
+    DETAIL_ENDPOINT_PATTERN = re.compile(r"^/movie/\d+$")
     
-    def __init__(self, api_key: str):
+    def __init__(self,
+                 api_key: str,
+                 pool_size: int = 20,
+                 connect_timeout: float = 3.05,
+                 read_timeout: float = 10.0,
+                 max_retries: int = 3,
+                 backoff_factor: float = 0.5,
+                 cache: Optional[ResponseCache] = None,
+                 use_cache: bool = True,
+                 rate_limit: float = 40.0,
+                 rate_burst: int = 20,
+                 priority: int = PRIORITY_INTERACTIVE,
+                 base_url: Optional[str] = None,
+                 record_dir: Optional[str] = None,
+                 replay_dir: Optional[str] = None,
+                 json_backend: Optional[str] = None,
+                 image_proxy_port: Optional[int] = None,
+                 image_proxy_url: Optional[str] = None,
+                 runtime_index: Optional[RuntimeIndex] = None):
         """
         初始化TMDB API客户端
         
         参数:
             api_key: TMDB API密钥
+            pool_size: 连接池大小（同一主机最多保持的长连接数）
+            connect_timeout: 建立连接超时时间（秒）
+            read_timeout: 读取响应超时时间（秒）
+            max_retries: 遇到5xx或连接重置时的最大重试次数
+            backoff_factor: 指数退避的基数（秒），实际等待时间带随机抖动
+            cache: 响应缓存，None表示使用进程级共享的默认缓存
+                   （访问模拟服务器或回放时使用按来源区分的内存缓存）
+            use_cache: 是否启用响应缓存
+            rate_limit: 每秒允许发出的请求数（进程内所有同配置实例共享）
+            rate_burst: 限流令牌桶容量
+            priority: 请求优先级，后台预热/预取应使用PRIORITY_BACKGROUND
+            base_url: API地址，None时读取环境变量TMDB_BASE_URL（可指向本地模拟服务器）
+            record_dir: 录制目录，设置后把每个真实响应保存为夹具（环境变量TMDB_RECORD_DIR）
+            replay_dir: 回放目录，设置后只从夹具读取响应而不访问网络（环境变量TMDB_REPLAY_DIR）
+            json_backend: 响应解码后端，"orjson"或"json"，None表示有orjson时优先使用
+            image_proxy_port: 设置后在本进程内启动图片代理（环境变量TMDB_IMAGE_PROXY_PORT，
+                              监听地址由TMDB_IMAGE_PROXY_HOST指定，默认127.0.0.1）
+            image_proxy_url: 浏览器访问图片代理使用的地址（环境变量TMDB_IMAGE_PROXY_URL），
+                             只设置该项时使用单独运行的代理（python -m utils.images）
+            runtime_index: 记录详情响应中片长的索引，None表示启用缓存时使用进程级共享的默认索引
+                           （访问模拟服务器或回放时使用仅在内存中的索引）
         """
         self.api_key = api_key
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = self._get_session(pool_size)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.priority = priority
+        self.base_url = (base_url or os.environ.get("TMDB_BASE_URL") or self.BASE_URL).rstrip("/")
+        record_dir = record_dir or os.environ.get("TMDB_RECORD_DIR")
+        replay_dir = replay_dir or os.environ.get("TMDB_REPLAY_DIR")
+        self.recorder = FixtureStore(record_dir) if record_dir else None
+        self.replayer = FixtureStore(replay_dir) if replay_dir else None
+        # 请求合并器在进程内共享，合并键需要区分数据来源和录制/回放模式
+        if replay_dir:
+            self._origin = f"replay:{replay_dir}"
+        elif record_dir:
+            self._origin = f"record:{record_dir}|{self.base_url}"
+        else:
+            self._origin = self.base_url
+        if cache is None and use_cache:
+            # 模拟服务器和回放的响应使用单独的内存缓存，不污染真实TMDB的磁盘缓存
+            cache = ResponseCache.default() if self.is_live() else ResponseCache.for_origin(
+                f"replay:{replay_dir}" if replay_dir else self.base_url
+            )
+        self.cache = cache if use_cache else None
+        self.decoder = JSONDecoder.get(json_backend)
+        if runtime_index is None and use_cache:
+            # 只有真实TMDB的片长才写入持久化的共享索引；模拟服务器和回放的合成数据
+            # 可能与真实电影ID重合，只保存在本实例的内存中
+            runtime_index = RuntimeIndex.default() if self.is_live() else RuntimeIndex(None)
+        self.runtime_index = runtime_index
+        self.image_proxy_url = image_proxy_url or os.environ.get("TMDB_IMAGE_PROXY_URL")
+        image_proxy_port = image_proxy_port or os.environ.get("TMDB_IMAGE_PROXY_PORT")
+        if image_proxy_port:
+            host = os.environ.get("TMDB_IMAGE_PROXY_HOST", "127.0.0.1")
+            proxy = ImageProxyServer.shared(host, int(image_proxy_port))
+            self.image_proxy_url = self.image_proxy_url or f"http://localhost:{proxy.port}"
+        if self.image_proxy_url:
+            self.image_proxy_url = self.image_proxy_url.rstrip("/")
+        with self._sessions_lock:
+            limiter_key = (rate_limit, rate_burst)
+            if limiter_key not in self._rate_limiters:
+                self._rate_limiters[limiter_key] = RateLimiter(rate_limit, rate_burst)
+            self.rate_limiter = self._rate_limiters[limiter_key]
+
+    def is_live(self) -> bool:
+        """
+        是否在访问真实的TMDB（而不是模拟服务器或回放目录）
+
+        返回:
+            访问真实TMDB时为True
+        """
+        return self.base_url == self.BASE_URL and self.replayer is None
+
+    def background_client(self) -> "TMDBApi":
+        """
+        获取使用后台优先级的客户端副本
+
+        副本与当前实例共享连接池、缓存和限流器，只是请求排在交互式请求之后，
+        供预热、预取等后台任务使用。
+
+        返回:
+            TMDBApi实例
+        """
+        client = copy.copy(self)
+        client.priority = PRIORITY_BACKGROUND
+        return client
+
+    @classmethod
+    def _get_session(cls, pool_size: int) -> requests.Session:
+        """
+        获取进程级共享的HTTP会话
+
+        同一配置的所有TMDBApi实例（例如每个Streamlit会话各自创建的实例）
+        共用一个连接池，TCP/TLS握手在每个进程中只需进行一次。
+        连接池本身不重试：重试在_fetch中进行，每次尝试都要经过限流器。
+
+        参数:
+            pool_size: 连接池大小
+
+        返回:
+            requests.Session实例
+        """
+        with cls._sessions_lock:
+            session = cls._sessions.get(pool_size)
+            if session is None:
+                adapter = HTTPAdapter(
+                    pool_connections=4,
+                    pool_maxsize=pool_size,
+                    max_retries=0,
+                    pool_block=True
+                )
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                cls._sessions[pool_size] = session
+            return session
+
+    def _backoff(self, attempt: int) -> float:
+        """第attempt次重试前的等待时间（秒）：指数退避加随机抖动（full jitter）"""
+        return random.uniform(0, self.backoff_factor * (2 ** attempt))
 
     def _make_request(self, endpoint: str, params: Dict = None) -> Dict:
         """
@@ -26,7 +224,7 @@ class TMDBApi:
             params: 查询参数
 
         返回:
-            解析后的JSON响应
+            解析后的JSON响应（可能来自缓存，调用方不应修改）
         """
         if params is None:
             params = {}
@@ -37,53 +235,430 @@ class TMDBApi:
         # 设置语言参数
         params["language"] = "zh-CN"
 
+        cache_key = make_cache_key(endpoint, params)
+        if self.cache is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        return self._single_flight.do(self._flight_key(cache_key), lambda: self._fetch(endpoint, params, cache_key))
+
+    def _flight_key(self, cache_key: str) -> str:
+        """
+        请求合并键：缓存键加上数据来源、模式和API密钥
+
+        不同来源（真实TMDB、模拟服务器、回放夹具）或不同密钥的客户端并发请求同一终端时
+        不能拿到彼此的响应；密钥可能在运行时修改，只取其摘要且每次请求时计算。
+
+        参数:
+            cache_key: 请求的缓存键
+
+        返回:
+            合并键
+        """
+        key_digest = hashlib.sha1((self.api_key or "").encode("utf-8")).hexdigest()[:12]
+        return f"{self._origin}|{key_digest}|{cache_key}"
+
+    def _fetch(self, endpoint: str, params: Dict, cache_key: str, conditional: bool = True) -> Dict:
+        """
+        发出实际的网络请求并写入缓存
+
+        缓存中有已过期但带ETag/Last-Modified的条目时发送条件请求，
+        服务端返回304则直接延长缓存条目的有效期。
+
+        参数:
+            endpoint: API终端路径
+            params: 查询参数（已包含语言参数）
+            cache_key: 缓存键
+            conditional: 是否允许发送条件请求
+
+        返回:
+            解析后的JSON响应
+        """
+        if self.replayer is not None:
+            return self._replay(endpoint, cache_key)
+
         # 使用Bearer令牌认证
         headers = {
             "accept": "application/json",
             "Authorization": f"Bearer {self.api_key}"  # 这里使用api_key变量，但实际存储的是访问令牌
         }
 
-        url = f"{self.BASE_URL}{endpoint}"
+        validators = None
+        if conditional and self.cache is not None:
+            validators = self.cache.get_validators(cache_key)
+            if validators is not None:
+                etag, last_modified = validators
+                if etag:
+                    headers["If-None-Match"] = etag
+                if last_modified:
+                    headers["If-Modified-Since"] = last_modified
 
-        response = requests.get(url, params=params, headers=headers)
+        url = f"{self.base_url}{endpoint}"
+
+        network_seconds = 0.0
+        for attempt in range(self.max_retries + 1):
+            # 每次尝试（包括重试）都从令牌桶取令牌，重试同样计入请求配额
+            self.rate_limiter.acquire(self.priority)
+            start = time.perf_counter()
+            try:
+                response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                network_seconds += time.perf_counter() - start
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self._backoff(attempt))
+                continue
+            network_seconds += time.perf_counter() - start
+            if attempt == self.max_retries:
+                break
+            if response.status_code == 429:
+                # 被服务端限流：按Retry-After暂停所有请求后重试
+                self.rate_limiter.pause(
+                    parse_retry_after(response.headers.get("Retry-After"), default=2 ** attempt)
+                )
+            elif response.status_code in self.RETRY_STATUSES:
+                time.sleep(self._backoff(attempt))
+            else:
+                break
         response.raise_for_status()
 
-        return response.json()
+        if response.status_code == 304 and validators is not None:
+            data = self.cache.revalidate(endpoint, cache_key)
+            if data is not None:
+                return data
+            # 条目在请求期间被淘汰，重新完整获取
+            return self._fetch(endpoint, params, cache_key, conditional=False)
+
+        data = self.decoder.decode(response.content, network_seconds)
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if self.recorder is not None:
+            # 夹具保存完整响应，投影只作用于缓存和返回值
+            replay_headers = {"ETag": etag, "Last-Modified": last_modified}
+            self.recorder.save(
+                cache_key, endpoint, params, data,
+                status=response.status_code,
+                headers={k: v for k, v in replay_headers.items() if v}
+            )
+        self._observe_runtime(endpoint, data)
+        data = self._project(endpoint, data)
+        if self.cache is not None:
+            self.cache.set(endpoint, cache_key, data, etag=etag, last_modified=last_modified)
+        return data
+
+    def _project(self, endpoint: str, data: Dict) -> Dict:
+        """
+        丢弃列表结果中用不到的字段
+
+        列表终端的每个条目只保留MovieSummary需要的字段；详情终端通过
+        append_to_response附带的推荐/相似列表同样处理。
+
+        参数:
+            endpoint: API终端路径
+            data: 解码后的完整响应
+
+        返回:
+            投影后的响应
+        """
+        fields = MovieSummary.JSON_FIELDS
+        if self.LIST_ENDPOINT_PATTERN.match(endpoint):
+            return self.decoder.project(data, fields)
+        if self.DETAIL_ENDPOINT_PATTERN.match(endpoint):
+            parts = [part for part in self.BUNDLE_PARTS if isinstance(data.get(part), dict)]
+            if parts:
+                data = dict(data)
+                for part in parts:
+                    data[part] = self.decoder.project(data[part], fields)
+        return data
+
+    def _observe_runtime(self, endpoint: str, data: Dict) -> None:
+        """
+        把详情响应中的片长写入片长索引
+
+        参数:
+            endpoint: API终端路径
+            data: 解码后的响应
+        """
+        if self.runtime_index is None or not self.DETAIL_ENDPOINT_PATTERN.match(endpoint):
+            return
+        try:
+            self.runtime_index.observe(data)
+        except Exception as e:
+            print(f"记录片长失败: {e}")
+
+    def _replay(self, endpoint: str, cache_key: str) -> Dict:
+        """
+        从回放目录读取响应
+
+        参数:
+            endpoint: API终端路径
+            cache_key: 缓存键（即夹具键）
+
+        返回:
+            夹具中保存的响应体
+        """
+        fixture = self.replayer.load(cache_key)
+        if fixture is None or fixture.get("status", 200) >= 400:
+            raise requests.HTTPError(f"404 Client Error: 回放目录中没有该请求的夹具: {cache_key}")
+        self._observe_runtime(endpoint, fixture["body"])
+        data = self._project(endpoint, fixture["body"])
+        if self.cache is not None:
+            self.cache.set(endpoint, cache_key, data)
+        return data
+
+    def get_cache_stats(self) -> Dict:
+        """
+        获取响应缓存的命中统计
+
+        返回:
+            统计信息字典，未启用缓存时返回空字典
+        """
+        if self.cache is None:
+            return {}
+        return self.cache.get_stats()
+
+    @classmethod
+    def get_coalescing_stats(cls) -> Dict:
+        """
+        获取进程级请求合并统计
+
+        返回:
+            包含调用总数、实际网络请求次数和被合并次数的字典
+        """
+        return cls._single_flight.get_stats()
+
+    def get_decode_stats(self) -> Dict:
+        """
+        获取响应解码统计
+
+        返回:
+            包含解码后端、响应数、字节数、网络耗时与解码耗时（分别累计）的字典
+        """
+        return self.decoder.get_stats()
+
+    def get_rate_limit_stats(self) -> Dict:
+        """
+        获取限流器统计
+
+        返回:
+            包含已发放令牌数、等待次数、累计等待时间和429次数的字典
+        """
+        return self.rate_limiter.get_stats()
     
-    def search_movies(self, query: str, page: int = 1) -> Dict:
+    def search_movies(self,
+                      query: str,
+                      page: int = 1,
+                      year: Optional[int] = None,
+                      include_adult: bool = False) -> Dict:
         """
         搜索电影
         
         参数:
             query: 搜索关键词
             page: 页码
+            year: 只返回该年份上映的电影
+            include_adult: 是否包含成人内容
             
         返回:
-            搜索结果
+            搜索结果，results中的元素为MovieSummary
         """
         endpoint = "/search/movie"
         params = {
             "query": query,
             "page": page
         }
-        return self._make_request(endpoint, params)
+        
+        if year:
+            params["primary_release_year"] = year
+        
+        if include_adult:
+            params["include_adult"] = "true"
+        
+        return movie_page(self._make_request(endpoint, params))
     
-    def get_movie_details(self, movie_id: int) -> Dict:
+    def get_movie_details(self, movie_id: int, projection: str = "credits") -> Movie:
         """
         获取电影详情
         
         参数:
             movie_id: 电影ID
+            projection: 详情投影，"core"只包含基本字段（片长、类型、简介等），
+                        "credits"附带演职人员
             
         返回:
-            电影详细信息
+            电影详情记录（可能来自包含更多部分的缓存条目）
         """
+        if projection not in self.DETAIL_PROJECTIONS:
+            raise ValueError(f"未知的详情投影: {projection}")
+        
         endpoint = f"/movie/{movie_id}"
-        params = {
-            "append_to_response": "credits,videos,images"
-        }
-        return self._make_request(endpoint, params)
+        
+        # 缓存中已有更大投影的详情时直接使用
+        if self.cache is not None:
+            for params in self._detail_params_covering(projection):
+                params["language"] = "zh-CN"
+                cached = self.cache.get(make_cache_key(endpoint, params), count_miss=False)
+                if cached is not None:
+                    return Movie.from_json(cached)
+        
+        params = self._detail_params(projection)
+        return Movie.from_json(self._make_request(endpoint, params))
+
+    def _detail_params(self, projection: str) -> Dict:
+        """生成指定投影的详情请求参数"""
+        parts = self.DETAIL_PROJECTIONS[projection]
+        return {"append_to_response": ",".join(parts)} if parts else {}
+
+    def _detail_params_covering(self, projection: str) -> List[Dict]:
+        """
+        列出能满足指定投影的所有投影的请求参数（从小到大排列）
+
+        参数:
+            projection: 详情投影名称
+
+        返回:
+            请求参数列表
+        """
+        required = set(self.DETAIL_PROJECTIONS[projection])
+        covering = sorted(
+            (name for name, parts in self.DETAIL_PROJECTIONS.items() if required.issubset(parts)),
+            key=lambda name: len(self.DETAIL_PROJECTIONS[name])
+        )
+        return [self._detail_params(name) for name in covering]
     
+    def get_movie_details_many(self,
+                               movie_ids: List[int],
+                               projection: str = "credits",
+                               deadline: Optional[float] = None,
+                               errors: Optional[Dict[int, Exception]] = None) -> Dict[int, Movie]:
+        """
+        并发批量获取电影详情
+
+        参数:
+            movie_ids: 电影ID列表，重复的ID只请求一次
+            projection: 详情投影，参见get_movie_details
+            deadline: 整个批次的最长耗时（秒），None表示不限制
+            errors: 可选字典，用于收集失败的ID及其异常（超时的ID记为TimeoutError）
+
+        返回:
+            按输入顺序排列的{电影ID: 电影详情}字典，只包含成功获取的电影
+        """
+        unique_ids = list(dict.fromkeys(movie_ids))
+        if not unique_ids:
+            return {}
+
+        executor = self._get_batch_executor()
+        futures = {executor.submit(self.get_movie_details, movie_id, projection): movie_id for movie_id in unique_ids}
+        end_time = time.monotonic() + deadline if deadline is not None else None
+
+        results = {}
+        pending = set(futures)
+        while pending:
+            remaining = None if end_time is None else end_time - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                movie_id = futures[future]
+                try:
+                    results[movie_id] = future.result()
+                except Exception as e:
+                    if errors is not None:
+                        errors[movie_id] = e
+
+        for future in pending:
+            future.cancel()
+            if errors is not None:
+                errors[futures[future]] = TimeoutError(f"获取电影 {futures[future]} 详情超时")
+
+        return {movie_id: results[movie_id] for movie_id in unique_ids if movie_id in results}
+
+    @classmethod
+    def _get_batch_executor(cls) -> ThreadPoolExecutor:
+        """获取进程级共享的批量请求线程池"""
+        with cls._batch_executor_lock:
+            if cls._batch_executor is None:
+                cls._batch_executor = ThreadPoolExecutor(
+                    max_workers=cls.BATCH_MAX_WORKERS,
+                    thread_name_prefix="tmdb-batch"
+                )
+            return cls._batch_executor
+
+    def get_movie_bundle(self,
+                         movie_id: int,
+                         parts: Optional[List[str]] = None,
+                         projection: str = "credits") -> Dict:
+        """
+        通过一次请求获取电影详情及推荐/相似电影
+
+        响应会被拆分写入各终端自己的缓存条目，之后单独调用get_movie_details、
+        get_recommended_movies等方法时可以直接命中缓存。
+
+        参数:
+            movie_id: 电影ID
+            parts: 需要附带的列表，可选"recommendations"和"similar"，默认两者都要
+            projection: 详情投影，参见get_movie_details
+
+        返回:
+            {"details": 电影详情记录, "recommendations": 推荐电影分页, "similar": 相似电影分页}，
+            只包含请求的部分
+        """
+        parts = list(parts) if parts is not None else list(self.BUNDLE_PARTS)
+        for part in parts:
+            if part not in self.BUNDLE_PARTS:
+                raise ValueError(f"未知的附带部分: {part}")
+        if projection not in self.DETAIL_PROJECTIONS:
+            raise ValueError(f"未知的详情投影: {projection}")
+
+        endpoint = f"/movie/{movie_id}"
+        part_keys = {
+            part: make_cache_key(f"{endpoint}/{part}", {"page": 1, "language": "zh-CN"})
+            for part in parts
+        }
+
+        # 各部分都已缓存时不发请求
+        if self.cache is not None:
+            bundle = {}
+            for params in self._detail_params_covering(projection):
+                params["language"] = "zh-CN"
+                details = self.cache.get(make_cache_key(endpoint, params), count_miss=False)
+                if details is not None:
+                    bundle["details"] = details
+                    break
+            for part, key in part_keys.items():
+                cached = self.cache.get(key, count_miss=False)
+                if cached is not None:
+                    bundle[part] = cached
+            if len(bundle) == len(parts) + 1:
+                return self._bundle_records(bundle)
+
+        append = list(self.DETAIL_PROJECTIONS[projection]) + parts
+        params = {"append_to_response": ",".join(append)} if append else {}
+        response = self._make_request(endpoint, params)
+
+        details = {key: value for key, value in response.items() if key not in parts}
+        bundle = {"details": details}
+        for part in parts:
+            bundle[part] = response.get(part) or {"page": 1, "results": [], "total_pages": 0, "total_results": 0}
+
+        # 回填各终端的缓存
+        if self.cache is not None:
+            detail_params = self._detail_params(projection)
+            detail_params["language"] = "zh-CN"
+            self.cache.set(endpoint, make_cache_key(endpoint, detail_params), details)
+            for part, key in part_keys.items():
+                self.cache.set(f"{endpoint}/{part}", key, bundle[part])
+
+        return self._bundle_records(bundle)
+
+    def _bundle_records(self, bundle: Dict) -> Dict:
+        """把原始JSON组成的bundle转换为记录类型"""
+        return {
+            part: Movie.from_json(data) if part == "details" else movie_page(data)
+            for part, data in bundle.items()
+        }
+
     def get_recommended_movies(self, movie_id: int, page: int = 1) -> Dict:
         """
         获取相似电影推荐
@@ -93,13 +668,13 @@ class TMDBApi:
             page: 页码
             
         返回:
-            相似电影列表
+            相似电影列表，results中的元素为MovieSummary
         """
         endpoint = f"/movie/{movie_id}/recommendations"
         params = {
             "page": page
         }
-        return self._make_request(endpoint, params)
+        return movie_page(self._make_request(endpoint, params))
     
     def get_trending_movies(self, time_window: str = "week") -> Dict:
         """
@@ -109,20 +684,26 @@ class TMDBApi:
             time_window: 时间窗口, 'day'或'week'
             
         返回:
-            热门电影列表
+            热门电影列表，results中的元素为MovieSummary
         """
         valid_time_windows = ["day", "week"]
         if time_window not in valid_time_windows:
             time_window = "week"
             
         endpoint = f"/trending/movie/{time_window}"
-        return self._make_request(endpoint)
+        return movie_page(self._make_request(endpoint))
     
     def discover_movies(self, 
                         genres: Optional[List[int]] = None,
                         year: Optional[int] = None,
                         sort_by: str = "popularity.desc",
-                        page: int = 1) -> Dict:
+                        page: int = 1,
+                        match_any_genre: bool = False,
+                        min_runtime: Optional[int] = None,
+                        max_runtime: Optional[int] = None,
+                        min_vote_average: Optional[float] = None,
+                        min_vote_count: Optional[int] = None,
+                        include_adult: bool = False) -> Dict:
         """
         发现电影
         
@@ -131,9 +712,15 @@ class TMDBApi:
             year: 年份
             sort_by: 排序方式
             page: 页码
+            match_any_genre: 为True时返回包含任一类型的电影，否则要求包含全部类型
+            min_runtime: 最短片长（分钟，含）
+            max_runtime: 最长片长（分钟，含）
+            min_vote_average: 最低评分（含）
+            min_vote_count: 最少评分人数（含）
+            include_adult: 是否包含成人内容
             
         返回:
-            电影列表
+            电影列表，results中的元素为MovieSummary
         """
         endpoint = "/discover/movie"
         params = {
@@ -142,13 +729,175 @@ class TMDBApi:
         }
         
         if genres:
-            params["with_genres"] = ",".join(map(str, genres))
+            params["with_genres"] = ("|" if match_any_genre else ",").join(map(str, genres))
         
         if year:
             params["primary_release_year"] = year
+        
+        # 只有设置了的过滤条件才加入参数，未过滤的请求与之前共用缓存键
+        if min_runtime is not None:
+            params["with_runtime.gte"] = min_runtime
+        if max_runtime is not None:
+            params["with_runtime.lte"] = max_runtime
+        if min_vote_average:
+            params["vote_average.gte"] = min_vote_average
+        if min_vote_count:
+            params["vote_count.gte"] = min_vote_count
+        if include_adult:
+            params["include_adult"] = "true"
             
-        return self._make_request(endpoint, params)
+        return movie_page(self._make_request(endpoint, params))
     
+    def iter_discover(self,
+                      genres: Optional[List[int]] = None,
+                      year: Optional[int] = None,
+                      sort_by: str = "popularity.desc",
+                      max_pages: int = 5,
+                      max_items: Optional[int] = None,
+                      **filters) -> Iterator[MovieSummary]:
+        """
+        跨页逐个产出发现结果，参见discover_movies和_iter_pages
+
+        参数:
+            filters: 传给discover_movies的其余过滤参数（min_runtime、include_adult等）
+
+        返回:
+            电影迭代器
+        """
+        return self._iter_pages(
+            lambda client, page: client.discover_movies(
+                genres=genres, year=year, sort_by=sort_by, page=page, **filters
+            ),
+            max_pages=max_pages,
+            max_items=max_items
+        )
+
+    def iter_search(self,
+                    query: str,
+                    max_pages: int = 5,
+                    max_items: Optional[int] = None,
+                    **filters) -> Iterator[MovieSummary]:
+        """
+        跨页逐个产出搜索结果，参见search_movies和_iter_pages
+
+        参数:
+            filters: 传给search_movies的其余过滤参数（year、include_adult）
+
+        返回:
+            电影迭代器
+        """
+        return self._iter_pages(
+            lambda client, page: client.search_movies(query, page=page, **filters),
+            max_pages=max_pages,
+            max_items=max_items
+        )
+
+    def iter_recommended(self,
+                         movie_id: int,
+                         max_pages: int = 3,
+                         max_items: Optional[int] = None) -> Iterator[MovieSummary]:
+        """
+        跨页逐个产出推荐结果，参见get_recommended_movies和_iter_pages
+
+        返回:
+            电影迭代器
+        """
+        return self._iter_pages(
+            lambda client, page: client.get_recommended_movies(movie_id, page=page),
+            max_pages=max_pages,
+            max_items=max_items
+        )
+
+    def _iter_pages(self,
+                    fetch_page: Callable[["TMDBApi", int], Dict],
+                    max_pages: int = 5,
+                    max_items: Optional[int] = None) -> Iterator[MovieSummary]:
+        """
+        惰性分页迭代器
+
+        消费第N页时在后台（以后台优先级）预取第N+1页；按电影ID去重，
+        达到页数或条目上限、或服务端没有更多页时停止。
+
+        参数:
+            fetch_page: 获取某一页的函数，参数为(客户端, 页码)
+            max_pages: 最多请求的页数
+            max_items: 最多产出的电影数，None表示不限制
+
+        返回:
+            电影迭代器
+        """
+        executor = self._get_batch_executor()
+        prefetch_client = self.background_client()
+        seen_ids = set()
+        produced = 0
+        page = 1
+        response = fetch_page(self, page)
+
+        while True:
+            total_pages = min(response["total_pages"] or 0, max_pages)
+            next_future = None
+            if page < total_pages and (max_items is None or produced < max_items):
+                next_future = executor.submit(fetch_page, prefetch_client, page + 1)
+
+            for movie in response["results"]:
+                if movie.id in seen_ids:
+                    continue
+                seen_ids.add(movie.id)
+                yield movie
+                produced += 1
+                if max_items is not None and produced >= max_items:
+                    return
+
+            if next_future is None:
+                return
+            page += 1
+            response = next_future.result()
+
+    def get_movie_changes(self,
+                          start_date: Optional[str] = None,
+                          end_date: Optional[str] = None,
+                          page: int = 1) -> Dict:
+        """
+        获取时间窗口内发生过变更的电影ID
+        
+        参数:
+            start_date: 开始日期（YYYY-MM-DD），None表示24小时前
+            end_date: 结束日期（YYYY-MM-DD），窗口最长14天
+            page: 页码
+            
+        返回:
+            分页字典，results中的元素为{"id": 电影ID, "adult": 是否成人内容}
+        """
+        endpoint = "/movie/changes"
+        params = {
+            "start_date": start_date,
+            "end_date": end_date,
+            "page": page
+        }
+        return self._make_request(endpoint, {k: v for k, v in params.items() if v is not None})
+
+    def iter_movie_changes(self,
+                           start_date: Optional[str] = None,
+                           end_date: Optional[str] = None) -> Iterator[int]:
+        """
+        逐页产出时间窗口内变更过的电影ID（已去重），参见get_movie_changes
+
+        返回:
+            电影ID迭代器
+        """
+        seen_ids = set()
+        page = 1
+        while True:
+            response = self.get_movie_changes(start_date, end_date, page=page)
+            for change in response.get("results") or []:
+                movie_id = change.get("id")
+                if movie_id is not None and movie_id not in seen_ids:
+                    seen_ids.add(movie_id)
+                    yield movie_id
+            if page >= (response.get("total_pages") or 0):
+                return
+            page += 1
+
     def get_movie_genres(self) -> Dict:
         """
         获取电影类型列表
@@ -159,19 +908,96 @@ class TMDBApi:
         endpoint = "/genre/movie/list"
         return self._make_request(endpoint)
     
-    def get_image_url(self, path: str) -> str:
+    def get_image_url(self, path: str, display_width: int = 500, dpr: float = 1.0) -> str:
         """
         获取完整的图片URL
         
+        从TMDB的尺寸档位中选择能覆盖"显示宽度×设备像素比"的最小一档；
+        启用图片代理时返回本地代理上按该宽度缩放过的版本。
+        
         参数:
             path: 图片路径
+            display_width: 图片的显示宽度（CSS像素）
+            dpr: 设备像素比，高分屏为2
             
         返回:
             完整的图片URL
         """
         if not path:
             return ""
-        return f"{self.IMAGE_BASE_URL}{path}"
+        pixels = math.ceil(display_width * dpr)
+        if self.image_proxy_url:
+            return f"{self.image_proxy_url}/img/{pixels}{path}"
+        return f"{self.IMAGE_BASE_URL}/w{self.image_size_for(pixels)}{path}"
+
+    @classmethod
+    def image_size_for(cls, pixels: int) -> int:
+        """
+        选择能覆盖指定像素宽度的最小TMDB尺寸档位
+
+        参数:
+            pixels: 需要的实际像素宽度
+
+        返回:
+            档位宽度，超出时取最大一档
+        """
+        for size in cls.IMAGE_SIZES:
+            if size >= pixels:
+                return size
+        return cls.IMAGE_SIZES[-1]
+
+    def get_image_srcset(self, path: str, display_width: int, dprs: Tuple[float, ...] = (1, 2)) -> str:
+        """
+        生成img标签的srcset属性值
+
+        参数:
+            path: 图片路径
+            display_width: 图片的显示宽度（CSS像素）
+            dprs: 需要提供的设备像素比
+
+        返回:
+            形如"url 1x, url 2x"的字符串，相同URL只保留像素比最小的一项
+        """
+        if not path:
+            return ""
+        candidates = []
+        seen = set()
+        for dpr in sorted(dprs):
+            url = self.get_image_url(path, display_width, dpr)
+            if url not in seen:
+                seen.add(url)
+                candidates.append(f"{url} {dpr:g}x")
+        return ", ".join(candidates)
+
+    def get_poster_html(self, path: str, display_width: int, alt: str = "", lazy: bool = True) -> str:
+        """
+        生成海报的img标签
+
+        带srcset和固定的宽高（避免图片加载时页面跳动）；lazy为True时浏览器
+        只在海报即将进入视口时才下载。
+
+        参数:
+            path: 海报路径，为空时使用占位图
+            display_width: 显示宽度（CSS像素）
+            alt: 替代文字
+            lazy: 是否延迟加载
+
+        返回:
+            HTML字符串
+        """
+        height = round(display_width * self.POSTER_ASPECT)
+        if path:
+            src = self.get_image_url(path, display_width)
+            srcset = f' srcset="{html.escape(self.get_image_srcset(path, display_width))}"'
+        else:
+            src = self.POSTER_PLACEHOLDER.format(width=display_width, height=height)
+            srcset = ""
+        loading = "lazy" if lazy else "eager"
+        return (
+            f'<img src="{html.escape(src)}"{srcset} width="{display_width}" height="{height}" '
+            f'alt="{html.escape(alt)}" loading="{loading}" decoding="async" '
+            f'style="max-width:100%;height:auto;">'
+        )
 
 # 使用示例
 if __name__ == "__main__":
@@ -185,17 +1011,17 @@ if __name__ == "__main__":
     # 打印第一个结果
     if movies['results']:
         first_movie = movies['results'][0]
-        print(f"电影: {first_movie['title']}, 评分: {first_movie['vote_average']}")
+        print(f"电影: {first_movie.title}, 评分: {first_movie.vote_average}")
         
         # 获取电影详情
-        movie_id = first_movie['id']
+        movie_id = first_movie.id
         details = tmdb.get_movie_details(movie_id)
-        print(f"片长: {details.get('runtime')} 分钟")
-        print(f"简介: {details.get('overview')}")
+        print(f"片长: {details.runtime} 分钟")
+        print(f"简介: {details.overview}")
         
         # 获取推荐电影
         recommendations = tmdb.get_recommended_movies(movie_id)
         if recommendations['results']:
             print("推荐电影:")
             for movie in recommendations['results'][:3]:
-                print(f" - {movie['title']}")
\ No newline at end of file
+                print(f" - {movie.title}")
\ No newline at end of file
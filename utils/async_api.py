@@ -0,0 +1,232 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Any, Awaitable, Callable, Iterable
+from utils.api import TMDBApi
+from utils.models import Movie
+
+
+async def gather_limited(awaitables: Iterable[Awaitable],
+                         limit: int = 8,
+                         return_exceptions: bool = False) -> List[Any]:
+    """
+    并发执行多个协程，同时运行的数量不超过limit
+
+    参数:
+        awaitables: 协程列表
+        limit: 最大并发数
+        return_exceptions: 为True时异常作为结果返回，而不是中断整个批次
+
+    返回:
+        与输入顺序一致的结果列表
+    """
+    semaphore = asyncio.Semaphore(max(1, limit))
+
+    async def run(awaitable):
+        async with semaphore:
+            return await awaitable
+
+    return await asyncio.gather(
+        *(run(awaitable) for awaitable in awaitables),
+        return_exceptions=return_exceptions
+    )
+
+
+def run_sync(coro: Awaitable) -> Any:
+    """
+    在同步代码（如Streamlit页面）中运行协程
+
+    如果当前线程已有运行中的事件循环，则在独立线程中运行，避免嵌套事件循环。
+
+    参数:
+        coro: 要运行的协程
+
+    返回:
+        协程的返回值
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+
+    result = {}
+
+    def runner():
+        try:
+            result["value"] = asyncio.run(coro)
+        except BaseException as e:
+            result["error"] = e
+
+    thread = threading.Thread(target=runner, daemon=True)
+    thread.start()
+    thread.join()
+    if "error" in result:
+        raise result["error"]
+    return result["value"]
+
+
+class AsyncTMDBApi:
+    """TMDBApi的asyncio版本
+
+    每个请求在专用线程池中通过同步客户端执行，
+    因此与TMDBApi共享连接池和响应缓存。
+    """
+
+    # 进程级共享的线程池，按并发数区分
+    _executors: Dict[int, ThreadPoolExecutor] = {}
+    _executors_lock = threading.Lock()
+
+    def __init__(self, api: TMDBApi, concurrency: int = 8):
+        """
+        初始化异步客户端
+
+        参数:
+            api: 同步TMDB API实例
+            concurrency: 批量请求时的最大并发数
+        """
+        self.api = api
+        self.concurrency = concurrency
+        with self._executors_lock:
+            executor = self._executors.get(concurrency)
+            if executor is None:
+                executor = ThreadPoolExecutor(
+                    max_workers=concurrency,
+                    thread_name_prefix="tmdb-async"
+                )
+                self._executors[concurrency] = executor
+        self._executor = executor
+
+    async def _call(self, func: Callable, *args, **kwargs) -> Any:
+        """在线程池中执行同步API方法"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(func, *args, **kwargs)
+        )
+
+    async def search_movies(self, query: str, page: int = 1, **filters) -> Dict:
+        """搜索电影，参见TMDBApi.search_movies"""
+        return await self._call(self.api.search_movies, query, page, **filters)
+
+    async def get_movie_details(self, movie_id: int, projection: str = "credits") -> Movie:
+        """获取电影详情，参见TMDBApi.get_movie_details"""
+        return await self._call(self.api.get_movie_details, movie_id, projection)
+
+    async def get_movie_bundle(self,
+                               movie_id: int,
+                               parts: Optional[List[str]] = None,
+                               projection: str = "credits") -> Dict:
+        """一次请求获取详情及推荐/相似电影，参见TMDBApi.get_movie_bundle"""
+        return await self._call(self.api.get_movie_bundle, movie_id, parts, projection)
+
+    async def get_recommended_movies(self, movie_id: int, page: int = 1) -> Dict:
+        """获取相似电影推荐，参见TMDBApi.get_recommended_movies"""
+        return await self._call(self.api.get_recommended_movies, movie_id, page)
+
+    async def get_trending_movies(self, time_window: str = "week") -> Dict:
+        """获取热门电影，参见TMDBApi.get_trending_movies"""
+        return await self._call(self.api.get_trending_movies, time_window)
+
+    async def discover_movies(self,
+                              genres: Optional[List[int]] = None,
+                              year: Optional[int] = None,
+                              sort_by: str = "popularity.desc",
+                              page: int = 1,
+                              **filters) -> Dict:
+        """发现电影，参见TMDBApi.discover_movies"""
+        return await self._call(self.api.discover_movies, genres, year, sort_by, page, **filters)
+
+    async def get_movie_genres(self) -> Dict:
+        """获取电影类型列表，参见TMDBApi.get_movie_genres"""
+        return await self._call(self.api.get_movie_genres)
+
+    async def gather_movie_details(self, movie_ids: List[int], projection: str = "credits") -> List[Any]:
+        """
+        并发获取多部电影的详情
+
+        参数:
+            movie_ids: 电影ID列表
+            projection: 详情投影，参见TMDBApi.get_movie_details
+
+        返回:
+            与movie_ids顺序一致的列表，失败的条目为对应的异常对象
+        """
+        return await gather_limited(
+            (self.get_movie_details(movie_id, projection) for movie_id in movie_ids),
+            limit=self.concurrency,
+            return_exceptions=True
+        )
+
+    def get_movie_details_batch(self, movie_ids: List[int], projection: str = "credits") -> List[Any]:
+        """
+        gather_movie_details的同步入口，供Streamlit页面和推荐引擎调用
+
+        参数:
+            movie_ids: 电影ID列表
+            projection: 详情投影，参见TMDBApi.get_movie_details
+
+        返回:
+            与movie_ids顺序一致的列表，失败的条目为对应的异常对象
+        """
+        return run_sync(self.gather_movie_details(movie_ids, projection))
+
+    async def gather_movie_details_many(self,
+                                        movie_ids: List[int],
+                                        projection: str = "credits",
+                                        deadline: Optional[float] = None,
+                                        errors: Optional[Dict[int, Exception]] = None) -> Dict[int, Movie]:
+        """
+        并发批量获取电影详情，语义同TMDBApi.get_movie_details_many
+
+        参数:
+            movie_ids: 电影ID列表，重复的ID只请求一次
+            projection: 详情投影，参见TMDBApi.get_movie_details
+            deadline: 整个批次的最长耗时（秒），None表示不限制
+            errors: 可选字典，用于收集失败的ID及其异常（超时的ID记为TimeoutError）
+
+        返回:
+            按输入顺序排列的{电影ID: 电影详情}字典，只包含成功获取的电影
+        """
+        unique_ids = list(dict.fromkeys(movie_ids))
+        if not unique_ids:
+            return {}
+
+        semaphore = asyncio.Semaphore(max(1, self.concurrency))
+
+        async def fetch(movie_id: int) -> Movie:
+            async with semaphore:
+                return await self.get_movie_details(movie_id, projection)
+
+        tasks = {asyncio.ensure_future(fetch(movie_id)): movie_id for movie_id in unique_ids}
+        done, pending = await asyncio.wait(tasks, timeout=deadline)
+
+        results = {}
+        for task in done:
+            movie_id = tasks[task]
+            try:
+                results[movie_id] = task.result()
+            except Exception as e:
+                if errors is not None:
+                    errors[movie_id] = e
+
+        for task in pending:
+            task.cancel()
+            if errors is not None:
+                errors[tasks[task]] = TimeoutError(f"获取电影 {tasks[task]} 详情超时")
+
+        return {movie_id: results[movie_id] for movie_id in unique_ids if movie_id in results}
+
+    def get_movie_details_many(self,
+                               movie_ids: List[int],
+                               projection: str = "credits",
+                               deadline: Optional[float] = None,
+                               errors: Optional[Dict[int, Exception]] = None) -> Dict[int, Movie]:
+        """
+        gather_movie_details_many的同步入口，供推荐引擎和片长查询调用
+
+        参数同gather_movie_details_many
+
+        返回:
+            按输入顺序排列的{电影ID: 电影详情}字典，只包含成功获取的电影
+        """
+        return run_sync(self.gather_movie_details_many(movie_ids, projection, deadline, errors))
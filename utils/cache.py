@@ -0,0 +1,373 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any, Tuple
+from utils.jsondecode import loads, dumps
+
+
+def make_cache_key(endpoint: str, params: Optional[Dict] = None) -> str:
+    """
+    生成缓存键（终端路径 + 规范化后的查询参数）
+
+    参数:
+        endpoint: API终端路径
+        params: 查询参数
+
+    返回:
+        缓存键字符串
+    """
+    if not params:
+        return endpoint
+    canonical = sorted((str(k), str(v)) for k, v in params.items() if v is not None)
+    return endpoint + "?" + "&".join(f"{k}={v}" for k, v in canonical)
+
+
+class _Entry:
+    """内存缓存条目"""
+
+    __slots__ = ("expires_at", "data", "etag", "last_modified")
+
+    def __init__(self, expires_at: float, data: Any,
+                 etag: Optional[str] = None, last_modified: Optional[str] = None):
+        self.expires_at = expires_at
+        self.data = data
+        self.etag = etag
+        self.last_modified = last_modified
+
+
+class ResponseCache:
+    """TMDB响应的两级缓存：进程内LRU + 磁盘SQLite"""
+
+    # 各终端的缓存有效期（秒），按顺序匹配第一条
+    DEFAULT_TTL_POLICIES: List[Tuple[str, int]] = [
+        (r"^/genre/", 7 * 24 * 3600),
+        (r"^/movie/changes$", 600),
+        (r"^/movie/\d+$", 24 * 3600),
+        (r"^/movie/\d+/(recommendations|similar)$", 12 * 3600),
+        (r"^/trending/", 3600),
+        (r"^/discover/", 6 * 3600),
+        (r"^/search/", 3600),
+    ]
+    DEFAULT_TTL = 3600
+
+    # 带校验器（ETag/Last-Modified）的条目过期后继续保留的时间，用于条件请求重新验证
+    STALE_GRACE = 30 * 24 * 3600
+
+    _default_instance = None
+    _default_lock = threading.Lock()
+
+    # 访问模拟服务器或回放目录时使用的内存缓存，按来源区分
+    _origin_instances: Dict[str, "ResponseCache"] = {}
+
+    def __init__(self,
+                 db_path: Optional[str] = None,
+                 max_memory_entries: int = 2000,
+                 max_disk_bytes: int = 200 * 1024 * 1024,
+                 ttl_policies: Optional[List[Tuple[str, int]]] = None,
+                 default_ttl: int = DEFAULT_TTL):
+        """
+        初始化响应缓存
+
+        参数:
+            db_path: SQLite文件路径，None表示只使用内存缓存
+            max_memory_entries: 内存LRU最多保存的条目数
+            max_disk_bytes: 磁盘缓存的最大字节数，超出后按最近访问时间淘汰
+            ttl_policies: (终端正则, 有效期秒数)列表
+            default_ttl: 未匹配任何策略时的有效期
+        """
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.default_ttl = default_ttl
+        self.ttl_policies = [
+            (re.compile(pattern), ttl)
+            for pattern, ttl in (ttl_policies or self.DEFAULT_TTL_POLICIES)
+        ]
+
+        self._memory: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._writes_since_check = 0
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "sets": 0,
+            "revalidated": 0,
+            "evictions": 0
+        }
+
+        self.db_path = db_path
+        self._conn = None
+        if db_path:
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    endpoint TEXT NOT NULL,
+                    body TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at)"
+            )
+            # 旧版本的缓存文件没有校验器列
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(responses)")}
+            for column in ("etag", "last_modified"):
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE responses ADD COLUMN {column} TEXT")
+            self._conn.commit()
+
+    @classmethod
+    def default(cls) -> "ResponseCache":
+        """
+        获取进程级共享的默认缓存实例
+
+        返回:
+            ResponseCache实例，磁盘文件位于DATA_DIR目录下
+        """
+        with cls._default_lock:
+            if cls._default_instance is None:
+                data_dir = os.environ.get("DATA_DIR", "data")
+                cls._default_instance = cls(os.path.join(data_dir, "tmdb_cache.db"))
+            return cls._default_instance
+
+    @classmethod
+    def for_origin(cls, origin: str) -> "ResponseCache":
+        """
+        获取某个非TMDB来源（模拟服务器地址或回放目录）专用的进程级内存缓存
+
+        缓存键不包含来源，合成或回放的响应不能写入默认缓存，
+        否则之后访问真实TMDB时会命中这些响应。
+
+        参数:
+            origin: 来源标识
+
+        返回:
+            只使用内存的ResponseCache实例
+        """
+        with cls._default_lock:
+            instance = cls._origin_instances.get(origin)
+            if instance is None:
+                instance = cls(None)
+                cls._origin_instances[origin] = instance
+            return instance
+
+    def ttl_for(self, endpoint: str) -> int:
+        """
+        获取终端对应的缓存有效期
+
+        参数:
+            endpoint: API终端路径
+
+        返回:
+            有效期（秒）
+        """
+        for pattern, ttl in self.ttl_policies:
+            if pattern.search(endpoint):
+                return ttl
+        return self.default_ttl
+
+    def get(self, key: str, count_miss: bool = True) -> Optional[Any]:
+        """
+        读取缓存
+
+        参数:
+            key: 缓存键
+            count_miss: 未命中时是否计入统计（探测性查找应传False）
+
+        返回:
+            缓存的响应数据，未命中或已过期时返回None
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry.expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return entry.data
+                if not (entry.etag or entry.last_modified):
+                    del self._memory[key]
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT body, expires_at, etag, last_modified FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[1] > now:
+                    self._conn.execute(
+                        "UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key)
+                    )
+                    self._conn.commit()
+                    data = loads(row[0])
+                    self._remember(key, _Entry(row[1], data, row[2], row[3]))
+                    self.stats["disk_hits"] += 1
+                    return data
+
+            if count_miss:
+                self.stats["misses"] += 1
+            return None
+
+    def get_validators(self, key: str) -> Optional[Tuple[Optional[str], Optional[str]]]:
+        """
+        获取已过期条目的校验器，用于发送条件请求
+
+        参数:
+            key: 缓存键
+
+        返回:
+            (ETag, Last-Modified)元组，条目不存在或没有校验器时返回None
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                validators = (entry.etag, entry.last_modified)
+            elif self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT etag, last_modified FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                validators = tuple(row) if row is not None else (None, None)
+            else:
+                validators = (None, None)
+        return validators if any(validators) else None
+
+    def revalidate(self, endpoint: str, key: str, ttl: Optional[int] = None) -> Optional[Any]:
+        """
+        服务端返回304后延长条目的有效期
+
+        内存中的条目直接复用已解析的数据，不需要重新解析响应体。
+
+        参数:
+            endpoint: API终端路径，用于匹配有效期策略
+            key: 缓存键
+            ttl: 新的有效期（秒），None表示按终端策略决定
+
+        返回:
+            缓存的响应数据，条目已被淘汰时返回None
+        """
+        now = time.time()
+        expires_at = now + (ttl if ttl is not None else self.ttl_for(endpoint))
+        with self._lock:
+            entry = self._memory.get(key)
+            if self._conn is not None:
+                self._conn.execute(
+                    "UPDATE responses SET expires_at = ?, accessed_at = ? WHERE key = ?",
+                    (expires_at, now, key)
+                )
+                self._conn.commit()
+                if entry is None:
+                    row = self._conn.execute(
+                        "SELECT body, etag, last_modified FROM responses WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row is not None:
+                        entry = _Entry(expires_at, loads(row[0]), row[1], row[2])
+            if entry is None:
+                return None
+            entry.expires_at = expires_at
+            self._remember(key, entry)
+            self.stats["revalidated"] += 1
+            return entry.data
+
+    def set(self, endpoint: str, key: str, data: Any, ttl: Optional[int] = None,
+            etag: Optional[str] = None, last_modified: Optional[str] = None) -> None:
+        """
+        写入缓存
+
+        参数:
+            endpoint: API终端路径，用于匹配有效期策略
+            key: 缓存键
+            data: 响应数据（写入后不应再被修改）
+            ttl: 有效期（秒），None表示按终端策略决定
+            etag: 响应的ETag头
+            last_modified: 响应的Last-Modified头
+        """
+        now = time.time()
+        expires_at = now + (ttl if ttl is not None else self.ttl_for(endpoint))
+        with self._lock:
+            self._remember(key, _Entry(expires_at, data, etag, last_modified))
+            self.stats["sets"] += 1
+
+            if self._conn is not None:
+                body = dumps(data)
+                self._conn.execute(
+                    """
+                    INSERT OR REPLACE INTO responses
+                        (key, endpoint, body, size, expires_at, accessed_at, etag, last_modified)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (key, endpoint, body, len(body), expires_at, now, etag, last_modified)
+                )
+                self._conn.commit()
+                self._writes_since_check += 1
+                if self._writes_since_check >= 50:
+                    self._writes_since_check = 0
+                    self._evict_disk()
+
+    def clear(self) -> None:
+        """清空两级缓存"""
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM responses")
+                self._conn.commit()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取缓存命中统计
+
+        返回:
+            包含命中/未命中计数和命中率的字典
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def _remember(self, key: str, entry: _Entry) -> None:
+        """写入内存LRU并按条目数淘汰最久未使用的条目"""
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _evict_disk(self) -> None:
+        """删除过期条目，并在超出容量时按最近访问时间淘汰"""
+        now = time.time()
+        # 带校验器的过期条目保留一段时间，以便用条件请求低成本地重新验证
+        cursor = self._conn.execute(
+            """
+            DELETE FROM responses
+            WHERE (expires_at <= ? AND etag IS NULL AND last_modified IS NULL)
+               OR expires_at <= ?
+            """,
+            (now, now - self.STALE_GRACE)
+        )
+        self.stats["evictions"] += cursor.rowcount
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total > self.max_disk_bytes:
+            excess = total - self.max_disk_bytes
+            freed = 0
+            victims = []
+            for key, size in self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY accessed_at ASC"
+            ):
+                victims.append((key,))
+                freed += size
+                if freed >= excess:
+                    break
+            self._conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+            self.stats["evictions"] += len(victims)
+        self._conn.commit()
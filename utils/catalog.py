@@ -0,0 +1,606 @@
+import argparse
+import gzip
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Any, Iterator, Iterable, Tuple, Callable, Set
+from utils.api import TMDBApi
+from utils.models import Movie
+
+
+class MovieCatalog:
+    """本地电影目录（SQLite）
+
+    由TMDB每日导出的电影ID文件批量抓取详情构建，供候选生成等离线使用。
+    每次写入后递增目录版本号，依赖目录构建的索引可据此判断是否需要重建。
+    """
+
+    COLUMNS = (
+        "id", "title", "original_title", "release_year", "runtime", "genre_ids",
+        "vote_average", "vote_count", "popularity", "poster_path", "overview", "adult",
+        "top_cast", "directors"
+    )
+
+    # 抓取详情时使用的投影：附带演职人员，供相似度索引使用（仍是一次请求）
+    DETAIL_PROJECTION = "credits"
+
+    # 后来增加的列及其定义，打开旧数据库时自动补上
+    ADDED_COLUMNS = {
+        "top_cast": "TEXT NOT NULL DEFAULT ''",
+        "directors": "TEXT NOT NULL DEFAULT ''"
+    }
+
+    # 主演和导演列中名字的分隔符
+    NAME_SEPARATOR = "|"
+
+    _default_instance = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, db_path: str):
+        """
+        打开（必要时创建）目录数据库
+
+        参数:
+            db_path: SQLite文件路径
+        """
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS movies (
+                id INTEGER PRIMARY KEY,
+                title TEXT NOT NULL,
+                original_title TEXT NOT NULL,
+                release_year INTEGER,
+                runtime INTEGER NOT NULL,
+                genre_ids TEXT NOT NULL,
+                vote_average REAL NOT NULL,
+                vote_count INTEGER NOT NULL,
+                popularity REAL NOT NULL,
+                poster_path TEXT,
+                overview TEXT NOT NULL,
+                adult INTEGER NOT NULL,
+                updated_at REAL NOT NULL,
+                top_cast TEXT NOT NULL DEFAULT '',
+                directors TEXT NOT NULL DEFAULT ''
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS versions (
+                version INTEGER PRIMARY KEY,
+                kind TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS changelog (
+                version INTEGER NOT NULL,
+                id INTEGER NOT NULL,
+                PRIMARY KEY (version, id)
+            );
+            CREATE TABLE IF NOT EXISTS failures (
+                id INTEGER PRIMARY KEY,
+                error TEXT NOT NULL,
+                attempts INTEGER NOT NULL,
+                failed_at REAL NOT NULL
+            );
+            """
+        )
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(movies)")}
+        for column, definition in self.ADDED_COLUMNS.items():
+            if column not in existing:
+                self._conn.execute(f"ALTER TABLE movies ADD COLUMN {column} {definition}")
+        self._conn.commit()
+
+    @classmethod
+    def default(cls) -> "MovieCatalog":
+        """
+        获取进程级共享的默认目录
+
+        返回:
+            MovieCatalog实例，数据库位于DATA_DIR/catalog.db
+        """
+        with cls._default_lock:
+            if cls._default_instance is None:
+                data_dir = os.environ.get("DATA_DIR", "data")
+                cls._default_instance = cls(os.path.join(data_dir, "catalog.db"))
+            return cls._default_instance
+
+    @classmethod
+    def row_from_movie(cls, movie: Movie) -> Tuple:
+        """
+        把电影详情记录转换为目录表的一行
+
+        参数:
+            movie: 电影详情记录
+
+        返回:
+            与COLUMNS顺序一致的元组
+        """
+        year = movie.year
+        return (
+            movie.id,
+            movie.title,
+            movie.original_title,
+            int(year) if year.isdigit() else None,
+            movie.runtime,
+            ",".join(str(genre_id) for genre_id in movie.genre_ids),
+            movie.vote_average,
+            movie.vote_count,
+            movie.popularity,
+            movie.poster_path,
+            movie.overview,
+            int(movie.adult),
+            cls.NAME_SEPARATOR.join(movie.cast),
+            cls.NAME_SEPARATOR.join(movie.directors)
+        )
+
+    def upsert_movies(self, movies: Iterable[Movie]) -> int:
+        """
+        写入或更新电影
+
+        参数:
+            movies: 电影详情记录
+
+        返回:
+            写入的行数
+        """
+        now = time.time()
+        rows = [self.row_from_movie(movie) + (now,) for movie in movies]
+        if not rows:
+            return 0
+        placeholders = ", ".join("?" * (len(self.COLUMNS) + 1))
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO movies ({', '.join(self.COLUMNS)}, updated_at) VALUES ({placeholders})",
+                rows
+            )
+            self._conn.executemany("DELETE FROM failures WHERE id = ?", [(row[0],) for row in rows])
+            self._conn.commit()
+        return len(rows)
+
+    def record_failures(self, errors: Dict[int, Exception]) -> None:
+        """
+        记录抓取失败的电影ID，供之后重试
+
+        参数:
+            errors: {电影ID: 异常}
+        """
+        if not errors:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                """
+                INSERT INTO failures (id, error, attempts, failed_at) VALUES (?, ?, 1, ?)
+                ON CONFLICT(id) DO UPDATE SET error = excluded.error,
+                    attempts = attempts + 1, failed_at = excluded.failed_at
+                """,
+                [(movie_id, str(error)[:200], now) for movie_id, error in errors.items()]
+            )
+            self._conn.commit()
+
+    def get_failed_ids(self, max_attempts: int = 3) -> List[int]:
+        """
+        获取需要重试的失败ID
+
+        参数:
+            max_attempts: 失败次数达到该值的ID不再重试
+
+        返回:
+            电影ID列表
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM failures WHERE attempts < ? ORDER BY id", (max_attempts,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def get_movie(self, movie_id: int) -> Optional[Dict[str, Any]]:
+        """
+        读取一部电影
+
+        参数:
+            movie_id: 电影ID
+
+        返回:
+            列名到值的字典（genre_ids为整数列表，top_cast和directors为名字列表），不存在时返回None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM movies WHERE id = ?", (movie_id,)
+            ).fetchone()
+        return self._row_dict(row) if row is not None else None
+
+    def iter_movies(self, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """
+        按ID顺序逐批读取全部电影，不会一次把整张表读入内存
+
+        参数:
+            batch_size: 每次查询的行数
+
+        返回:
+            电影字典迭代器，字段同get_movie
+        """
+        last_id = -1
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT {', '.join(self.COLUMNS)} FROM movies WHERE id > ? ORDER BY id LIMIT ?",
+                    (last_id, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield self._row_dict(row)
+            last_id = rows[-1][0]
+
+    def count(self) -> int:
+        """目录中的电影数量"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM movies").fetchone()[0]
+
+    @property
+    def version(self) -> int:
+        """目录版本号，每次导入或同步写入数据后递增"""
+        value = self.get_meta("version")
+        return int(value) if value is not None else 0
+
+    def bump_version(self, changed_ids: Optional[Iterable[int]] = None) -> int:
+        """
+        递增目录版本号
+
+        参数:
+            changed_ids: 本版本中变化的电影ID；None表示整体重建（如批量导入），
+                         派生索引需要完全重建
+
+        返回:
+            新的版本号
+        """
+        with self._lock:
+            version = self.version + 1
+            kind = "full" if changed_ids is None else "incremental"
+            self._conn.execute(
+                "INSERT OR REPLACE INTO versions (version, kind, created_at) VALUES (?, ?, ?)",
+                (version, kind, time.time())
+            )
+            if changed_ids is not None:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO changelog (version, id) VALUES (?, ?)",
+                    [(version, movie_id) for movie_id in changed_ids]
+                )
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (str(version),))
+            self._conn.commit()
+            return version
+
+    def changed_since(self, version: int) -> Optional[Set[int]]:
+        """
+        获取某个版本之后变化过的电影ID，供派生的缓存和索引做增量失效
+
+        参数:
+            version: 调用方上次构建时的目录版本号
+
+        返回:
+            电影ID集合；期间有整体重建（或版本记录缺失）时返回None，表示需要完全重建
+        """
+        with self._lock:
+            current = self.version
+            if version >= current:
+                return set()
+            kinds = self._conn.execute(
+                "SELECT kind FROM versions WHERE version > ?", (version,)
+            ).fetchall()
+            if len(kinds) < current - version or any(kind == "full" for (kind,) in kinds):
+                return None
+            rows = self._conn.execute(
+                "SELECT DISTINCT id FROM changelog WHERE version > ?", (version,)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def contains(self, movie_ids: Iterable[int]) -> Set[int]:
+        """
+        筛选出目录中已有的电影ID
+
+        参数:
+            movie_ids: 电影ID
+
+        返回:
+            其中已在目录中的ID集合
+        """
+        movie_ids = list(movie_ids)
+        found = set()
+        with self._lock:
+            for offset in range(0, len(movie_ids), 500):
+                chunk = movie_ids[offset:offset + 500]
+                rows = self._conn.execute(
+                    f"SELECT id FROM movies WHERE id IN ({', '.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                found.update(row[0] for row in rows)
+        return found
+
+    def get_meta(self, key: str) -> Optional[str]:
+        """读取元数据（检查点、版本号等）"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row is not None else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        """写入元数据"""
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+            self._conn.commit()
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+    def _row_dict(self, row: Tuple) -> Dict[str, Any]:
+        movie = dict(zip(self.COLUMNS, row))
+        movie["genre_ids"] = [int(genre_id) for genre_id in movie["genre_ids"].split(",") if genre_id]
+        movie["adult"] = bool(movie["adult"])
+        for column in ("top_cast", "directors"):
+            movie[column] = [name for name in movie[column].split(self.NAME_SEPARATOR) if name]
+        return movie
+
+
+def iter_export(path: str,
+                min_popularity: float = 0.0,
+                include_adult: bool = False,
+                start_line: int = 0) -> Iterator[Tuple[int, int]]:
+    """
+    流式读取TMDB每日导出文件（gzip压缩的JSONL，每行一部电影的ID和热度）
+
+    参数:
+        path: 导出文件路径（.json.gz，也接受未压缩的.json）
+        min_popularity: 低于该热度的电影跳过
+        include_adult: 是否包含成人内容
+        start_line: 从第几行开始（断点续传时跳过已处理的行）
+
+    返回:
+        (行号, 电影ID)迭代器，行号从1开始
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            if line_number <= start_line or not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                print(f"导出文件第{line_number}行无法解析，已跳过")
+                continue
+            if entry.get("video") or (entry.get("adult") and not include_adult):
+                continue
+            if (entry.get("popularity") or 0.0) < min_popularity:
+                continue
+            yield line_number, entry["id"]
+
+
+def hydrate(api: TMDBApi,
+            catalog: MovieCatalog,
+            movie_ids: List[int],
+            errors: Optional[Dict[int, Exception]] = None) -> int:
+    """
+    抓取一批电影的详情并写入目录
+
+    并发度由TMDBApi的批量线程池和限流器约束。
+
+    参数:
+        api: TMDB API实例
+        catalog: 目标目录
+        movie_ids: 电影ID列表
+        errors: 可选字典，收集失败的ID及其异常
+
+    返回:
+        成功写入的电影数
+    """
+    batch_errors: Dict[int, Exception] = {}
+    details = api.get_movie_details_many(
+        movie_ids, projection=MovieCatalog.DETAIL_PROJECTION, errors=batch_errors
+    )
+    written = catalog.upsert_movies(details.values())
+    catalog.record_failures(batch_errors)
+    if errors is not None:
+        errors.update(batch_errors)
+    return written
+
+
+def ingest_export(api: TMDBApi,
+                  catalog: MovieCatalog,
+                  export_path: str,
+                  min_popularity: float = 0.0,
+                  include_adult: bool = False,
+                  max_movies: Optional[int] = None,
+                  batch_size: int = 200,
+                  resume: bool = True,
+                  progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """
+    从每日导出文件构建本地目录
+
+    逐行读取导出文件，每凑够batch_size个ID就并发抓取详情并写入目录，
+    每批提交后记录已处理到的行号，中断后再次运行会从该行继续。
+
+    参数:
+        api: TMDB API实例（建议关闭响应缓存并使用后台优先级）
+        catalog: 目标目录
+        export_path: 导出文件路径
+        min_popularity: 低于该热度的电影跳过
+        include_adult: 是否包含成人内容
+        max_movies: 本次最多处理的电影数，None表示处理整个文件
+        batch_size: 每批抓取的电影数
+        resume: 是否从上次的检查点继续
+        progress: 每批完成后调用的回调，参数为当前统计
+
+    返回:
+        统计字典：processed、written、failed、last_line、seconds、version
+    """
+    checkpoint_key = f"ingest:{os.path.basename(export_path)}"
+    start_line = int(catalog.get_meta(checkpoint_key) or 0) if resume else 0
+    stats = {"processed": 0, "written": 0, "failed": 0, "last_line": start_line}
+    started = time.monotonic()
+
+    batch: List[int] = []
+    batch_end_line = start_line
+
+    def flush() -> None:
+        errors: Dict[int, Exception] = {}
+        stats["written"] += hydrate(api, catalog, batch, errors)
+        stats["failed"] += len(errors)
+        stats["processed"] += len(batch)
+        stats["last_line"] = batch_end_line
+        catalog.set_meta(checkpoint_key, str(batch_end_line))
+        batch.clear()
+        if progress is not None:
+            progress(dict(stats, seconds=time.monotonic() - started))
+
+    for line_number, movie_id in iter_export(export_path, min_popularity, include_adult, start_line):
+        batch.append(movie_id)
+        batch_end_line = line_number
+        if len(batch) >= batch_size:
+            flush()
+        if max_movies is not None and stats["processed"] + len(batch) >= max_movies:
+            break
+    if batch:
+        flush()
+
+    stats["seconds"] = time.monotonic() - started
+    stats["version"] = catalog.bump_version() if stats["written"] else catalog.version
+    return stats
+
+
+def sync_changes(api: TMDBApi,
+                 catalog: MovieCatalog,
+                 start_date: Optional[date] = None,
+                 end_date: Optional[date] = None,
+                 include_new: bool = False,
+                 batch_size: int = 200) -> Dict[str, Any]:
+    """
+    根据/movie/changes增量同步目录
+
+    只重新抓取时间窗口内变更过的电影（默认只处理目录中已有的电影），
+    写入后递增目录版本号并记录变化的ID，派生索引可以只更新这些电影。
+    窗口超过TMDB允许的14天时自动分段。
+
+    参数:
+        api: TMDB API实例（建议关闭响应缓存并使用后台优先级）
+        catalog: 目标目录
+        start_date: 窗口开始日期，None表示上次同步的结束日期（从未同步过时为1天前）
+        end_date: 窗口结束日期，None表示今天
+        include_new: 是否把目录中还没有的电影也加入目录
+        batch_size: 每批抓取的电影数
+
+    返回:
+        统计字典：changed、refetched、written、failed、seconds、version
+    """
+    end_date = end_date or date.today()
+    if start_date is None:
+        last_sync = catalog.get_meta("sync:last_date")
+        start_date = date.fromisoformat(last_sync) if last_sync else end_date - timedelta(days=1)
+    stats = {"changed": 0, "refetched": 0, "written": 0, "failed": 0}
+    started = time.monotonic()
+    written_ids: Set[int] = set()
+
+    window_start = start_date
+    while window_start <= end_date:
+        window_end = min(end_date, window_start + timedelta(days=13))
+        changed_ids = list(api.iter_movie_changes(str(window_start), str(window_end)))
+        stats["changed"] += len(changed_ids)
+        if not include_new:
+            known = catalog.contains(changed_ids)
+            changed_ids = [movie_id for movie_id in changed_ids if movie_id in known]
+
+        for offset in range(0, len(changed_ids), batch_size):
+            batch = changed_ids[offset:offset + batch_size]
+            errors: Dict[int, Exception] = {}
+            details = api.get_movie_details_many(batch, projection=MovieCatalog.DETAIL_PROJECTION, errors=errors)
+            stats["written"] += catalog.upsert_movies(details.values())
+            catalog.record_failures(errors)
+            written_ids.update(details)
+            stats["refetched"] += len(batch)
+            stats["failed"] += len(errors)
+        window_start = window_end + timedelta(days=1)
+
+    catalog.set_meta("sync:last_date", str(end_date))
+    stats["seconds"] = time.monotonic() - started
+    stats["version"] = catalog.bump_version(written_ids) if written_ids else catalog.version
+    return stats
+
+
+def main():
+    """命令行入口：python -m utils.catalog ingest movie_ids_05_15_2024.json.gz"""
+    parser = argparse.ArgumentParser(description="本地电影目录")
+    parser.add_argument("--db", help="目录数据库路径，默认DATA_DIR/catalog.db")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest = subparsers.add_parser("ingest", help="从TMDB每日导出文件构建目录")
+    ingest.add_argument("export", help="导出文件路径（movie_ids_MM_DD_YYYY.json.gz）")
+    ingest.add_argument("--min-popularity", type=float, default=0.0, help="跳过热度低于该值的电影")
+    ingest.add_argument("--include-adult", action="store_true", help="包含成人内容")
+    ingest.add_argument("--limit", type=int, help="本次最多处理的电影数")
+    ingest.add_argument("--batch-size", type=int, default=200, help="每批抓取的电影数")
+    ingest.add_argument("--no-resume", action="store_true", help="忽略检查点，从头开始")
+    ingest.add_argument("--retry-failures", action="store_true", help="先重试之前失败的电影")
+
+    sync = subparsers.add_parser("sync", help="根据TMDB变更列表增量更新目录")
+    sync.add_argument("--start-date", help="窗口开始日期（YYYY-MM-DD），默认接着上次同步")
+    sync.add_argument("--end-date", help="窗口结束日期（YYYY-MM-DD），默认今天")
+    sync.add_argument("--include-new", action="store_true", help="同时加入目录中还没有的电影")
+    sync.add_argument("--batch-size", type=int, default=200, help="每批抓取的电影数")
+
+    args = parser.parse_args()
+    catalog = MovieCatalog(args.db) if args.db else MovieCatalog.default()
+    # 批量抓取不经过响应缓存，并让出带宽给交互式请求
+    api = TMDBApi(os.environ.get("TMDB_API_KEY", ""), use_cache=False).background_client()
+
+    if args.command == "ingest":
+        if args.retry_failures:
+            failed_ids = catalog.get_failed_ids()
+            errors: Dict[int, Exception] = {}
+            for offset in range(0, len(failed_ids), args.batch_size):
+                hydrate(api, catalog, failed_ids[offset:offset + args.batch_size], errors=errors)
+            # 重试写入的电影按增量版本记录，派生索引只需更新这些电影
+            retried_ids = [movie_id for movie_id in failed_ids if movie_id not in errors]
+            if retried_ids:
+                catalog.bump_version(retried_ids)
+            print(f"已重试 {len(failed_ids)} 部之前失败的电影（成功 {len(retried_ids)} 部）")
+
+        def report(stats: Dict[str, Any]) -> None:
+            rate = stats["processed"] / stats["seconds"] if stats["seconds"] else 0.0
+            print(f"已处理 {stats['processed']} 部（写入 {stats['written']}，失败 {stats['failed']}），"
+                  f"导出文件第 {stats['last_line']} 行，{rate:.1f} 部/秒")
+
+        stats = ingest_export(
+            api, catalog, args.export,
+            min_popularity=args.min_popularity,
+            include_adult=args.include_adult,
+            max_movies=args.limit,
+            batch_size=args.batch_size,
+            resume=not args.no_resume,
+            progress=report
+        )
+        print(f"完成：目录共 {catalog.count()} 部电影，版本 {stats['version']}")
+
+    elif args.command == "sync":
+        stats = sync_changes(
+            api, catalog,
+            start_date=date.fromisoformat(args.start_date) if args.start_date else None,
+            end_date=date.fromisoformat(args.end_date) if args.end_date else None,
+            include_new=args.include_new,
+            batch_size=args.batch_size
+        )
+        print(f"变更 {stats['changed']} 部，重新抓取 {stats['refetched']} 部（写入 {stats['written']}，"
+              f"失败 {stats['failed']}），目录版本 {stats['version']}")
+
+
+if __name__ == "__main__":
+    main()
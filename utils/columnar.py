@@ -0,0 +1,382 @@
+import argparse
+import json
+import os
+import shutil
+import threading
+from typing import Dict, List, Optional, Any, Iterable, Tuple
+import numpy as np
+from utils.catalog import MovieCatalog
+from utils.genres import BIT_GENRES, GENRE_BITS, genre_mask
+from utils.models import MovieSummary
+
+
+def genres_from_mask(mask: int) -> Tuple[int, ...]:
+    """
+    把32位掩码解码为类型ID
+
+    参数:
+        mask: 位掩码
+
+    返回:
+        类型ID元组
+    """
+    return tuple(genre_id for bit, genre_id in BIT_GENRES.items() if mask & (1 << bit))
+
+
+class ColumnarCatalog:
+    """列式存储的本地目录
+
+    每个数值列是一个.npy文件，通过内存映射打开：多个Streamlit工作进程共享
+    操作系统页缓存中的同一份数据，而不是各自在Python对象里保存一份。
+    字符串列存放在连续的UTF-8字节块中，另有偏移数组指出每一行的起止位置。
+
+    目录下按目录版本号分子目录存放，CURRENT文件指向当前版本，
+    重建时写入新的子目录后再切换，不影响正在读取旧版本的进程。
+    """
+
+    # 数值列及其类型
+    NUMERIC_COLUMNS = {
+        "id": np.int32,
+        "runtime": np.int16,
+        "year": np.int16,
+        "vote_average": np.float32,
+        "vote_count": np.int32,
+        "popularity": np.float32,
+        "genres": np.uint32,
+        "adult": np.bool_
+    }
+    STRING_COLUMNS = ("title", "original_title", "poster_path", "overview")
+
+    _default_instance = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, path: str):
+        """
+        以内存映射方式打开某个版本的列式目录
+
+        参数:
+            path: 版本子目录
+        """
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.version = self.meta["version"]
+        self.size = self.meta["size"]
+        self.columns: Dict[str, np.ndarray] = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+            for name in self.NUMERIC_COLUMNS
+        }
+        self._blobs: Dict[str, np.ndarray] = {}
+        self._offsets: Dict[str, np.ndarray] = {}
+        for name in self.STRING_COLUMNS:
+            self._offsets[name] = np.load(os.path.join(path, f"{name}.offsets.npy"), mmap_mode="r")
+            blob_path = os.path.join(path, f"{name}.blob")
+            # 空文件不能做内存映射
+            self._blobs[name] = (
+                np.memmap(blob_path, dtype=np.uint8, mode="r")
+                if os.path.getsize(blob_path) else np.zeros(0, dtype=np.uint8)
+            )
+
+    @classmethod
+    def open(cls, directory: str) -> Optional["ColumnarCatalog"]:
+        """
+        打开目录下的当前版本
+
+        参数:
+            directory: 列式目录的根目录
+
+        返回:
+            ColumnarCatalog实例，尚未构建时返回None
+        """
+        current = cls._read_current(directory)
+        return cls(os.path.join(directory, current)) if current else None
+
+    @classmethod
+    def default(cls) -> Optional["ColumnarCatalog"]:
+        """
+        获取进程级共享的列式目录（DATA_DIR/columnar），有新版本时自动切换
+
+        返回:
+            ColumnarCatalog实例，尚未构建时返回None
+        """
+        directory = os.path.join(os.environ.get("DATA_DIR", "data"), "columnar")
+        current = cls._read_current(directory)
+        with cls._default_lock:
+            instance = cls._default_instance
+            if current is None:
+                return instance
+            if instance is None or os.path.basename(instance.path) != current:
+                instance = cls(os.path.join(directory, current))
+                cls._default_instance = instance
+            return instance
+
+    @staticmethod
+    def _read_current(directory: str) -> Optional[str]:
+        try:
+            with open(os.path.join(directory, "CURRENT"), "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    @classmethod
+    def build(cls, catalog: MovieCatalog, directory: str, keep_versions: int = 2) -> "ColumnarCatalog":
+        """
+        从SQLite目录构建列式文件
+
+        按ID顺序流式读取目录，数值列直接写入磁盘上的.npy文件（open_memmap），
+        字符串逐行追加到字节块文件，构建过程不需要把整个目录读入内存。
+        同一目录版本已构建过时直接打开。
+
+        参数:
+            catalog: 源目录
+            directory: 列式目录的根目录
+            keep_versions: 保留的历史版本数（供仍在读取旧版本的进程使用）
+
+        返回:
+            新构建（或已存在）的ColumnarCatalog
+        """
+        version = catalog.version
+        name = f"v{version}"
+        target = os.path.join(directory, name)
+        if cls._read_current(directory) == name and os.path.exists(os.path.join(target, "meta.json")):
+            return cls(target)
+
+        size = catalog.count()
+        staging = f"{target}.{os.getpid()}.tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+
+        columns = {
+            column: np.lib.format.open_memmap(
+                os.path.join(staging, f"{column}.npy"), mode="w+", dtype=dtype, shape=(size,)
+            )
+            for column, dtype in cls.NUMERIC_COLUMNS.items()
+        }
+        offsets = {
+            column: np.lib.format.open_memmap(
+                os.path.join(staging, f"{column}.offsets.npy"), mode="w+", dtype=np.uint64, shape=(size + 1,)
+            )
+            for column in cls.STRING_COLUMNS
+        }
+        blobs = {column: open(os.path.join(staging, f"{column}.blob"), "wb") for column in cls.STRING_COLUMNS}
+        positions = {column: 0 for column in cls.STRING_COLUMNS}
+
+        try:
+            row = 0
+            for movie in catalog.iter_movies():
+                if row >= size:
+                    break
+                columns["id"][row] = movie["id"]
+                columns["runtime"][row] = min(movie["runtime"] or 0, np.iinfo(np.int16).max)
+                columns["year"][row] = movie["release_year"] or 0
+                columns["vote_average"][row] = movie["vote_average"]
+                columns["vote_count"][row] = movie["vote_count"]
+                columns["popularity"][row] = movie["popularity"]
+                columns["genres"][row] = genre_mask(movie["genre_ids"])
+                columns["adult"][row] = movie["adult"]
+                for column in cls.STRING_COLUMNS:
+                    encoded = (movie[column] or "").encode("utf-8")
+                    offsets[column][row] = positions[column]
+                    blobs[column].write(encoded)
+                    positions[column] += len(encoded)
+                row += 1
+            for column in cls.STRING_COLUMNS:
+                offsets[column][row] = positions[column]
+        finally:
+            for blob in blobs.values():
+                blob.close()
+
+        for array in list(columns.values()) + list(offsets.values()):
+            array.flush()
+        del columns, offsets
+
+        if row < size:
+            # 构建期间目录行数变少（极少见），截断到实际行数
+            for column in cls.NUMERIC_COLUMNS:
+                path = os.path.join(staging, f"{column}.npy")
+                np.save(path, np.load(path)[:row])
+            for column in cls.STRING_COLUMNS:
+                path = os.path.join(staging, f"{column}.offsets.npy")
+                np.save(path, np.load(path)[:row + 1])
+
+        meta = {
+            "version": version,
+            "size": row,
+            "genre_bits": {str(genre_id): bit for genre_id, bit in GENRE_BITS.items()}
+        }
+        with open(os.path.join(staging, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(staging, target)
+        current_tmp = os.path.join(directory, f"CURRENT.{os.getpid()}.tmp")
+        with open(current_tmp, "w", encoding="utf-8") as f:
+            f.write(name)
+        os.replace(current_tmp, os.path.join(directory, "CURRENT"))
+        cls.prune_versions(directory, keep_versions)
+        return cls(target)
+
+    @staticmethod
+    def prune_versions(directory: str, keep_versions: int) -> None:
+        """
+        删除较早的版本子目录（名为v<版本号>），只保留最新的几个
+
+        参数:
+            directory: 根目录
+            keep_versions: 保留的版本数
+        """
+        versions = sorted(
+            (int(entry[1:]), entry) for entry in os.listdir(directory)
+            if entry.startswith("v") and entry[1:].isdigit()
+        )
+        for _, entry in versions[:-keep_versions]:
+            shutil.rmtree(os.path.join(directory, entry), ignore_errors=True)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def get_string(self, column: str, index: int) -> str:
+        """
+        读取字符串列中的一个值
+
+        参数:
+            column: 列名（title、original_title、poster_path、overview）
+            index: 行号
+
+        返回:
+            字符串
+        """
+        offsets = self._offsets[column]
+        start, end = int(offsets[index]), int(offsets[index + 1])
+        return self._blobs[column][start:end].tobytes().decode("utf-8")
+
+    def index_of(self, movie_id: int) -> Optional[int]:
+        """
+        查找电影所在的行号（id列按升序存放，二分查找）
+
+        参数:
+            movie_id: 电影ID
+
+        返回:
+            行号，不存在时返回None
+        """
+        ids = self.columns["id"]
+        index = int(np.searchsorted(ids, movie_id))
+        if index < self.size and ids[index] == movie_id:
+            return index
+        return None
+
+    def filter(self,
+               genres_any: Optional[Iterable[int]] = None,
+               genres_all: Optional[Iterable[int]] = None,
+               runtime_range: Optional[Tuple[int, int]] = None,
+               year_range: Optional[Tuple[int, int]] = None,
+               min_vote_average: Optional[float] = None,
+               min_vote_count: Optional[int] = None,
+               include_adult: bool = False) -> np.ndarray:
+        """
+        对整个目录做向量化筛选
+
+        参数:
+            genres_any: 至少包含其中一个类型
+            genres_all: 包含全部这些类型
+            runtime_range: 片长范围[下限, 上限)（分钟）
+            year_range: 上映年份范围[下限, 上限]
+            min_vote_average: 最低评分
+            min_vote_count: 最少评分人数
+            include_adult: 是否包含成人内容
+
+        返回:
+            满足条件的行号数组
+        """
+        columns = self.columns
+        mask = np.ones(self.size, dtype=bool)
+        if genres_any:
+            mask &= (columns["genres"] & np.uint32(genre_mask(genres_any))) != 0
+        if genres_all:
+            required = np.uint32(genre_mask(genres_all))
+            mask &= (columns["genres"] & required) == required
+        if runtime_range is not None:
+            low, high = runtime_range
+            runtime = columns["runtime"]
+            mask &= (runtime >= low) & (runtime < high)
+        if year_range is not None:
+            low, high = year_range
+            year = columns["year"]
+            mask &= (year >= low) & (year <= high)
+        if min_vote_average is not None:
+            mask &= columns["vote_average"] >= min_vote_average
+        if min_vote_count is not None:
+            mask &= columns["vote_count"] >= min_vote_count
+        if not include_adult:
+            mask &= ~columns["adult"]
+        return np.flatnonzero(mask)
+
+    def top(self, indices: np.ndarray, column: str = "popularity", k: int = 20) -> np.ndarray:
+        """
+        按某一列从高到低取前k行（argpartition，只对前k个排序）
+
+        参数:
+            indices: 候选行号
+            column: 排序列
+            k: 数量
+
+        返回:
+            行号数组
+        """
+        if len(indices) == 0:
+            return indices
+        values = self.columns[column][indices]
+        k = min(k, len(indices))
+        part = np.argpartition(-values, k - 1)[:k]
+        return indices[part[np.argsort(-values[part], kind="stable")]]
+
+    def movie(self, index: int) -> MovieSummary:
+        """
+        把某一行转换为MovieSummary记录
+
+        参数:
+            index: 行号
+
+        返回:
+            MovieSummary实例（release_date只有年份精度）
+        """
+        columns = self.columns
+        year = int(columns["year"][index])
+        return MovieSummary(
+            int(columns["id"][index]),
+            title=self.get_string("title", index),
+            original_title=self.get_string("original_title", index),
+            overview=self.get_string("overview", index),
+            poster_path=self.get_string("poster_path", index) or None,
+            release_date=str(year) if year else "",
+            vote_average=round(float(columns["vote_average"][index]), 1),
+            vote_count=int(columns["vote_count"][index]),
+            popularity=float(columns["popularity"][index]),
+            genre_ids=genres_from_mask(int(columns["genres"][index])),
+            adult=bool(columns["adult"][index])
+        )
+
+    def movies(self, indices: Iterable[int]) -> List[MovieSummary]:
+        """批量转换为MovieSummary记录，参见movie"""
+        return [self.movie(int(index)) for index in indices]
+
+
+def main():
+    """命令行入口：python -m utils.columnar build"""
+    parser = argparse.ArgumentParser(description="列式本地目录")
+    parser.add_argument("--db", help="SQLite目录路径，默认DATA_DIR/catalog.db")
+    parser.add_argument("--directory", help="列式目录的根目录，默认DATA_DIR/columnar")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("build", help="从SQLite目录构建列式文件")
+    args = parser.parse_args()
+
+    catalog = MovieCatalog(args.db) if args.db else MovieCatalog.default()
+    directory = args.directory or os.path.join(os.environ.get("DATA_DIR", "data"), "columnar")
+    if args.command == "build":
+        columnar = ColumnarCatalog.build(catalog, directory)
+        print(f"列式目录已就绪: {columnar.path}（{len(columnar)} 部电影，目录版本 {columnar.version}）")
+
+
+if __name__ == "__main__":
+    main()
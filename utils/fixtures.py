@@ -0,0 +1,81 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Optional, Any
+
+
+class FixtureStore:
+    """录制/回放用的TMDB响应夹具目录
+
+    每个请求（终端路径 + 规范化参数，即缓存键）对应一个JSON文件。
+    TMDBApi的录制模式把真实响应写入这里，回放模式和本地模拟服务器从这里读取。
+    """
+
+    def __init__(self, directory: str):
+        """
+        初始化夹具目录
+
+        参数:
+            directory: 夹具文件所在目录，不存在时自动创建
+        """
+        self.directory = directory
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, key: str) -> str:
+        """
+        获取请求键对应的夹具文件路径
+
+        参数:
+            key: 请求键（make_cache_key的结果）
+
+        返回:
+            文件路径
+        """
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:20]
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        读取夹具
+
+        参数:
+            key: 请求键
+
+        返回:
+            {"key", "endpoint", "params", "status", "headers", "body"}字典，不存在时返回None
+        """
+        path = self.path_for(key)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save(self, key: str, endpoint: str, params: Dict, body: Any,
+             status: int = 200, headers: Optional[Dict[str, str]] = None) -> None:
+        """
+        写入夹具
+
+        参数:
+            key: 请求键
+            endpoint: API终端路径
+            params: 查询参数
+            body: 解析后的响应体
+            status: HTTP状态码
+            headers: 需要回放的响应头（如ETag）
+        """
+        fixture = {
+            "key": key,
+            "endpoint": endpoint,
+            "params": {k: v for k, v in params.items()},
+            "status": status,
+            "headers": headers or {},
+            "body": body
+        }
+        path = self.path_for(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with self._lock:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(fixture, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
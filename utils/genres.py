@@ -0,0 +1,182 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+
+# 随代码发布的zh-CN电影类型列表，首次启动且没有快照文件时使用
+BUNDLED_GENRES = [
+    {"id": 28, "name": "动作"},
+    {"id": 12, "name": "冒险"},
+    {"id": 16, "name": "动画"},
+    {"id": 35, "name": "喜剧"},
+    {"id": 80, "name": "犯罪"},
+    {"id": 99, "name": "纪录"},
+    {"id": 18, "name": "剧情"},
+    {"id": 10751, "name": "家庭"},
+    {"id": 14, "name": "奇幻"},
+    {"id": 36, "name": "历史"},
+    {"id": 27, "name": "恐怖"},
+    {"id": 10402, "name": "音乐"},
+    {"id": 9648, "name": "悬疑"},
+    {"id": 10749, "name": "爱情"},
+    {"id": 878, "name": "科幻"},
+    {"id": 10770, "name": "电视电影"},
+    {"id": 53, "name": "惊悚"},
+    {"id": 10752, "name": "战争"},
+    {"id": 37, "name": "西部"}
+]
+
+
+# TMDB类型ID到位掩码中位序号的映射（按内置类型列表的顺序，最多32个）
+GENRE_BITS: Dict[int, int] = {genre["id"]: bit for bit, genre in enumerate(BUNDLED_GENRES)}
+BIT_GENRES: Dict[int, int] = {bit: genre_id for genre_id, bit in GENRE_BITS.items()}
+
+
+def genre_mask(genre_ids: Iterable[int]) -> int:
+    """
+    把类型ID列表编码为32位掩码（未知的类型ID被忽略）
+
+    参数:
+        genre_ids: TMDB类型ID
+
+    返回:
+        位掩码
+    """
+    mask = 0
+    for genre_id in genre_ids:
+        bit = GENRE_BITS.get(genre_id)
+        if bit is not None:
+            mask |= 1 << bit
+    return mask
+
+
+class GenreStore:
+    """进程级共享的电影类型表
+
+    启动时读取磁盘快照（没有快照时使用随代码发布的列表），不发出任何网络请求；
+    快照过期后由后台线程从TMDB刷新并写回磁盘，读取方始终拿到当前可用的版本。
+    """
+
+    # 快照的刷新间隔（秒），TMDB的类型列表极少变化
+    REFRESH_INTERVAL = 7 * 24 * 3600
+
+    # 两次刷新尝试的最小间隔（秒），刷新失败时快照一直过期，避免每次读取都发起请求
+    RETRY_INTERVAL = 600
+
+    _default_instance = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, snapshot_path: Optional[str] = None):
+        """
+        初始化类型表
+
+        参数:
+            snapshot_path: 快照文件路径，None表示只使用内置列表且不持久化
+        """
+        self.snapshot_path = snapshot_path
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._last_attempt = 0.0
+        self._genres: List[Dict] = list(BUNDLED_GENRES)
+        self._updated_at = 0.0
+
+        if snapshot_path and os.path.exists(snapshot_path):
+            try:
+                with open(snapshot_path, "r", encoding="utf-8") as f:
+                    snapshot = json.load(f)
+                self._genres = snapshot["genres"]
+                self._updated_at = snapshot.get("updated_at", 0.0)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"读取类型快照失败，使用内置列表: {e}")
+        self._map = {genre["id"]: genre["name"] for genre in self._genres}
+
+    @classmethod
+    def default(cls) -> "GenreStore":
+        """
+        获取进程级共享的类型表
+
+        返回:
+            GenreStore实例，快照位于DATA_DIR/genres.json
+        """
+        with cls._default_lock:
+            if cls._default_instance is None:
+                data_dir = os.environ.get("DATA_DIR", "data")
+                cls._default_instance = cls(os.path.join(data_dir, "genres.json"))
+            return cls._default_instance
+
+    def get_genres(self) -> List[Dict]:
+        """
+        获取类型列表
+
+        返回:
+            [{"id": 类型ID, "name": 类型名称}, ...]（调用方不应修改）
+        """
+        return self._genres
+
+    def get_map(self) -> Dict[int, str]:
+        """
+        获取类型ID到名称的映射
+
+        返回:
+            {类型ID: 类型名称}字典（调用方不应修改）
+        """
+        return self._map
+
+    def is_stale(self) -> bool:
+        """快照是否需要刷新"""
+        return time.time() - self._updated_at > self.REFRESH_INTERVAL
+
+    def refresh_async(self, api) -> bool:
+        """
+        快照过期时在后台线程中刷新；已有刷新在进行、距上次尝试不足RETRY_INTERVAL，
+        或api指向模拟服务器/回放数据时不发起
+
+        参数:
+            api: TMDBApi实例，使用其后台优先级副本发请求
+
+        返回:
+            是否发起了新的刷新
+        """
+        now = time.time()
+        with self._lock:
+            if self._refreshing or now - self._last_attempt < self.RETRY_INTERVAL or not self.is_stale():
+                return False
+            if not api.is_live():
+                return False
+            self._refreshing = True
+            self._last_attempt = now
+        thread = threading.Thread(target=self._refresh, args=(api.background_client(),), daemon=True)
+        thread.start()
+        return True
+
+    def _refresh(self, api) -> None:
+        """从TMDB获取类型列表，替换当前版本并写入快照"""
+        try:
+            genres = [
+                {"id": genre["id"], "name": genre["name"]}
+                for genre in api.get_movie_genres()["genres"]
+            ]
+            if genres:
+                self._set(genres)
+        except Exception as e:
+            print(f"刷新电影类型失败: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _set(self, genres: List[Dict]) -> None:
+        """替换类型列表（整体替换引用，读取方无需加锁）并写入快照"""
+        self._genres = genres
+        self._map = {genre["id"]: genre["name"] for genre in genres}
+        self._updated_at = time.time()
+        if not self.snapshot_path:
+            return
+        directory = os.path.dirname(self.snapshot_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.snapshot_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"updated_at": self._updated_at, "genres": genres}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.snapshot_path)
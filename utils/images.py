@@ -0,0 +1,320 @@
+import argparse
+import hashlib
+import io
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+import requests
+from PIL import Image
+from utils.singleflight import SingleFlight
+
+
+class PosterCache:
+    """海报的本地缓存
+
+    每张海报只从TMDB下载一次，原图按内容的SHA-256存放（相同内容只存一份），
+    再按显示宽度用Pillow生成压缩后的缩略图变体，同样保存在磁盘上。
+    """
+
+    # TMDB上下载原图使用的尺寸，足以覆盖最大的显示宽度（含高分屏）
+    SOURCE_URL = "https://image.tmdb.org/t/p/w780"
+
+    # 允许生成的变体宽度，其他宽度向上取整到最接近的一档
+    VARIANT_WIDTHS = (60, 120, 200, 300, 400, 600)
+
+    VARIANT_FORMAT = "WEBP"
+    VARIANT_QUALITY = 80
+
+    def __init__(self,
+                 directory: Optional[str] = None,
+                 source_url: Optional[str] = None,
+                 timeout: Tuple[float, float] = (3.05, 10.0)):
+        """
+        初始化海报缓存
+
+        参数:
+            directory: 缓存目录，None表示DATA_DIR/images
+            source_url: 原图地址前缀，None时读取环境变量TMDB_IMAGE_SOURCE_URL（可指向本地模拟服务器）
+            timeout: 下载原图的(连接, 读取)超时时间（秒）
+        """
+        self.directory = directory or os.path.join(os.environ.get("DATA_DIR", "data"), "images")
+        self.source_url = (source_url or os.environ.get("TMDB_IMAGE_SOURCE_URL") or self.SOURCE_URL).rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        self._single_flight = SingleFlight()
+        self._lock = threading.Lock()
+        self.stats = {
+            "source_downloads": 0,
+            "source_bytes": 0,
+            "variants_created": 0,
+            "variant_hits": 0,
+            "served_bytes": 0
+        }
+        for sub in ("originals", "variants", "paths"):
+            os.makedirs(os.path.join(self.directory, sub), exist_ok=True)
+
+    def variant_width(self, width: int) -> int:
+        """
+        把请求的宽度归到允许的变体宽度
+
+        参数:
+            width: 期望的显示宽度（像素）
+
+        返回:
+            不小于width的最小变体宽度，超出时取最大一档
+        """
+        for candidate in self.VARIANT_WIDTHS:
+            if candidate >= width:
+                return candidate
+        return self.VARIANT_WIDTHS[-1]
+
+    def get_variant(self, path: str, width: int) -> Tuple[bytes, str]:
+        """
+        获取海报的缩略图变体，必要时下载原图并生成
+
+        参数:
+            path: TMDB图片路径（如"/abc.jpg"）
+            width: 期望的显示宽度
+
+        返回:
+            (图片字节, 内容摘要)，摘要同时用作ETag
+        """
+        width = self.variant_width(width)
+        digest = self._original_digest(path)
+        variant_path = self._variant_path(digest, width)
+        if os.path.exists(variant_path):
+            with open(variant_path, "rb") as f:
+                payload = f.read()
+            self._count("variant_hits")
+        else:
+            payload = self._single_flight.do(
+                f"{digest}:{width}", lambda: self._create_variant(digest, width)
+            )
+        self._count("served_bytes", len(payload))
+        return payload, f"{digest[:16]}-{width}"
+
+    def get_stats(self) -> Dict:
+        """
+        获取缓存统计
+
+        返回:
+            包含原图下载次数与字节数、变体生成与命中次数、输出字节数的字典
+        """
+        with self._lock:
+            return dict(self.stats)
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.stats[name] += amount
+
+    def _path_file(self, path: str) -> str:
+        """图片路径到原图摘要的映射文件"""
+        key = hashlib.sha1(path.encode("utf-8")).hexdigest()[:20]
+        return os.path.join(self.directory, "paths", key)
+
+    def _original_path(self, digest: str) -> str:
+        return os.path.join(self.directory, "originals", digest[:2], digest)
+
+    def _variant_path(self, digest: str, width: int) -> str:
+        extension = self.VARIANT_FORMAT.lower()
+        return os.path.join(self.directory, "variants", digest[:2], f"{digest}_{width}.{extension}")
+
+    def _original_digest(self, path: str) -> str:
+        """获取原图的内容摘要，本地没有时下载（并发的相同下载只进行一次）"""
+        path_file = self._path_file(path)
+        if os.path.exists(path_file):
+            with open(path_file, "r", encoding="utf-8") as f:
+                digest = f.read().strip()
+            if os.path.exists(self._original_path(digest)):
+                return digest
+        return self._single_flight.do(f"source:{path}", lambda: self._download(path))
+
+    def _download(self, path: str) -> str:
+        """下载原图，按内容摘要保存并记录路径映射"""
+        response = self.session.get(f"{self.source_url}{path}", timeout=self.timeout)
+        response.raise_for_status()
+        content = response.content
+        digest = hashlib.sha256(content).hexdigest()
+        self._write(self._original_path(digest), content)
+        self._write(self._path_file(path), digest.encode("utf-8"))
+        self._count("source_downloads")
+        self._count("source_bytes", len(content))
+        return digest
+
+    def _create_variant(self, digest: str, width: int) -> bytes:
+        """从原图生成指定宽度的压缩变体并写入磁盘"""
+        with Image.open(self._original_path(digest)) as image:
+            image = image.convert("RGB")
+            if image.width > width:
+                height = round(image.height * width / image.width)
+                image = image.resize((width, height), Image.LANCZOS)
+            buffer = io.BytesIO()
+            image.save(buffer, self.VARIANT_FORMAT, quality=self.VARIANT_QUALITY, method=4)
+        payload = buffer.getvalue()
+        self._write(self._variant_path(digest, width), payload)
+        self._count("variants_created")
+        return payload
+
+    def _write(self, target: str, content: bytes) -> None:
+        """原子地写入文件"""
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_path = f"{target}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, target)
+
+
+class ImageProxyServer:
+    """本地图片代理
+
+    GET /img/<宽度>/<TMDB图片路径> 返回对应宽度的缩略图变体。
+    变体内容不会改变，响应带一年的Cache-Control和ETag，浏览器只需下载一次。
+    """
+
+    CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+    _shared: Dict[Tuple[str, int], "ImageProxyServer"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self,
+                 cache: Optional[PosterCache] = None,
+                 host: str = "127.0.0.1",
+                 port: int = 0):
+        """
+        初始化图片代理
+
+        参数:
+            cache: 海报缓存，None表示使用默认目录
+            host: 监听地址
+            port: 监听端口，0表示自动分配
+        """
+        self.cache = cache or PosterCache()
+        handler = type("ImageProxyHandler", (_ImageProxyHandler,), {"server_state": self})
+        self._httpd = ThreadingHTTPServer((host, port), handler)
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @classmethod
+    def shared(cls, host: str = "127.0.0.1", port: int = 0) -> "ImageProxyServer":
+        """
+        获取进程级共享的图片代理，首次调用时在后台线程中启动
+
+        Streamlit每次重新运行脚本都会创建新的TMDBApi，但同一进程只启动一个代理。
+
+        参数:
+            host: 监听地址
+            port: 监听端口
+
+        返回:
+            已启动的ImageProxyServer实例
+        """
+        with cls._shared_lock:
+            server = cls._shared.get((host, port))
+            if server is None:
+                server = cls(host=host, port=port).start()
+                cls._shared[(host, port)] = server
+            return server
+
+    @property
+    def port(self) -> int:
+        """实际监听的端口"""
+        return self._httpd.server_address[1]
+
+    @property
+    def base_url(self) -> str:
+        """代理的访问地址"""
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "ImageProxyServer":
+        """在后台线程中启动代理"""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """停止代理"""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "ImageProxyServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+class _ImageProxyHandler(BaseHTTPRequestHandler):
+    """图片代理的请求处理器"""
+
+    protocol_version = "HTTP/1.1"
+    server_state: ImageProxyServer = None
+
+    PATH_PATTERN = re.compile(r"^/img/(\d+)(/[\w.\-]+\.(?:jpg|jpeg|png|webp))$")
+
+    def do_GET(self):
+        match = self.PATH_PATTERN.match(self.path.split("?", 1)[0])
+        if match is None:
+            self._send(404, b"", {})
+            return
+        width, path = int(match.group(1)), match.group(2)
+        try:
+            payload, digest = self.server_state.cache.get_variant(path, width)
+        except requests.HTTPError as e:
+            status = e.response.status_code if e.response is not None else 502
+            self._send(404 if status == 404 else 502, b"", {})
+            return
+        except Exception as e:
+            print(f"生成海报缩略图时出错 {path}: {e}")
+            self._send(502, b"", {})
+            return
+
+        headers = {
+            "Content-Type": f"image/{PosterCache.VARIANT_FORMAT.lower()}",
+            "Cache-Control": ImageProxyServer.CACHE_CONTROL,
+            "ETag": f'"{digest}"'
+        }
+        if self.headers.get("If-None-Match") == headers["ETag"]:
+            self._send(304, b"", headers)
+            return
+        self._send(200, payload, headers)
+
+    def _send(self, status: int, payload: bytes, headers: Dict[str, str]) -> None:
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        if payload:
+            self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    """命令行入口：python -m utils.images --port 8766"""
+    parser = argparse.ArgumentParser(description="本地海报缓存与图片代理")
+    parser.add_argument("--directory", help="缓存目录，默认DATA_DIR/images")
+    parser.add_argument("--source-url", help="原图地址前缀，默认TMDB的w780尺寸")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    server = ImageProxyServer(
+        cache=PosterCache(directory=args.directory, source_url=args.source_url),
+        host=args.host,
+        port=args.port
+    )
+    print(f"图片代理已启动: {server.base_url}")
+    print(f"使用方式: TMDB_IMAGE_PROXY_URL={server.base_url} streamlit run app.py")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
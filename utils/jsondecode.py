@@ -0,0 +1,182 @@
+import json
+import threading
+import time
+from typing import Dict, Optional, Any, Iterable
+
+try:
+    import orjson
+except ImportError:  # 可选依赖，未安装时回退到标准库
+    orjson = None
+
+
+# 可用的解码后端
+BACKEND_ORJSON = "orjson"
+BACKEND_STDLIB = "json"
+
+
+def default_backend() -> str:
+    """
+    获取默认解码后端：安装了orjson时使用orjson，否则使用标准库json
+
+    返回:
+        后端名称
+    """
+    return BACKEND_ORJSON if orjson is not None else BACKEND_STDLIB
+
+
+def loads(content: Any) -> Any:
+    """
+    用最快的可用后端解析JSON
+
+    参数:
+        content: JSON文本（str或bytes）
+
+    返回:
+        解析后的Python对象
+    """
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def dumps(data: Any) -> str:
+    """
+    用最快的可用后端序列化为紧凑的JSON文本（非ASCII字符不转义）
+
+    参数:
+        data: 可序列化的Python对象
+
+    返回:
+        JSON字符串
+    """
+    if orjson is not None:
+        return orjson.dumps(data).decode("utf-8")
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def project_page(page: Dict[str, Any], fields: Iterable[str]) -> Dict[str, Any]:
+    """
+    对分页响应的results做字段投影，只保留指定字段
+
+    参数:
+        page: 分页JSON（包含results列表）
+        fields: 需要保留的字段名
+
+    返回:
+        新的分页字典，分页信息不变，results中每个条目只含指定字段
+    """
+    results = page.get("results")
+    if not isinstance(results, list):
+        return page
+    fields = tuple(fields)
+    projected = dict(page)
+    projected["results"] = [
+        {field: item[field] for field in fields if field in item}
+        for item in results
+    ]
+    return projected
+
+
+class JSONDecoder:
+    """可替换后端的响应解码器，同时统计网络耗时与解码耗时"""
+
+    _instances: Dict[str, "JSONDecoder"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, backend: Optional[str] = None):
+        """
+        初始化解码器
+
+        参数:
+            backend: "orjson"或"json"，None表示自动选择
+        """
+        backend = backend or default_backend()
+        if backend == BACKEND_ORJSON and orjson is None:
+            print("未安装orjson，改用标准库json解析响应")
+            backend = BACKEND_STDLIB
+        if backend not in (BACKEND_ORJSON, BACKEND_STDLIB):
+            raise ValueError(f"未知的JSON解码后端: {backend}")
+        self.backend = backend
+        self._loads = orjson.loads if backend == BACKEND_ORJSON else json.loads
+        self._lock = threading.Lock()
+        self.stats = {
+            "responses": 0,
+            "bytes": 0,
+            "network_seconds": 0.0,
+            "decode_seconds": 0.0,
+            "projected_items": 0
+        }
+
+    @classmethod
+    def get(cls, backend: Optional[str] = None) -> "JSONDecoder":
+        """
+        获取进程级共享的解码器（同一后端共用一份统计）
+
+        参数:
+            backend: 后端名称，None表示自动选择
+
+        返回:
+            JSONDecoder实例
+        """
+        backend = backend or default_backend()
+        with cls._instances_lock:
+            decoder = cls._instances.get(backend)
+            if decoder is None:
+                decoder = cls(backend)
+                cls._instances[backend] = decoder
+            return decoder
+
+    def decode(self, content: bytes, network_seconds: float = 0.0) -> Any:
+        """
+        解析响应体并记录耗时
+
+        参数:
+            content: 响应体字节
+            network_seconds: 获取该响应体花费的网络时间，计入统计
+
+        返回:
+            解析后的Python对象
+        """
+        start = time.perf_counter()
+        data = self._loads(content)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.stats["responses"] += 1
+            self.stats["bytes"] += len(content)
+            self.stats["network_seconds"] += network_seconds
+            self.stats["decode_seconds"] += elapsed
+        return data
+
+    def project(self, page: Dict[str, Any], fields: Iterable[str]) -> Dict[str, Any]:
+        """
+        对分页响应做字段投影（参见project_page），投影耗时计入解码耗时
+
+        参数:
+            page: 分页JSON
+            fields: 需要保留的字段名
+
+        返回:
+            投影后的分页字典
+        """
+        start = time.perf_counter()
+        projected = project_page(page, fields)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.stats["decode_seconds"] += elapsed
+            self.stats["projected_items"] += len(projected.get("results") or ())
+        return projected
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取解码统计
+
+        返回:
+            包含后端名称、响应数、字节数、累计网络/解码耗时及平均耗时（毫秒）的字典
+        """
+        with self._lock:
+            stats = dict(self.stats)
+        stats["backend"] = self.backend
+        responses = stats["responses"]
+        stats["network_ms_avg"] = stats["network_seconds"] * 1000 / responses if responses else 0.0
+        stats["decode_ms_avg"] = stats["decode_seconds"] * 1000 / responses if responses else 0.0
+        return stats
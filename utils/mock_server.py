@@ -0,0 +1,560 @@
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import os
+import random
+import re
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Any, Tuple
+from urllib.parse import urlsplit, parse_qsl
+from PIL import Image
+from utils.cache import make_cache_key
+from utils.fixtures import FixtureStore
+from utils.genres import BUNDLED_GENRES
+
+
+# 合成数据使用的电影类型（与TMDB的zh-CN类型列表一致）
+SYNTHETIC_GENRES = BUNDLED_GENRES
+
+_TITLE_HEADS = ["星际", "午夜", "失落的", "无尽", "沉默的", "燃烧", "最后的", "秘密", "冰雪", "追风", "孤独的", "银河"]
+_TITLE_TAILS = ["之城", "旅程", "联盟", "花园", "战争", "迷宫", "列车", "海洋", "王国", "密码", "守望者", "回声"]
+_EN_HEADS = ["Star", "Midnight", "Lost", "Endless", "Silent", "Burning", "Last", "Secret", "Frozen", "Wind", "Lonely", "Galaxy"]
+_EN_TAILS = ["City", "Journey", "League", "Garden", "War", "Maze", "Express", "Ocean", "Kingdom", "Code", "Watchers", "Echo"]
+_PEOPLE = ["张伟", "王芳", "李娜", "刘洋", "陈静", "杨帆", "赵磊", "黄敏", "周杰", "吴昊",
+           "John Smith", "Emma Stone", "Liam Chen", "Olivia Park", "Noah Kim", "Ava Lee"]
+
+PAGE_SIZE = 20
+MAX_PAGES = 500
+
+# /movie/changes每页的条目数，以及合成目录中每部电影每天发生变更的概率（按1/256计）
+CHANGES_PAGE_SIZE = 100
+CHANGES_DAILY_RATE = 5
+
+
+class SyntheticCatalog:
+    """确定性生成的合成电影目录，用于没有夹具时模拟TMDB的响应"""
+
+    def __init__(self, size: int = 2000, seed: int = 42):
+        """
+        生成合成目录
+
+        参数:
+            size: 电影数量
+            seed: 随机种子，相同种子生成相同的目录
+        """
+        rng = random.Random(seed)
+        genre_ids = [genre["id"] for genre in SYNTHETIC_GENRES]
+        self.movies: Dict[int, Dict] = {}
+        for index in range(size):
+            movie_id = 1000 + index * 7
+            head, tail = rng.randrange(len(_TITLE_HEADS)), rng.randrange(len(_TITLE_TAILS))
+            year = rng.randint(1960, 2025)
+            vote_count = int(rng.paretovariate(1.2) * 20)
+            self.movies[movie_id] = {
+                "id": movie_id,
+                "title": f"{_TITLE_HEADS[head]}{_TITLE_TAILS[tail]}{'' if index < 144 else f' {index // 144 + 1}'}",
+                "original_title": f"{_EN_HEADS[head]} {_EN_TAILS[tail]}{'' if index < 144 else f' {index // 144 + 1}'}",
+                "original_language": rng.choice(["zh", "en", "ja", "ko", "fr"]),
+                "overview": f"{_TITLE_HEADS[head]}{_TITLE_TAILS[tail]}的故事。" * rng.randint(1, 4),
+                "genre_ids": rng.sample(genre_ids, rng.randint(1, 3)),
+                "release_date": f"{year}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                "runtime": max(5, int(rng.gauss(110, 35))),
+                "popularity": round(rng.paretovariate(1.5) * 10, 3),
+                "vote_average": round(min(10.0, max(0.0, rng.gauss(6.4, 1.3))), 1),
+                "vote_count": vote_count,
+                "adult": rng.random() < 0.02,
+                "poster_path": f"/synthetic{movie_id}.jpg",
+                "backdrop_path": f"/synthetic{movie_id}_backdrop.jpg",
+                "cast": rng.sample(_PEOPLE, 5),
+                "director": rng.choice(_PEOPLE)
+            }
+        self._by_popularity = sorted(self.movies.values(), key=lambda m: -m["popularity"])
+        self._genre_names = {genre["id"]: genre["name"] for genre in SYNTHETIC_GENRES}
+
+    def poster(self, path: str, size: str) -> Optional[bytes]:
+        """
+        生成合成海报（带噪点的纯色JPEG，体积与真实海报相近）
+
+        参数:
+            path: 海报路径，如"/synthetic1000.jpg"
+            size: TMDB图片尺寸，如"w500"或"original"
+
+        返回:
+            JPEG字节，路径不属于合成目录时返回None
+        """
+        match = re.match(r"^/synthetic(\d+)\.jpg$", path)
+        if match is None or int(match.group(1)) not in self.movies:
+            return None
+        width = int(size[1:]) if size.startswith("w") else 780
+        height = width * 3 // 2
+        movie_id = int(match.group(1))
+        color = tuple(int(hashlib.md5(f"{movie_id}:{i}".encode()).hexdigest()[:2], 16) for i in range(3))
+        noise = Image.effect_noise((width, height), 48).convert("RGB")
+        image = Image.blend(Image.new("RGB", (width, height), color), noise, 0.35)
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=90)
+        return buffer.getvalue()
+
+    def write_export(self, path: str) -> None:
+        """
+        按TMDB每日导出文件的格式（gzip压缩的JSONL）写出合成目录的电影ID
+
+        参数:
+            path: 输出文件路径
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            for movie in self.movies.values():
+                entry = {
+                    "adult": movie["adult"],
+                    "id": movie["id"],
+                    "original_title": movie["original_title"],
+                    "popularity": movie["popularity"],
+                    "video": False
+                }
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def summary(self, movie: Dict) -> Dict:
+        """转换为列表接口返回的电影摘要"""
+        return {
+            "adult": movie["adult"],
+            "backdrop_path": movie["backdrop_path"],
+            "genre_ids": list(movie["genre_ids"]),
+            "id": movie["id"],
+            "original_language": movie["original_language"],
+            "original_title": movie["original_title"],
+            "overview": movie["overview"],
+            "popularity": movie["popularity"],
+            "poster_path": movie["poster_path"],
+            "release_date": movie["release_date"],
+            "title": movie["title"],
+            "video": False,
+            "vote_average": movie["vote_average"],
+            "vote_count": movie["vote_count"]
+        }
+
+    def details(self, movie_id: int, append: List[str]) -> Optional[Dict]:
+        """生成电影详情，append为append_to_response的各部分"""
+        movie = self.movies.get(movie_id)
+        if movie is None:
+            return None
+        details = self.summary(movie)
+        del details["genre_ids"]
+        details.update({
+            "genres": [{"id": gid, "name": self._genre_names[gid]} for gid in movie["genre_ids"]],
+            "runtime": movie["runtime"],
+            "status": "Released",
+            "tagline": "",
+            "budget": 0,
+            "revenue": 0,
+            "imdb_id": f"tt{movie_id:07d}"
+        })
+        for part in append:
+            if part == "credits":
+                details["credits"] = {
+                    "id": movie_id,
+                    "cast": [
+                        {"id": index, "name": name, "character": f"角色{index + 1}", "order": index}
+                        for index, name in enumerate(movie["cast"])
+                    ],
+                    "crew": [{"id": 99, "name": movie["director"], "job": "Director", "department": "Directing"}]
+                }
+            elif part == "videos":
+                details["videos"] = {"results": []}
+            elif part == "images":
+                details["images"] = {
+                    "backdrops": [{"file_path": movie["backdrop_path"], "width": 1280, "height": 720}],
+                    "posters": [{"file_path": movie["poster_path"], "width": 500, "height": 750}]
+                }
+            elif part in ("recommendations", "similar"):
+                details[part] = self.related(movie_id, 1, salt=part)
+        return details
+
+    def related(self, movie_id: int, page: int, salt: str = "recommendations") -> Dict:
+        """与指定电影共享类型的电影列表"""
+        movie = self.movies.get(movie_id)
+        if movie is None:
+            return self.paginate([], page)
+        genres = set(movie["genre_ids"])
+        candidates = [
+            m for m in self._by_popularity
+            if m["id"] != movie_id and genres.intersection(m["genre_ids"])
+        ]
+        rng = random.Random(f"{movie_id}:{salt}")
+        return self.paginate(rng.sample(candidates, min(len(candidates), 200)), page)
+
+    def trending(self, window: str, page: int) -> Dict:
+        """热门电影列表"""
+        rng = random.Random(window)
+        top = list(self._by_popularity[:400])
+        rng.shuffle(top)
+        top.sort(key=lambda m: -m["popularity"] * rng.uniform(0.5, 1.5))
+        return self.paginate(top, page)
+
+    def discover(self, params: Dict[str, str]) -> Dict:
+        """按discover参数过滤并排序"""
+        movies = list(self._by_popularity)
+        with_genres = params.get("with_genres")
+        if with_genres:
+            if "|" in with_genres:
+                wanted = {int(g) for g in with_genres.split("|")}
+                movies = [m for m in movies if wanted.intersection(m["genre_ids"])]
+            else:
+                wanted = {int(g) for g in with_genres.split(",")}
+                movies = [m for m in movies if wanted.issubset(m["genre_ids"])]
+        if params.get("with_runtime.gte"):
+            movies = [m for m in movies if m["runtime"] >= int(params["with_runtime.gte"])]
+        if params.get("with_runtime.lte"):
+            movies = [m for m in movies if m["runtime"] <= int(params["with_runtime.lte"])]
+        if params.get("vote_average.gte"):
+            movies = [m for m in movies if m["vote_average"] >= float(params["vote_average.gte"])]
+        if params.get("vote_count.gte"):
+            movies = [m for m in movies if m["vote_count"] >= int(params["vote_count.gte"])]
+        movies = self._filter_release(movies, params)
+
+        field, _, direction = params.get("sort_by", "popularity.desc").partition(".")
+        if field in ("popularity", "vote_average", "vote_count", "release_date", "original_title", "title"):
+            movies.sort(key=lambda m: m[field], reverse=(direction != "asc"))
+        return self.paginate(movies, int(params.get("page", 1)))
+
+    def search(self, params: Dict[str, str]) -> Dict:
+        """按标题或原标题子串搜索"""
+        needle = params.get("query", "").strip().lower()
+        movies = [
+            m for m in self._by_popularity
+            if needle and (needle in m["title"].lower() or needle in m["original_title"].lower())
+        ]
+        movies = self._filter_release(movies, params)
+        return self.paginate(movies, int(params.get("page", 1)))
+
+    @staticmethod
+    def _filter_release(movies: List[Dict], params: Dict[str, str]) -> List[Dict]:
+        """discover和search共有的年份与成人内容过滤"""
+        if params.get("primary_release_year"):
+            year = params["primary_release_year"]
+            movies = [m for m in movies if m["release_date"].startswith(year)]
+        if params.get("include_adult", "false") != "true":
+            movies = [m for m in movies if not m["adult"]]
+        return movies
+
+    def paginate(self, movies: List[Dict], page: int) -> Dict:
+        """把电影列表切成TMDB风格的分页响应"""
+        page = max(1, page)
+        total_pages = min(MAX_PAGES, (len(movies) + PAGE_SIZE - 1) // PAGE_SIZE)
+        start = (page - 1) * PAGE_SIZE
+        return {
+            "page": page,
+            "results": [self.summary(m) for m in movies[start:start + PAGE_SIZE]],
+            "total_pages": total_pages,
+            "total_results": len(movies)
+        }
+
+    def changes(self, params: Dict[str, str]) -> Dict:
+        """
+        变更过的电影ID列表（/movie/changes）
+
+        每部电影在每一天是否变更由(ID, 日期)的哈希决定，同一时间窗口总是返回相同的结果。
+        """
+        end = date.fromisoformat(params["end_date"]) if params.get("end_date") else date.today()
+        start = date.fromisoformat(params["start_date"]) if params.get("start_date") else end - timedelta(days=1)
+        days = [str(start + timedelta(days=offset)) for offset in range((end - start).days + 1)]
+        changed = [
+            movie for movie_id, movie in self.movies.items()
+            if any(hashlib.md5(f"{movie_id}:{day}".encode()).digest()[0] < CHANGES_DAILY_RATE for day in days)
+        ]
+        page = max(1, int(params.get("page", 1)))
+        start_index = (page - 1) * CHANGES_PAGE_SIZE
+        return {
+            "results": [
+                {"id": movie["id"], "adult": movie["adult"]}
+                for movie in changed[start_index:start_index + CHANGES_PAGE_SIZE]
+            ],
+            "page": page,
+            "total_pages": (len(changed) + CHANGES_PAGE_SIZE - 1) // CHANGES_PAGE_SIZE,
+            "total_results": len(changed)
+        }
+
+    def respond(self, endpoint: str, params: Dict[str, str]) -> Optional[Dict]:
+        """
+        生成终端对应的合成响应
+
+        参数:
+            endpoint: API终端路径
+            params: 查询参数
+
+        返回:
+            响应体，不支持的终端或不存在的电影返回None
+        """
+        page = int(params.get("page", 1))
+        if endpoint == "/genre/movie/list":
+            return {"genres": [dict(genre) for genre in SYNTHETIC_GENRES]}
+        if endpoint == "/discover/movie":
+            return self.discover(params)
+        if endpoint == "/search/movie":
+            return self.search(params)
+        if endpoint == "/movie/changes":
+            return self.changes(params)
+        match = re.fullmatch(r"/trending/movie/(day|week)", endpoint)
+        if match:
+            return self.trending(match.group(1), page)
+        match = re.fullmatch(r"/movie/(\d+)(?:/(recommendations|similar))?", endpoint)
+        if match:
+            movie_id = int(match.group(1))
+            if movie_id not in self.movies:
+                return None
+            if match.group(2):
+                return self.related(movie_id, page, salt=match.group(2))
+            append = [part for part in params.get("append_to_response", "").split(",") if part]
+            return self.details(movie_id, append)
+        return None
+
+
+class MockTMDBServer:
+    """本地TMDB替身服务器
+
+    优先从夹具目录回放录制的响应，没有夹具时（可选）返回合成目录的数据，
+    并可注入延迟、抖动、5xx错误和429限流，用于离线基准测试和调试。
+    """
+
+    def __init__(self,
+                 fixtures_dir: Optional[str] = None,
+                 synthetic: bool = True,
+                 catalog_size: int = 2000,
+                 latency: float = 0.0,
+                 jitter: float = 0.0,
+                 error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0,
+                 host: str = "127.0.0.1",
+                 port: int = 0,
+                 seed: int = 42):
+        """
+        初始化模拟服务器
+
+        参数:
+            fixtures_dir: 夹具目录，None表示不使用夹具
+            synthetic: 没有夹具时是否返回合成数据
+            catalog_size: 合成目录中的电影数量
+            latency: 每个请求的平均附加延迟（秒）
+            jitter: 延迟的随机抖动幅度（秒）
+            error_rate: 返回500错误的概率
+            rate_limit_rate: 返回429（带Retry-After）的概率
+            host: 监听地址
+            port: 监听端口，0表示自动分配
+            seed: 合成数据和故障注入的随机种子
+        """
+        self.fixtures = FixtureStore(fixtures_dir) if fixtures_dir else None
+        self.catalog = SyntheticCatalog(catalog_size, seed) if synthetic else None
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            "requests": 0,
+            "fixture_hits": 0,
+            "synthetic_hits": 0,
+            "not_modified": 0,
+            "not_found": 0,
+            "injected_errors": 0,
+            "injected_429": 0
+        }
+        self.endpoint_counts: Dict[str, int] = {}
+
+        handler = type("MockTMDBHandler", (_MockTMDBHandler,), {"server_state": self})
+        self._httpd = ThreadingHTTPServer((host, port), handler)
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        """供TMDBApi(base_url=...)使用的API地址"""
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/3"
+
+    @property
+    def image_url(self) -> str:
+        """供PosterCache(source_url=...)使用的海报地址（合成海报）"""
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/t/p/w780"
+
+    def start(self) -> "MockTMDBServer":
+        """在后台线程中启动服务器"""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """停止服务器"""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "MockTMDBServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def count(self, name: str, endpoint: Optional[str] = None) -> None:
+        """累加统计计数"""
+        with self._stats_lock:
+            self.stats[name] += 1
+            if endpoint is not None:
+                group = re.sub(r"/\d+", "/{id}", endpoint)
+                self.endpoint_counts[group] = self.endpoint_counts.get(group, 0) + 1
+
+    def roll(self) -> Tuple[float, float]:
+        """抽取本次请求的延迟和故障随机数"""
+        with self._rng_lock:
+            delay = self.latency + self._rng.uniform(-self.jitter, self.jitter)
+            return max(0.0, delay), self._rng.random()
+
+    def resolve(self, endpoint: str, params: Dict[str, str]) -> Tuple[int, Dict[str, str], Any]:
+        """
+        查找请求对应的响应
+
+        返回:
+            (状态码, 响应头, 响应体)
+        """
+        if self.fixtures is not None:
+            fixture = self.fixtures.load(make_cache_key(endpoint, params))
+            if fixture is not None:
+                self.count("fixture_hits")
+                return fixture.get("status", 200), fixture.get("headers", {}), fixture["body"]
+        if self.catalog is not None:
+            body = self.catalog.respond(endpoint, params)
+            if body is not None:
+                self.count("synthetic_hits")
+                return 200, {}, body
+        self.count("not_found")
+        return 404, {}, {
+            "success": False,
+            "status_code": 34,
+            "status_message": "The resource you requested could not be found."
+        }
+
+
+class _MockTMDBHandler(BaseHTTPRequestHandler):
+    """模拟服务器的请求处理器"""
+
+    protocol_version = "HTTP/1.1"
+    server_state: MockTMDBServer = None
+
+    def do_GET(self):
+        state = self.server_state
+        parts = urlsplit(self.path)
+        if parts.path.startswith("/t/p/"):
+            self._send_poster(parts.path)
+            return
+        endpoint = parts.path[2:] if parts.path.startswith("/3/") else parts.path
+        params = dict(parse_qsl(parts.query, keep_blank_values=True))
+        state.count("requests", endpoint)
+
+        delay, dice = state.roll()
+        if delay:
+            time.sleep(delay)
+
+        if dice < state.rate_limit_rate:
+            state.count("injected_429")
+            self._send(429, {"status_code": 25, "status_message": "Your request count is over the allowed limit."},
+                       {"Retry-After": "1"})
+            return
+        if dice < state.rate_limit_rate + state.error_rate:
+            state.count("injected_errors")
+            self._send(500, {"status_code": 11, "status_message": "Internal error."})
+            return
+
+        status, headers, body = state.resolve(endpoint, params)
+        payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        headers = dict(headers)
+        if status == 200:
+            headers.setdefault("ETag", '"%s"' % hashlib.sha1(payload).hexdigest())
+            if self.headers.get("If-None-Match") == headers["ETag"]:
+                state.count("not_modified")
+                self._send_raw(304, b"", headers)
+                return
+        self._send_raw(status, payload, headers)
+
+    def _send_poster(self, path: str) -> None:
+        """模拟image.tmdb.org：/t/p/<尺寸>/<文件名>"""
+        state = self.server_state
+        state.count("requests", "/t/p/{size}")
+        match = re.match(r"^/t/p/(w\d+|original)(/.+)$", path)
+        payload = None
+        if match is not None and state.catalog is not None:
+            payload = state.catalog.poster(match.group(2), match.group(1))
+        if payload is None:
+            state.count("not_found")
+            self._send(404, {"status_code": 34, "status_message": "Not found."})
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send(self, status: int, body: Any, headers: Optional[Dict[str, str]] = None) -> None:
+        self._send_raw(status, json.dumps(body).encode("utf-8"), headers or {})
+
+    def _send_raw(self, status: int, payload: bytes, headers: Dict[str, str]) -> None:
+        self.send_response(status)
+        if status != 304:
+            self.send_header("Content-Type", "application/json;charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        if payload:
+            self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    """命令行入口：python -m utils.mock_server --fixtures data/fixtures"""
+    parser = argparse.ArgumentParser(description="本地TMDB替身服务器")
+    parser.add_argument("--fixtures", help="夹具目录（TMDB_RECORD_DIR录制的结果）")
+    parser.add_argument("--no-synthetic", action="store_true", help="没有夹具时返回404而不是合成数据")
+    parser.add_argument("--catalog-size", type=int, default=2000, help="合成目录中的电影数量")
+    parser.add_argument("--latency", type=float, default=0.0, help="平均附加延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="延迟抖动幅度（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="500错误注入概率")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="429注入概率")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--export", help="把合成目录写成TMDB每日导出格式的文件后退出")
+    args = parser.parse_args()
+
+    if args.export:
+        SyntheticCatalog(args.catalog_size).write_export(args.export)
+        print(f"已写出合成目录的导出文件: {args.export}")
+        return
+
+    server = MockTMDBServer(
+        fixtures_dir=args.fixtures,
+        synthetic=not args.no_synthetic,
+        catalog_size=args.catalog_size,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        host=args.host,
+        port=args.port
+    )
+    print(f"模拟TMDB服务器已启动: {server.base_url}")
+    print(f"使用方式: TMDB_BASE_URL={server.base_url} TMDB_IMAGE_SOURCE_URL={server.image_url} streamlit run app.py")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
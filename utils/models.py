@@ -0,0 +1,234 @@
+import sys
+import threading
+from typing import Dict, List, Optional, Any, Tuple
+from utils.genres import genre_mask
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    """驻留会在大量记录中重复出现的短字符串（类型名、语言代码、人名等）"""
+    return sys.intern(value) if value else value
+
+
+class Genre:
+    """电影类型，相同(id, 名称)的实例在进程内共享"""
+
+    __slots__ = ("id", "name")
+
+    _instances: Dict[Tuple[int, str], "Genre"] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, genre_id: int, name: str):
+        self.id = genre_id
+        self.name = name
+
+    @classmethod
+    def get(cls, genre_id: int, name: str) -> "Genre":
+        """
+        获取共享的类型实例
+
+        参数:
+            genre_id: 类型ID
+            name: 类型名称
+
+        返回:
+            Genre实例
+        """
+        key = (genre_id, name)
+        genre = cls._instances.get(key)
+        if genre is None:
+            with cls._lock:
+                genre = cls._instances.setdefault(key, cls(genre_id, _intern(name)))
+        return genre
+
+    def __reduce__(self):
+        # 反序列化时同样复用共享实例
+        return (Genre.get, (self.id, self.name))
+
+    def __repr__(self) -> str:
+        return f"Genre({self.id}, {self.name!r})"
+
+
+def _restore_record(cls: type, values: Tuple) -> Any:
+    """按槽位顺序还原记录（pickle使用）"""
+    record = cls.__new__(cls)
+    for name, value in zip(cls._slot_names(), values):
+        setattr(record, name, value)
+    return record
+
+
+class MovieSummary:
+    """列表接口（搜索、发现、热门、推荐）返回的电影摘要
+
+    构造时顺带计算类型位掩码和数字年份，打分器批量读取这两个字段而不必逐部重新编码。
+    """
+
+    __slots__ = (
+        "id", "title", "original_title", "overview", "poster_path", "release_date",
+        "vote_average", "vote_count", "popularity", "genre_ids", "adult",
+        "genre_bits", "release_year"
+    )
+
+    # 构造摘要需要的JSON字段，列表接口的响应在解码后只保留这些字段
+    JSON_FIELDS = (
+        "id", "title", "original_title", "overview", "poster_path", "release_date",
+        "vote_average", "vote_count", "popularity", "genre_ids", "adult"
+    )
+
+    def __init__(self,
+                 movie_id: int,
+                 title: str = "",
+                 original_title: str = "",
+                 overview: str = "",
+                 poster_path: Optional[str] = None,
+                 release_date: str = "",
+                 vote_average: float = 0.0,
+                 vote_count: int = 0,
+                 popularity: float = 0.0,
+                 genre_ids: Tuple[int, ...] = (),
+                 adult: bool = False):
+        self.id = movie_id
+        self.title = title
+        self.original_title = original_title
+        self.overview = overview
+        self.poster_path = poster_path
+        self.release_date = release_date
+        self.vote_average = vote_average
+        self.vote_count = vote_count
+        self.popularity = popularity
+        self.genre_ids = genre_ids
+        self.adult = adult
+        # 类型位掩码（同ColumnarCatalog的genres列）和上映年份（未知为0）
+        self.genre_bits = genre_mask(genre_ids)
+        year = release_date[:4]
+        self.release_year = int(year) if year.isdigit() else 0
+
+    @classmethod
+    def _summary_fields(cls, data: Dict[str, Any]) -> Dict[str, Any]:
+        """从TMDB JSON中提取摘要字段"""
+        return {
+            "movie_id": data["id"],
+            "title": data.get("title") or "",
+            "original_title": data.get("original_title") or "",
+            "overview": data.get("overview") or "",
+            "poster_path": data.get("poster_path"),
+            "release_date": data.get("release_date") or "",
+            "vote_average": data.get("vote_average") or 0.0,
+            "vote_count": data.get("vote_count") or 0,
+            "popularity": data.get("popularity") or 0.0,
+            "adult": bool(data.get("adult", False))
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "MovieSummary":
+        """
+        由TMDB列表接口的JSON条目创建摘要
+
+        参数:
+            data: 单部电影的JSON字典
+
+        返回:
+            MovieSummary实例
+        """
+        fields = cls._summary_fields(data)
+        fields["genre_ids"] = tuple(data.get("genre_ids") or ())
+        return cls(**fields)
+
+    @classmethod
+    def _slot_names(cls) -> Tuple[str, ...]:
+        """按继承顺序列出所有槽位名"""
+        names = cls.__dict__.get("_slot_names_cache")
+        if names is None:
+            names = tuple(
+                name for klass in reversed(cls.__mro__)
+                for name in klass.__dict__.get("__slots__", ())
+            )
+            setattr(cls, "_slot_names_cache", names)
+        return names
+
+    def __reduce__(self):
+        # 只序列化字段值而不重复写入字段名，减小会话状态的序列化体积
+        return (_restore_record, (type(self), tuple(getattr(self, name) for name in self._slot_names())))
+
+    @property
+    def year(self) -> str:
+        """上映年份，未知时为空字符串"""
+        return self.release_date[:4]
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, MovieSummary) and other.id == self.id
+
+    def __hash__(self) -> int:
+        return hash(self.id)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.id}, {self.title!r})"
+
+
+class Movie(MovieSummary):
+    """电影详情，在摘要的基础上附带片长、类型、主演和导演"""
+
+    __slots__ = ("runtime", "genres", "cast", "directors")
+
+    # 只保留前若干位主演
+    MAX_CAST = 10
+
+    def __init__(self,
+                 movie_id: int,
+                 runtime: int = 0,
+                 genres: Tuple[Genre, ...] = (),
+                 cast: Tuple[str, ...] = (),
+                 directors: Tuple[str, ...] = (),
+                 **summary_fields):
+        summary_fields.setdefault("genre_ids", tuple(genre.id for genre in genres))
+        super().__init__(movie_id, **summary_fields)
+        self.runtime = runtime
+        self.genres = genres
+        self.cast = cast
+        self.directors = directors
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "Movie":
+        """
+        由TMDB详情接口的JSON创建电影记录
+
+        参数:
+            data: 电影详情JSON字典（可包含credits）
+
+        返回:
+            Movie实例
+        """
+        fields = cls._summary_fields(data)
+        genres = tuple(Genre.get(genre["id"], genre["name"]) for genre in data.get("genres") or ())
+        credits = data.get("credits") or {}
+        cast = tuple(
+            _intern(member["name"]) for member in (credits.get("cast") or [])[:cls.MAX_CAST]
+        )
+        directors = tuple(
+            _intern(member["name"]) for member in credits.get("crew") or []
+            if member.get("job") == "Director"
+        )
+        return cls(
+            runtime=data.get("runtime") or 0,
+            genres=genres,
+            cast=cast,
+            directors=directors,
+            **fields
+        )
+
+
+def movie_page(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    把列表接口的分页JSON转换为以MovieSummary为元素的分页字典
+
+    参数:
+        data: 分页JSON（包含page、results、total_pages、total_results）
+
+    返回:
+        结构相同的字典，results中的元素为MovieSummary
+    """
+    return {
+        "page": data.get("page", 1),
+        "total_pages": data.get("total_pages", 0),
+        "total_results": data.get("total_results", 0),
+        "results": [MovieSummary.from_json(item) for item in data.get("results") or []]
+    }
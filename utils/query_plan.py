@@ -0,0 +1,248 @@
+import itertools
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from utils.async_api import AsyncTMDBApi
+from utils.models import MovieSummary
+
+
+# 每次做客户端过滤的候选数（与TMDB一页的条数一致）
+CHUNK_SIZE = 20
+
+
+def lookup_runtimes(api, movie_ids: List[int]) -> Dict[int, int]:
+    """
+    查询电影片长：先查片长索引，只为索引中没有的电影并发获取详情
+
+    参数:
+        api: TMDBApi实例（详情响应会自动写入其片长索引，请求通过AsyncTMDBApi并发发出）
+        movie_ids: 电影ID列表
+
+    返回:
+        {电影ID: 片长（分钟）}，获取失败的电影不在其中
+    """
+    runtime_index = api.runtime_index
+    runtimes = runtime_index.get_many(movie_ids) if runtime_index is not None else {}
+    missing = [movie_id for movie_id in movie_ids if movie_id not in runtimes]
+    if missing:
+        errors = {}
+        details_map = AsyncTMDBApi(api).get_movie_details_many(missing, projection="core", errors=errors)
+        for movie_id, error in errors.items():
+            print(f"获取电影 {movie_id} 详情出错: {error}")
+        runtimes.update({movie_id: details.runtime for movie_id, details in details_map.items()})
+    return runtimes
+
+
+class MovieQuery:
+    """推荐引擎和搜索页使用的过滤条件，与数据来源无关"""
+
+    def __init__(self,
+                 keyword: Optional[str] = None,
+                 genres: Optional[List[int]] = None,
+                 match_any_genre: bool = False,
+                 year: Optional[int] = None,
+                 runtime_range: Optional[Tuple[int, int]] = None,
+                 min_vote_average: Optional[float] = None,
+                 min_vote_count: Optional[int] = None,
+                 include_adult: bool = False,
+                 sort_by: str = "popularity.desc"):
+        """
+        初始化查询
+
+        参数:
+            keyword: 搜索关键词，None表示按条件发现
+            genres: 类型ID列表
+            match_any_genre: 为True时包含任一类型即可，否则要求包含全部类型
+            year: 上映年份
+            runtime_range: 片长范围（分钟），左闭右开，同MovieRecommender.DURATION_RANGES
+            min_vote_average: 最低评分
+            min_vote_count: 最少评分人数
+            include_adult: 是否包含成人内容
+            sort_by: 排序方式（只对发现有效）
+        """
+        self.keyword = keyword or None
+        self.genres = list(genres) if genres else []
+        self.match_any_genre = match_any_genre
+        self.year = year
+        self.runtime_range = runtime_range
+        self.min_vote_average = min_vote_average or None
+        self.min_vote_count = min_vote_count or None
+        self.include_adult = include_adult
+        self.sort_by = sort_by
+
+
+class QueryPlan:
+    """查询计划：能交给TMDB的条件放进请求参数，其余条件在客户端补充过滤
+
+    - 发现（discover）支持全部条件，结果无需再过滤；
+    - 搜索（search）只支持年份和成人内容，类型、评分和片长在客户端过滤；
+    - 外部候选（如热门列表）的所有条件都在客户端过滤。
+    片长不在列表结果中，客户端过滤片长时通过lookup_runtimes查询。
+    """
+
+    SOURCE_DISCOVER = "discover"
+    SOURCE_SEARCH = "search"
+    SOURCE_EXTERNAL = "external"
+
+    def __init__(self, source: str, params: Dict, residual: List[str], query: MovieQuery):
+        """
+        初始化查询计划（通常通过QueryPlan.for_query创建）
+
+        参数:
+            source: 数据来源，SOURCE_DISCOVER、SOURCE_SEARCH或SOURCE_EXTERNAL
+            params: 传给discover_movies/search_movies的参数
+            residual: 需要在客户端过滤的条件名
+            query: 原始查询
+        """
+        self.source = source
+        self.params = params
+        self.residual = residual
+        self.query = query
+
+    @classmethod
+    def for_query(cls, query: MovieQuery, external: bool = False) -> "QueryPlan":
+        """
+        为查询生成执行计划
+
+        参数:
+            query: 查询条件
+            external: 候选由调用方提供（见QueryPlan.apply），所有条件都在客户端过滤
+
+        返回:
+            QueryPlan实例
+        """
+        residual = []
+        params = {}
+        if external:
+            source = cls.SOURCE_EXTERNAL
+        elif query.keyword:
+            source = cls.SOURCE_SEARCH
+            params = {"query": query.keyword, "year": query.year, "include_adult": query.include_adult}
+        else:
+            source = cls.SOURCE_DISCOVER
+            params = {
+                "genres": query.genres or None,
+                "match_any_genre": query.match_any_genre,
+                "year": query.year,
+                "sort_by": query.sort_by,
+                "min_vote_average": query.min_vote_average,
+                "min_vote_count": query.min_vote_count,
+                "include_adult": query.include_adult
+            }
+            if query.runtime_range:
+                # TMDB的片长条件两端都包含，DURATION_RANGES为左闭右开
+                min_runtime, max_runtime = query.runtime_range
+                params["min_runtime"] = min_runtime or None
+                params["max_runtime"] = max_runtime - 1
+
+        if source != cls.SOURCE_DISCOVER:
+            if query.genres:
+                residual.append("genres")
+            if query.min_vote_average:
+                residual.append("vote_average")
+            if query.min_vote_count:
+                residual.append("vote_count")
+            if query.runtime_range:
+                residual.append("runtime")
+        if source == cls.SOURCE_EXTERNAL:
+            if query.year:
+                residual.append("year")
+            if not query.include_adult:
+                residual.append("adult")
+        return cls(source, params, residual, query)
+
+    def __repr__(self) -> str:
+        pushed = {key: value for key, value in self.params.items() if value not in (None, False, [])}
+        return f"QueryPlan(source={self.source!r}, params={pushed!r}, residual={self.residual!r})"
+
+    def _predicates(self) -> List[Callable[[MovieSummary], bool]]:
+        """不需要额外请求的客户端过滤条件"""
+        query = self.query
+        predicates = []
+        if "genres" in self.residual:
+            wanted = set(query.genres)
+            if query.match_any_genre:
+                predicates.append(lambda movie: not wanted.isdisjoint(movie.genre_ids))
+            else:
+                predicates.append(lambda movie: wanted.issubset(movie.genre_ids))
+        if "vote_average" in self.residual:
+            predicates.append(lambda movie: movie.vote_average >= query.min_vote_average)
+        if "vote_count" in self.residual:
+            predicates.append(lambda movie: movie.vote_count >= query.min_vote_count)
+        if "year" in self.residual:
+            year = str(query.year)
+            predicates.append(lambda movie: movie.year == year)
+        if "adult" in self.residual:
+            predicates.append(lambda movie: not movie.adult)
+        return predicates
+
+    def candidates(self, api, max_pages: int = 5) -> Iterator[MovieSummary]:
+        """
+        按计划向TMDB请求候选电影（跨页惰性产出）
+
+        参数:
+            api: TMDBApi实例
+            max_pages: 最多请求的页数
+
+        返回:
+            电影迭代器
+        """
+        if self.source == self.SOURCE_DISCOVER:
+            filters = {key: value for key, value in self.params.items() if key not in ("genres", "year", "sort_by")}
+            return api.iter_discover(
+                genres=self.params["genres"],
+                year=self.params["year"],
+                sort_by=self.params["sort_by"],
+                max_pages=max_pages,
+                **filters
+            )
+        if self.source == self.SOURCE_SEARCH:
+            return api.iter_search(
+                self.params["query"],
+                max_pages=max_pages,
+                year=self.params["year"],
+                include_adult=self.params["include_adult"]
+            )
+        raise ValueError("外部候选的计划需要通过apply传入候选电影")
+
+    def apply(self, api, movies: Iterable[MovieSummary], limit: int = 20) -> List[MovieSummary]:
+        """
+        对候选电影执行客户端过滤，保持原顺序
+
+        参数:
+            api: TMDBApi实例（片长过滤时用于查询片长）
+            movies: 候选电影，可以是惰性迭代器（凑够limit后不再消费）
+            limit: 最多返回的电影数
+
+        返回:
+            满足全部条件的电影列表
+        """
+        predicates = self._predicates()
+        movies = iter(movies)
+        results = []
+        while len(results) < limit:
+            chunk = list(itertools.islice(movies, CHUNK_SIZE))
+            if not chunk:
+                break
+            chunk = [movie for movie in chunk if all(predicate(movie) for predicate in predicates)]
+            if "runtime" in self.residual and chunk:
+                min_runtime, max_runtime = self.query.runtime_range
+                runtimes = lookup_runtimes(api, [movie.id for movie in chunk])
+                chunk = [
+                    movie for movie in chunk
+                    if movie.id in runtimes and min_runtime <= runtimes[movie.id] < max_runtime
+                ]
+            results.extend(chunk)
+        return results[:limit]
+
+    def execute(self, api, limit: int = 20, max_pages: int = 5) -> List[MovieSummary]:
+        """
+        执行计划：请求候选电影并补充过滤，直到凑够limit部或没有更多页
+
+        参数:
+            api: TMDBApi实例
+            limit: 最多返回的电影数
+            max_pages: 最多请求的页数
+
+        返回:
+            满足全部条件的电影列表
+        """
+        return self.apply(api, self.candidates(api, max_pages=max_pages), limit)
@@ -0,0 +1,143 @@
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Any
+
+
+# 请求优先级：交互式页面请求优先于后台预热/预取请求
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+
+def parse_retry_after(value: Optional[str], default: float = 1.0) -> float:
+    """
+    解析Retry-After响应头
+
+    参数:
+        value: 响应头的值，可以是秒数或HTTP日期
+        default: 无法解析时的等待秒数
+
+    返回:
+        需要等待的秒数
+    """
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+
+class RateLimiter:
+    """带两级优先级的令牌桶限流器
+
+    令牌不足时调用方会被挂起等待而不是报错；只要有交互式请求在等待，
+    后台请求就不会拿到令牌。服务端返回429时可通过pause()让所有请求暂停。
+    """
+
+    def __init__(self, rate: float = 40.0, burst: int = 20):
+        """
+        初始化限流器
+
+        参数:
+            rate: 每秒补充的令牌数（即允许的平均请求速率）
+            burst: 令牌桶容量（允许的瞬时突发请求数）
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiting = {PRIORITY_INTERACTIVE: 0, PRIORITY_BACKGROUND: 0}
+        self._cond = threading.Condition()
+        self.stats = {
+            "acquired": 0,
+            "waited": 0,
+            "wait_seconds": 0.0,
+            "throttled": 0
+        }
+
+    def acquire(self, priority: int = PRIORITY_INTERACTIVE, timeout: Optional[float] = None) -> bool:
+        """
+        获取一个令牌，必要时挂起等待
+
+        参数:
+            priority: 请求优先级，PRIORITY_INTERACTIVE或PRIORITY_BACKGROUND
+            timeout: 最长等待秒数，None表示一直等待
+
+        返回:
+            是否成功获取令牌（仅在超时时返回False）
+        """
+        start = time.monotonic()
+        deadline = start + timeout if timeout is not None else None
+        with self._cond:
+            self._waiting[priority] += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+
+                    if self._paused_until > now:
+                        wait_for = self._paused_until - now
+                    elif priority == PRIORITY_BACKGROUND and self._waiting[PRIORITY_INTERACTIVE]:
+                        # 让交互式请求先拿令牌
+                        wait_for = 1.0 / self.rate
+                    elif self._tokens >= 1:
+                        self._tokens -= 1
+                        self.stats["acquired"] += 1
+                        waited = now - start
+                        if waited > 0.001:
+                            self.stats["waited"] += 1
+                            self.stats["wait_seconds"] += waited
+                        return True
+                    else:
+                        wait_for = (1 - self._tokens) / self.rate
+
+                    if deadline is not None:
+                        if now >= deadline:
+                            return False
+                        wait_for = min(wait_for, deadline - now)
+                    self._cond.wait(wait_for)
+            finally:
+                self._waiting[priority] -= 1
+                self._cond.notify_all()
+
+    def pause(self, seconds: float) -> None:
+        """
+        暂停发放令牌（用于遵守服务端的Retry-After）
+
+        参数:
+            seconds: 暂停秒数
+        """
+        with self._cond:
+            now = time.monotonic()
+            self._paused_until = max(self._paused_until, now + seconds)
+            self._tokens = 0.0
+            self._updated = now
+            self.stats["throttled"] += 1
+            self._cond.notify_all()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        获取限流统计
+
+        返回:
+            包含已发放令牌数、等待次数、累计等待时间和429次数的字典
+        """
+        with self._cond:
+            stats = dict(self.stats)
+            stats["waiting_interactive"] = self._waiting[PRIORITY_INTERACTIVE]
+            stats["waiting_background"] = self._waiting[PRIORITY_BACKGROUND]
+        return stats
+
+    def _refill(self, now: float) -> None:
+        """按经过的时间补充令牌（暂停期间不补充）"""
+        start = max(self._updated, self._paused_until)
+        if now > start:
+            self._tokens = min(self.burst, self._tokens + (now - start) * self.rate)
+        self._updated = max(self._updated, now)
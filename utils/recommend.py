@@ -4,6 +4,12 @@ from typing import Dict, List, Optional, Any, Tuple
 import json
 import os
 from utils.api import TMDBApi
+from utils.async_api import AsyncTMDBApi
+from utils.genres import GenreStore
+from utils.models import Movie, MovieSummary
+from utils.query_plan import MovieQuery, QueryPlan
+from utils.scoring import CandidateScorer
+from utils.similarity import SimilarityIndex
 
 class MovieRecommender:
     """电影推荐引擎"""
@@ -30,17 +36,36 @@ class MovieRecommender:
         """
         初始化推荐引擎
         
+        构造时不读文件也不发请求：用户数据在第一次使用时加载，
+        电影类型来自进程级共享的类型表。
+        
         参数:
             api: TMDB API实例
             user_data_path: 用户数据文件路径
         """
         self.api = api
+        # 批量获取详情时在事件循环中并发发出请求
+        self.async_api = AsyncTMDBApi(api)
         self.user_data_path = user_data_path
-        self.user_data = self._load_user_data()
-        
-        # 加载电影类型
-        genres_response = self.api.get_movie_genres()
-        self.genres_map = {genre['id']: genre['name'] for genre in genres_response['genres']}
+        self._user_data = None
+        self.genre_store = GenreStore.default()
+
+    @property
+    def user_data(self) -> Dict:
+        """用户数据，第一次访问时从磁盘加载"""
+        if self._user_data is None:
+            self._user_data = self._load_user_data()
+        return self._user_data
+
+    @user_data.setter
+    def user_data(self, data: Dict) -> None:
+        self._user_data = data
+
+    @property
+    def genres_map(self) -> Dict[int, str]:
+        """电影类型ID到名称的映射，快照过期时在后台刷新"""
+        self.genre_store.refresh_async(self.api)
+        return self.genre_store.get_map()
     
     def _load_user_data(self) -> Dict:
         """
@@ -112,10 +137,10 @@ class MovieRecommender:
             liked: 是否喜欢
         """
         try:
-            movie_details = self.api.get_movie_details(movie_id)
+            movie_details = self.api.get_movie_details(movie_id, projection="core")
             
             # 获取电影类型ID列表
-            genres = [genre['id'] for genre in movie_details.get('genres', [])]
+            genres = [genre.id for genre in movie_details.genres]
             
             for genre_id in genres:
                 genre_name = self.genres_map.get(genre_id, str(genre_id))
@@ -134,7 +159,7 @@ class MovieRecommender:
     def get_recommendations_by_mood(self, 
                                     mood: str, 
                                     duration: Optional[str] = None,
-                                    limit: int = 10) -> List[Dict]:
+                                    limit: int = 10) -> List[MovieSummary]:
         """
         根据心情推荐电影
         
@@ -146,61 +171,33 @@ class MovieRecommender:
         返回:
             电影列表
         """
-        # 获取对应心情的类型ID
-        genre_ids = self.MOOD_TO_GENRES.get(mood, [])
+        query = self.build_mood_query(mood, duration)
         
-        if not genre_ids:
-            # 如果没有映射，返回热门电影
+        if not query.genres:
+            # 如果没有映射，返回热门电影（热门列表不支持过滤，全部条件在客户端过滤）
             trending = self.api.get_trending_movies()
-            return self._filter_by_duration(trending['results'], duration)[:limit]
+            return QueryPlan.for_query(query, external=True).apply(self.api, trending['results'], limit)
             
-        # 尝试通过类型获取电影
-        discover = self.api.discover_movies(genres=genre_ids)
-        
-        # 根据时长过滤并返回结果
-        return self._filter_by_duration(discover['results'], duration)[:limit]
+        # 类型和时长都交给discover过滤，返回的结果无需再逐部查询片长
+        return QueryPlan.for_query(query).execute(self.api, limit)
     
-    def _filter_by_duration(self, movies: List[Dict], duration_key: Optional[str]) -> List[Dict]:
+    def build_mood_query(self, mood: str, duration: Optional[str] = None) -> MovieQuery:
         """
-        根据时长过滤电影
+        把心情和时长选项转换为查询条件
         
         参数:
-            movies: 电影列表
-            duration_key: 时长范围键名
+            mood: 心情关键词，没有映射时不限类型
+            duration: 时长范围键名，None或未知时不限片长
             
         返回:
-            过滤后的电影列表
+            MovieQuery实例
         """
-        if not duration_key or duration_key not in self.DURATION_RANGES:
-            return movies
-            
-        min_duration, max_duration = self.DURATION_RANGES[duration_key]
-        
-        # 先获取详细信息，然后过滤
-        filtered_movies = []
-        for movie in movies:
-            try:
-                details = self.api.get_movie_details(movie['id'])
-                runtime = details.get('runtime', 0)
-                
-                if min_duration <= runtime < max_duration:
-                    # 合并详细信息到电影对象
-                    movie.update({
-                        'runtime': runtime,
-                        'genres': details.get('genres', []),
-                        'overview': details.get('overview', '')
-                    })
-                    filtered_movies.append(movie)
-                    
-                    # 如果已经收集足够的电影，提前结束
-                    if len(filtered_movies) >= 20:
-                        break
-            except Exception as e:
-                print(f"获取电影详情出错: {e}")
-                
-        return filtered_movies
+        return MovieQuery(
+            genres=self.MOOD_TO_GENRES.get(mood, []),
+            runtime_range=self.DURATION_RANGES.get(duration) if duration else None
+        )
     
-    def get_personalized_recommendations(self, limit: int = 10) -> List[Dict]:
+    def get_personalized_recommendations(self, limit: int = 10) -> List[MovieSummary]:
         """
         获取个性化推荐
         
@@ -212,18 +209,28 @@ class MovieRecommender:
         """
         # 从用户喜欢的电影中获取推荐
         recommended_movies = []
+        # 相似度索引给出的相似度，打分时作为候选的先验分
+        similarity_scores = None
         
         # 如果有喜欢的电影，根据它们推荐
         if self.user_data["liked"]:
-            # 随机选择一部喜欢的电影
-            import random
-            liked_movie_id = random.choice(self.user_data["liked"])
+            similarity_index = SimilarityIndex.default()
+            if similarity_index is not None:
+                # 本地索引可以一次查询与全部喜欢的电影整体相似的电影，不需要网络请求
+                similar = similarity_index.similar_with_scores(self.user_data["liked"], limit * 2)
+                recommended_movies.extend(movie for movie, _ in similar)
+                similarity_scores = {movie.id: score for movie, score in similar}
             
-            try:
-                recommendations = self.api.get_recommended_movies(liked_movie_id)
-                recommended_movies.extend(recommendations['results'])
-            except Exception as e:
-                print(f"获取推荐出错: {e}")
+            if not recommended_movies:
+                # 随机选择一部喜欢的电影
+                import random
+                liked_movie_id = random.choice(self.user_data["liked"])
+                
+                try:
+                    recommendations = self.api.get_recommended_movies(liked_movie_id)
+                    recommended_movies.extend(recommendations['results'])
+                except Exception as e:
+                    print(f"获取推荐出错: {e}")
         
         # 如果推荐不足，根据用户偏好发现电影
         if len(recommended_movies) < limit and self.user_data["preferences"]:
@@ -235,14 +242,11 @@ class MovieRecommender:
             )
             
             # 获取前两个最喜欢的类型
-            favorite_genres = []
-            for genre_name, score in sorted_preferences[:2]:
-                if score > 0:  # 只考虑正面偏好
-                    # 根据名称找到ID
-                    for genre_id, name in self.genres_map.items():
-                        if name == genre_name:
-                            favorite_genres.append(genre_id)
-                            break
+            name_to_id = {name: genre_id for genre_id, name in self.genres_map.items()}
+            favorite_genres = [
+                name_to_id[genre_name] for genre_name, score in sorted_preferences[:2]
+                if score > 0 and genre_name in name_to_id  # 只考虑正面偏好
+            ]
             
             if favorite_genres:
                 try:
@@ -259,16 +263,35 @@ class MovieRecommender:
             except Exception as e:
                 print(f"获取热门电影出错: {e}")
         
-        # 去重
-        unique_movies = []
-        seen_ids = set()
+        # 去重、排除已看过的电影后按用户偏好、人气、评分、新近程度和相似度统一打分排序
+        scorer = CandidateScorer.from_named_preferences(self.user_data["preferences"], self.genres_map)
+        return scorer.rank(
+            recommended_movies, limit,
+            exclude_ids=self.user_data["watched"],
+            priors=similarity_scores
+        )
+    
+    def get_similar_movies(self, movie_id: int, limit: int = 6) -> List[MovieSummary]:
+        """
+        获取与某部电影相似的电影
         
-        for movie in recommended_movies:
-            if movie['id'] not in seen_ids and movie['id'] not in self.user_data["watched"]:
-                seen_ids.add(movie['id'])
-                unique_movies.append(movie)
+        优先查询本地相似度索引；索引未构建或其中没有该电影时，
+        使用TMDB的推荐列表（详情页打开时已随详情一起获取并缓存）。
         
-        return unique_movies[:limit]
+        参数:
+            movie_id: 电影ID
+            limit: 返回电影数量限制
+            
+        返回:
+            电影列表
+        """
+        similarity_index = SimilarityIndex.default()
+        if similarity_index is not None:
+            similar = similarity_index.similar_to(movie_id, limit)
+            if similar:
+                return similar
+        bundle = self.api.get_movie_bundle(movie_id, parts=["recommendations"])
+        return bundle['recommendations']['results'][:limit]
     
     def get_viewing_stats(self) -> Dict:
         """
@@ -298,22 +321,25 @@ class MovieRecommender:
                 if score > 0
             ][:5]  # 最多5个最喜欢的类型
         
-        # 获取已观看电影详情
-        for movie_id in self.user_data["watched"][-10:]:  # 最近10部
-            try:
-                movie = self.api.get_movie_details(movie_id)
-                status = "liked" if movie_id in self.user_data["liked"] else (
-                    "disliked" if movie_id in self.user_data["disliked"] else "neutral"
-                )
-                
-                stats["watched_movies"].append({
-                    "id": movie_id,
-                    "title": movie.get("title", "未知电影"),
-                    "poster_path": movie.get("poster_path", ""),
-                    "status": status,
-                    "date": movie.get("release_date", "")
-                })
-            except Exception as e:
-                print(f"获取电影详情出错: {e}")
+        # 批量获取已观看电影详情
+        errors = {}
+        details_map = self.async_api.get_movie_details_many(
+            self.user_data["watched"][-10:], projection="core", errors=errors  # 最近10部
+        )
+        for movie_id, error in errors.items():
+            print(f"获取电影 {movie_id} 详情出错: {error}")
+        
+        for movie_id, movie in details_map.items():
+            status = "liked" if movie_id in self.user_data["liked"] else (
+                "disliked" if movie_id in self.user_data["disliked"] else "neutral"
+            )
+            
+            stats["watched_movies"].append({
+                "id": movie_id,
+                "title": movie.title or "未知电影",
+                "poster_path": movie.poster_path or "",
+                "status": status,
+                "date": movie.release_date
+            })
         
         return stats
\ No newline at end of file
@@ -0,0 +1,185 @@
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+
+class RuntimeIndex:
+    """电影ID到片长的持久化索引
+
+    TMDB的列表接口不返回片长，按时长筛选原本需要为每部候选电影请求详情。
+    这里记录所有见过的详情响应中的片长（以及从本地目录批量回填的片长），
+    筛选时先查索引，只为缺失的电影批量请求详情。
+    """
+
+    # 片长记录的有效期（秒），过期后重新从详情获取
+    MAX_AGE = 30 * 24 * 3600
+
+    _default_instance = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, db_path: Optional[str] = None):
+        """
+        初始化片长索引
+
+        参数:
+            db_path: SQLite文件路径，None表示只保存在内存中
+        """
+        self.db_path = db_path
+        # {电影ID: (片长, 写入时间)}，内存中的记录与磁盘记录使用同样的有效期
+        self._memory: Dict[int, Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "observed": 0}
+        self._conn = None
+        if db_path:
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS runtimes (
+                    id INTEGER PRIMARY KEY,
+                    runtime INTEGER NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            self._conn.commit()
+
+    @classmethod
+    def default(cls) -> "RuntimeIndex":
+        """
+        获取进程级共享的片长索引
+
+        返回:
+            RuntimeIndex实例，数据库位于DATA_DIR/runtime_index.db
+        """
+        with cls._default_lock:
+            if cls._default_instance is None:
+                data_dir = os.environ.get("DATA_DIR", "data")
+                cls._default_instance = cls(os.path.join(data_dir, "runtime_index.db"))
+            return cls._default_instance
+
+    def get_many(self, movie_ids: Iterable[int]) -> Dict[int, int]:
+        """
+        批量查询片长
+
+        参数:
+            movie_ids: 电影ID
+
+        返回:
+            {电影ID: 片长（分钟）}，只包含已知的电影
+        """
+        movie_ids = list(dict.fromkeys(movie_ids))
+        cutoff = time.time() - self.MAX_AGE
+        with self._lock:
+            found = {}
+            for movie_id in movie_ids:
+                entry = self._memory.get(movie_id)
+                if entry is not None and entry[1] > cutoff:
+                    found[movie_id] = entry[0]
+            missing = [movie_id for movie_id in movie_ids if movie_id not in found]
+            if missing and self._conn is not None:
+                for offset in range(0, len(missing), 500):
+                    chunk = missing[offset:offset + 500]
+                    rows = self._conn.execute(
+                        f"SELECT id, runtime, updated_at FROM runtimes WHERE id IN ({', '.join('?' * len(chunk))}) "
+                        "AND updated_at > ?",
+                        chunk + [cutoff]
+                    ).fetchall()
+                    for movie_id, runtime, updated_at in rows:
+                        found[movie_id] = runtime
+                        self._memory[movie_id] = (runtime, updated_at)
+            self.stats["hits"] += len(found)
+            self.stats["misses"] += len(movie_ids) - len(found)
+        return found
+
+    def put_many(self, runtimes: Dict[int, int]) -> None:
+        """
+        写入片长（片长未变的记录同样刷新写入时间，重新获取过的记录不会按旧时间过期）
+
+        参数:
+            runtimes: {电影ID: 片长（分钟）}
+        """
+        if not runtimes:
+            return
+        now = time.time()
+        with self._lock:
+            self.stats["observed"] += sum(
+                1 for movie_id, runtime in runtimes.items()
+                if self._memory.get(movie_id, (None,))[0] != runtime
+            )
+            self._memory.update((movie_id, (runtime, now)) for movie_id, runtime in runtimes.items())
+            if self._conn is not None:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO runtimes (id, runtime, updated_at) VALUES (?, ?, ?)",
+                    [(movie_id, runtime, now) for movie_id, runtime in runtimes.items()]
+                )
+                self._conn.commit()
+
+    def observe(self, details: Dict) -> None:
+        """
+        从电影详情JSON中记录片长（TMDBApi在收到详情响应时调用）
+
+        参数:
+            details: /movie/{id}的响应
+        """
+        movie_id = details.get("id")
+        if movie_id is not None:
+            self.put_many({movie_id: details.get("runtime") or 0})
+
+    def backfill(self, movies: Iterable[Dict], batch_size: int = 5000) -> int:
+        """
+        批量回填片长
+
+        参数:
+            movies: 含id和runtime字段的字典（如MovieCatalog.iter_movies()的结果）
+            batch_size: 每次写入的条数
+
+        返回:
+            回填的条数
+        """
+        total = 0
+        batch: Dict[int, int] = {}
+        for movie in movies:
+            batch[movie["id"]] = movie["runtime"] or 0
+            if len(batch) >= batch_size:
+                self.put_many(batch)
+                total += len(batch)
+                batch = {}
+        self.put_many(batch)
+        return total + len(batch)
+
+    def get_stats(self) -> Dict:
+        """
+        获取命中统计
+
+        返回:
+            包含命中、未命中和新记录条数的字典
+        """
+        with self._lock:
+            return dict(self.stats)
+
+
+def main():
+    """命令行入口：python -m utils.runtime_index backfill"""
+    from utils.catalog import MovieCatalog
+
+    parser = argparse.ArgumentParser(description="电影片长索引")
+    parser.add_argument("--db", help="目录数据库路径，默认DATA_DIR/catalog.db")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("backfill", help="从本地目录回填片长")
+    args = parser.parse_args()
+
+    if args.command == "backfill":
+        catalog = MovieCatalog(args.db) if args.db else MovieCatalog.default()
+        count = RuntimeIndex.default().backfill(catalog.iter_movies())
+        print(f"已回填 {count} 部电影的片长")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import datetime
+from operator import attrgetter
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from utils.genres import GENRE_BITS
+from utils.models import MovieSummary
+
+
+class CandidateScorer:
+    """候选电影的批量打分
+
+    把候选电影编码为 候选×类型 的0/1矩阵，与用户的类型偏好向量相乘得到类型契合度，
+    再与人气、评分（按评分人数收缩）、新近程度以及可选的候选先验分（如与用户喜欢的电影的相似度）
+    加权求和，一次NumPy运算为全部候选打分，最后用argpartition取前K名。
+    输入既可以是MovieSummary列表，也可以直接是列式目录的数组。
+    """
+
+    # 各项得分的权重（各项都已归一化到大致[0, 1]，类型契合度可为负）；
+    # similarity只在传入先验分时生效
+    DEFAULT_WEIGHTS = {
+        "genre": 0.45,
+        "popularity": 0.15,
+        "rating": 0.25,
+        "recency": 0.15,
+        "similarity": 0.35
+    }
+
+    # 评分收缩的先验评分人数：评分人数远小于该值的电影，评分向候选的平均分靠拢
+    PRIOR_VOTES = 50.0
+
+    # 新近程度的半衰期（年）
+    RECENCY_HALF_LIFE = 8.0
+
+    # 类型位序号，与列式目录的类型掩码一致
+    _BITS = np.arange(len(GENRE_BITS), dtype=np.uint32)
+
+    # 从MovieSummary一次取出打分需要的全部字段，按结构化数组的字段顺序
+    _FIELDS = attrgetter("genre_bits", "popularity", "vote_average", "vote_count", "release_year")
+    _FIELD_DTYPE = np.dtype([
+        ("genres", np.uint32),
+        ("popularity", np.float32),
+        ("vote_average", np.float32),
+        ("vote_count", np.int32),
+        ("year", np.int16)
+    ])
+
+    def __init__(self,
+                 genre_preferences: Optional[Dict[int, float]] = None,
+                 weights: Optional[Dict[str, float]] = None,
+                 current_year: Optional[int] = None):
+        """
+        初始化打分器
+
+        参数:
+            genre_preferences: {类型ID: 偏好值}，可为负；按最大绝对值归一化
+            weights: 各项得分的权重，缺省项使用DEFAULT_WEIGHTS
+            current_year: 计算新近程度的基准年份，None表示今年
+        """
+        self.weights = dict(self.DEFAULT_WEIGHTS, **(weights or {}))
+        self.current_year = current_year or datetime.date.today().year
+        self.preference = np.zeros(len(GENRE_BITS), dtype=np.float32)
+        for genre_id, value in (genre_preferences or {}).items():
+            bit = GENRE_BITS.get(genre_id)
+            if bit is not None:
+                self.preference[bit] = value
+        scale = np.abs(self.preference).max()
+        if scale > 0:
+            self.preference /= scale
+
+    @classmethod
+    def from_named_preferences(cls,
+                               preferences: Dict[str, float],
+                               genres_map: Dict[int, str],
+                               **kwargs) -> "CandidateScorer":
+        """
+        由按类型名称记录的用户偏好创建打分器（用户数据中的偏好以名称为键）
+
+        参数:
+            preferences: {类型名称: 偏好值}
+            genres_map: {类型ID: 类型名称}
+            kwargs: 其余参数同构造函数
+
+        返回:
+            CandidateScorer实例
+        """
+        name_to_id = {name: genre_id for genre_id, name in genres_map.items()}
+        genre_preferences = {}
+        for name, value in preferences.items():
+            # 类型表里没有的名称是更新偏好时用ID字符串兜底记录的
+            genre_id = name_to_id.get(name) or (int(name) if name.isdigit() else None)
+            if genre_id is not None:
+                genre_preferences[genre_id] = genre_preferences.get(genre_id, 0) + value
+        return cls(genre_preferences, **kwargs)
+
+    def score_arrays(self,
+                     genres: np.ndarray,
+                     popularity: np.ndarray,
+                     vote_average: np.ndarray,
+                     vote_count: np.ndarray,
+                     year: np.ndarray,
+                     prior: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        为列式数据打分
+
+        参数:
+            genres: 类型位掩码（uint32，同ColumnarCatalog的genres列）
+            popularity: 人气
+            vote_average: 平均评分（0-10）
+            vote_count: 评分人数
+            year: 上映年份，未知为0
+            prior: 每个候选的先验分（如相似度，非负，按最大值归一化），没有先验的候选为0；
+                   None表示不使用该项
+
+        返回:
+            float32得分数组，与输入等长
+        """
+        if len(genres) == 0:
+            return np.zeros(0, dtype=np.float32)
+
+        # 候选×类型矩阵，每行按类型数的平方根归一，避免类型多的电影占便宜
+        matrix = ((np.asarray(genres, dtype=np.uint32)[:, None] >> self._BITS) & 1).astype(np.float32)
+        genre_counts = matrix.sum(axis=1)
+        genre_score = (matrix @ self.preference) / np.sqrt(np.maximum(genre_counts, 1.0))
+
+        popularity = np.log1p(np.maximum(np.asarray(popularity, dtype=np.float32), 0))
+        popularity_score = popularity / max(float(popularity.max()), 1e-6)
+
+        votes = np.asarray(vote_count, dtype=np.float32)
+        average = np.asarray(vote_average, dtype=np.float32)
+        mean_rating = float((average * votes).sum() / votes.sum()) if votes.sum() > 0 else 0.0
+        rating_score = (average * votes + mean_rating * self.PRIOR_VOTES) / (votes + self.PRIOR_VOTES) / 10.0
+
+        year = np.asarray(year, dtype=np.float32)
+        age = np.maximum(self.current_year - year, 0)
+        recency_score = np.where(year > 0, np.exp2(-age / self.RECENCY_HALF_LIFE), 0).astype(np.float32)
+
+        weights = self.weights
+        scores = (
+            weights["genre"] * genre_score
+            + weights["popularity"] * popularity_score
+            + weights["rating"] * rating_score
+            + weights["recency"] * recency_score
+        )
+        if prior is not None:
+            prior = np.maximum(np.asarray(prior, dtype=np.float32), 0)
+            scores = scores + weights["similarity"] * prior / max(float(prior.max()), 1e-6)
+        return scores.astype(np.float32)
+
+    def score(self, movies: List[MovieSummary], priors: Optional[Dict[int, float]] = None) -> np.ndarray:
+        """
+        为电影摘要列表打分
+
+        参数:
+            movies: 候选电影
+            priors: {电影ID: 先验分}，不在其中的候选先验分为0；None表示不使用该项
+
+        返回:
+            float32得分数组，与movies顺序一致
+        """
+        # 类型掩码和年份在构造MovieSummary时已算好，这里一次遍历取成结构化数组
+        fields = np.fromiter(map(self._FIELDS, movies), dtype=self._FIELD_DTYPE, count=len(movies))
+        prior = None
+        if priors is not None:
+            prior = np.array([priors.get(movie.id, 0.0) for movie in movies], dtype=np.float32)
+        return self.score_arrays(
+            fields["genres"], fields["popularity"], fields["vote_average"], fields["vote_count"], fields["year"],
+            prior
+        )
+
+    @staticmethod
+    def top_indices(scores: np.ndarray, k: int) -> np.ndarray:
+        """
+        取得分最高的k个下标（按得分降序）
+
+        参数:
+            scores: 得分数组
+            k: 数量
+
+        返回:
+            下标数组
+        """
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.zeros(0, dtype=np.int64)
+        if k < len(scores):
+            candidates = np.argpartition(-scores, k - 1)[:k]
+        else:
+            candidates = np.arange(len(scores))
+        return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+    def rank(self,
+             movies: Iterable[MovieSummary],
+             k: int,
+             exclude_ids: Iterable[int] = (),
+             priors: Optional[Dict[int, float]] = None) -> List[MovieSummary]:
+        """
+        去重并排除指定电影后，返回得分最高的k部
+
+        参数:
+            movies: 候选电影（可含重复）
+            k: 返回数量
+            exclude_ids: 需要排除的电影ID（如已看过的电影）
+            priors: {电影ID: 先验分}，如相似度索引给出的相似度
+
+        返回:
+            按得分降序排列的电影列表
+        """
+        excluded = set(exclude_ids)
+        unique = {}
+        for movie in movies:
+            if movie.id not in excluded and movie.id not in unique:
+                unique[movie.id] = movie
+        candidates = list(unique.values())
+        return [candidates[i] for i in self.top_indices(self.score(candidates, priors), k)]
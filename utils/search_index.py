@@ -0,0 +1,413 @@
+import argparse
+import json
+import math
+import os
+import re
+import shutil
+import threading
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from utils.columnar import ColumnarCatalog
+from utils.models import MovieSummary
+
+
+# 中日韩文字（按字切分为二元组），其余字母数字按词切分
+_CJK_RANGES = (
+    "\u3040-\u30ff"  # 日文假名
+    "\u3400-\u4dbf"  # 扩展A
+    "\u4e00-\u9fff"  # 基本汉字
+    "\uac00-\ud7af"  # 韩文
+    "\uf900-\ufaff"  # 兼容汉字
+)
+_TOKEN_PATTERN = re.compile(f"[{_CJK_RANGES}]+|[^\\W_]+")
+_CJK_PATTERN = re.compile(f"^[{_CJK_RANGES}]")
+
+
+def normalize(text: str) -> str:
+    """统一全角/半角和大小写"""
+    return unicodedata.normalize("NFKC", text or "").lower()
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    把文本切分为检索词
+
+    中日韩文字连续片段切为相邻两字的二元组（单字片段保留单字），
+    拉丁字母和数字按词切分。
+
+    参数:
+        text: 原始文本
+
+    返回:
+        检索词列表（保留重复，用于计算词频）
+    """
+    tokens = []
+    for run in _TOKEN_PATTERN.findall(normalize(text)):
+        if _CJK_PATTERN.match(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+class _SortedStrings:
+    """按字节序排列的字符串表（连续字节块 + 偏移数组），支持二分查找和前缀范围查询"""
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def get(self, index: int) -> bytes:
+        return self.blob[int(self.offsets[index]):int(self.offsets[index + 1])].tobytes()
+
+    def lower_bound(self, key: bytes) -> int:
+        """第一个不小于key的位置"""
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self.get(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def find(self, key: bytes) -> Optional[int]:
+        """精确查找，不存在时返回None"""
+        index = self.lower_bound(key)
+        if index < len(self) and self.get(index) == key:
+            return index
+        return None
+
+    def prefix_range(self, prefix: bytes) -> Tuple[int, int]:
+        """以prefix开头的字符串所在的区间[start, end)"""
+        if not prefix:
+            return 0, len(self)
+        # 前缀的后继：把最后一个字节加一（UTF-8中不会出现0xff）
+        return self.lower_bound(prefix), self.lower_bound(prefix[:-1] + bytes([prefix[-1] + 1]))
+
+    @staticmethod
+    def write(path: str, name: str, strings: List[bytes]) -> None:
+        offsets = np.zeros(len(strings) + 1, dtype=np.uint64)
+        np.cumsum([len(s) for s in strings], out=offsets[1:])
+        np.save(os.path.join(path, f"{name}.offsets.npy"), offsets)
+        with open(os.path.join(path, f"{name}.blob"), "wb") as f:
+            for s in strings:
+                f.write(s)
+
+    @classmethod
+    def load(cls, path: str, name: str) -> "_SortedStrings":
+        blob_path = os.path.join(path, f"{name}.blob")
+        blob = (
+            np.memmap(blob_path, dtype=np.uint8, mode="r")
+            if os.path.getsize(blob_path) else np.zeros(0, dtype=np.uint8)
+        )
+        return cls(blob, np.load(os.path.join(path, f"{name}.offsets.npy"), mmap_mode="r"))
+
+
+class SearchIndex:
+    """基于列式目录的本地全文检索索引
+
+    倒排表以CSR形式存放：词表按字节序排列，postings_offsets[t]到postings_offsets[t+1]
+    之间是词t出现的文档（即列式目录的行号）及其加权词频。排序使用BM25，
+    标题、原标题、简介的词频按字段权重累加。另有按字节序排列的标题表，
+    通过二分查找做前缀匹配，用于输入联想。所有数组均以内存映射方式打开。
+    """
+
+    FIELD_WEIGHTS = {"title": 2.0, "original_title": 1.5, "overview": 0.3}
+    K1 = 1.2
+    B = 0.75
+
+    # 前缀展开时每个前缀最多匹配的词数
+    MAX_PREFIX_TERMS = 50
+
+    _default_instance = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, path: str, columnar: ColumnarCatalog):
+        """
+        打开已构建的索引
+
+        参数:
+            path: 索引的版本子目录
+            columnar: 索引对应的列式目录（用于把行号转换为电影记录）
+        """
+        self.path = path
+        self.columnar = columnar
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.version = self.meta["version"]
+        self.avg_doc_len = self.meta["avg_doc_len"]
+        self.terms = _SortedStrings.load(path, "terms")
+        self.postings_offsets = np.load(os.path.join(path, "postings_offsets.npy"), mmap_mode="r")
+        self.postings_docs = np.load(os.path.join(path, "postings_docs.npy"), mmap_mode="r")
+        self.postings_tfs = np.load(os.path.join(path, "postings_tfs.npy"), mmap_mode="r")
+        self.doc_len = np.load(os.path.join(path, "doc_len.npy"), mmap_mode="r")
+        self.titles = _SortedStrings.load(path, "titles")
+        self.title_rows = np.load(os.path.join(path, "title_rows.npy"), mmap_mode="r")
+
+    @classmethod
+    def default(cls) -> Optional["SearchIndex"]:
+        """
+        获取与当前列式目录版本一致的共享索引（DATA_DIR/search_index）
+
+        返回:
+            SearchIndex实例，索引未构建或已落后于列式目录时返回None（调用方应回退到在线搜索）
+        """
+        columnar = ColumnarCatalog.default()
+        if columnar is None:
+            return None
+        path = os.path.join(os.environ.get("DATA_DIR", "data"), "search_index", f"v{columnar.version}")
+        with cls._default_lock:
+            instance = cls._default_instance
+            if instance is not None and instance.columnar is columnar:
+                return instance
+            if not os.path.exists(os.path.join(path, "meta.json")):
+                return None
+            instance = cls(path, columnar)
+            cls._default_instance = instance
+            return instance
+
+    @classmethod
+    def build(cls,
+              columnar: ColumnarCatalog,
+              directory: str,
+              include_overview: bool = False,
+              keep_versions: int = 2) -> "SearchIndex":
+        """
+        从列式目录构建索引
+
+        参数:
+            columnar: 列式目录
+            directory: 索引根目录，索引写入以目录版本号命名的子目录
+            include_overview: 是否索引简介（索引更大，召回更多）
+            keep_versions: 保留的历史版本数
+
+        返回:
+            SearchIndex实例
+        """
+        fields = [
+            (field, weight) for field, weight in cls.FIELD_WEIGHTS.items()
+            if include_overview or field != "overview"
+        ]
+        size = len(columnar)
+        doc_len = np.zeros(size, dtype=np.float32)
+        postings: Dict[str, Dict[int, float]] = {}
+        title_keys: List[Tuple[bytes, int]] = []
+
+        for row in range(size):
+            seen_titles = set()
+            for field, weight in fields:
+                text = columnar.get_string(field, row)
+                tokens = tokenize(text)
+                doc_len[row] += weight * len(tokens)
+                for token in tokens:
+                    term_docs = postings.setdefault(token, {})
+                    term_docs[row] = term_docs.get(row, 0.0) + weight
+                if field != "overview":
+                    key = normalize(text).strip()
+                    if key and key not in seen_titles:
+                        seen_titles.add(key)
+                        title_keys.append((key.encode("utf-8"), row))
+
+        terms = sorted(postings, key=lambda term: term.encode("utf-8"))
+        offsets = np.zeros(len(terms) + 1, dtype=np.uint64)
+        np.cumsum([len(postings[term]) for term in terms], out=offsets[1:])
+        docs = np.empty(int(offsets[-1]), dtype=np.int32)
+        tfs = np.empty(int(offsets[-1]), dtype=np.float32)
+        for index, term in enumerate(terms):
+            start, end = int(offsets[index]), int(offsets[index + 1])
+            term_docs = postings[term]
+            docs[start:end] = list(term_docs.keys())
+            tfs[start:end] = list(term_docs.values())
+        del postings
+        title_keys.sort()
+
+        name = f"v{columnar.version}"
+        target = os.path.join(directory, name)
+        staging = f"{target}.{os.getpid()}.tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        _SortedStrings.write(staging, "terms", [term.encode("utf-8") for term in terms])
+        np.save(os.path.join(staging, "postings_offsets.npy"), offsets)
+        np.save(os.path.join(staging, "postings_docs.npy"), docs)
+        np.save(os.path.join(staging, "postings_tfs.npy"), tfs)
+        np.save(os.path.join(staging, "doc_len.npy"), doc_len)
+        _SortedStrings.write(staging, "titles", [key for key, _ in title_keys])
+        np.save(os.path.join(staging, "title_rows.npy"), np.array([row for _, row in title_keys], dtype=np.int32))
+        meta = {
+            "version": columnar.version,
+            "size": size,
+            "fields": [field for field, _ in fields],
+            "avg_doc_len": float(doc_len.mean()) if size else 0.0
+        }
+        with open(os.path.join(staging, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(staging, target)
+        ColumnarCatalog.prune_versions(directory, keep_versions)
+        return cls(target, columnar)
+
+    def _term_postings(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        index = self.terms.find(term.encode("utf-8"))
+        if index is None:
+            return None
+        start, end = int(self.postings_offsets[index]), int(self.postings_offsets[index + 1])
+        return self.postings_docs[start:end], self.postings_tfs[start:end]
+
+    def _expand_prefix(self, prefix: str) -> List[str]:
+        """列出以prefix开头的词（最多MAX_PREFIX_TERMS个）"""
+        start, end = self.terms.prefix_range(prefix.encode("utf-8"))
+        end = min(end, start + self.MAX_PREFIX_TERMS)
+        return [self.terms.get(index).decode("utf-8") for index in range(start, end)]
+
+    def search_rows(self,
+                    query: str,
+                    limit: int = 20,
+                    include_adult: bool = False,
+                    min_coverage: float = 1.0) -> List[Tuple[int, float]]:
+        """
+        检索并按BM25得分排序
+
+        查询的最后一个词（输入尚未结束时）以及单个汉字按前缀匹配。
+        默认要求命中查询中的全部词，避免只沾边一两个词的电影排在结果里。
+
+        参数:
+            query: 查询文本
+            limit: 最多返回的结果数
+            include_adult: 是否包含成人内容
+            min_coverage: 电影至少要命中的查询词比例（0-1）
+
+        返回:
+            [(列式目录行号, 得分), ...]，按得分从高到低排列
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+        prefix_last = not query.endswith(" ")
+        size = len(self.doc_len)
+        scores = np.zeros(size, dtype=np.float32)
+        # 每部电影命中的查询词数（同一个词的多个前缀展开只算一次）
+        coverage = np.zeros(size, dtype=np.int16)
+        matched = False
+
+        for position, token in enumerate(tokens):
+            is_last = position == len(tokens) - 1
+            single_cjk = len(token) == 1 and _CJK_PATTERN.match(token)
+            if single_cjk or (is_last and prefix_last):
+                candidates = self._expand_prefix(token) or [token]
+            else:
+                candidates = [token]
+            token_hits = np.zeros(size, dtype=bool)
+            for term in candidates:
+                found = self._term_postings(term)
+                if found is None:
+                    continue
+                docs, tfs = found
+                matched = True
+                token_hits[docs] = True
+                idf = math.log(1 + (size - len(docs) + 0.5) / (len(docs) + 0.5))
+                norm = self.K1 * (1 - self.B + self.B * self.doc_len[docs] / (self.avg_doc_len or 1.0))
+                # 前缀展开出的词权重略低于精确匹配
+                weight = 1.0 if term == token else 0.8
+                np.add.at(scores, docs, weight * idf * tfs * (self.K1 + 1) / (tfs + norm))
+            coverage += token_hits
+
+        if not matched:
+            return []
+        scores[coverage < math.ceil(min_coverage * len(tokens))] = 0
+        if not include_adult:
+            scores[self.columnar.columns["adult"]] = 0
+        hits = np.flatnonzero(scores)
+        if len(hits) == 0:
+            return []
+        # 得分相同时热度高的靠前
+        ranked = scores[hits] + np.log1p(self.columnar.columns["popularity"][hits]) * 1e-3
+        k = min(limit, len(hits))
+        top = np.argpartition(-ranked, k - 1)[:k]
+        top = top[np.argsort(-ranked[top], kind="stable")]
+        return [(int(hits[i]), float(scores[hits[i]])) for i in top]
+
+    def search(self,
+               query: str,
+               limit: int = 20,
+               include_adult: bool = False,
+               min_coverage: float = 1.0) -> List[MovieSummary]:
+        """
+        检索电影
+
+        参数:
+            query: 查询文本
+            limit: 最多返回的结果数
+            include_adult: 是否包含成人内容
+            min_coverage: 电影至少要命中的查询词比例（0-1）
+
+        返回:
+            MovieSummary列表，按相关度排列
+        """
+        rows = [row for row, _ in self.search_rows(query, limit, include_adult, min_coverage)]
+        return self.columnar.movies(rows)
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[str]:
+        """
+        输入联想：返回以prefix开头的电影标题（按热度排列）
+
+        参数:
+            prefix: 已输入的文本
+            limit: 最多返回的条数
+
+        返回:
+            标题列表（同名电影只出现一次）
+        """
+        key = normalize(prefix).strip().encode("utf-8")
+        if not key:
+            return []
+        start, end = self.titles.prefix_range(key)
+        if start >= end:
+            return []
+        rows = np.unique(self.title_rows[start:min(end, start + 1000)])
+        popularity = self.columnar.columns["popularity"][rows]
+        suggestions = []
+        for i in np.argsort(-popularity, kind="stable"):
+            title = self.columnar.get_string("title", int(rows[i]))
+            if title not in suggestions:
+                suggestions.append(title)
+                if len(suggestions) >= limit:
+                    break
+        return suggestions
+
+
+def main():
+    """命令行入口：python -m utils.search_index build"""
+    parser = argparse.ArgumentParser(description="本地全文检索索引")
+    parser.add_argument("--directory", help="索引根目录，默认DATA_DIR/search_index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="从列式目录构建索引")
+    build.add_argument("--overview", action="store_true", help="同时索引简介")
+    query = subparsers.add_parser("query", help="在本地索引中检索")
+    query.add_argument("text")
+    args = parser.parse_args()
+
+    columnar = ColumnarCatalog.default()
+    if columnar is None:
+        print("还没有列式目录，请先运行 python -m utils.columnar build")
+        return
+    directory = args.directory or os.path.join(os.environ.get("DATA_DIR", "data"), "search_index")
+    if args.command == "build":
+        index = SearchIndex.build(columnar, directory, include_overview=args.overview)
+        print(f"索引已构建: {index.path}（{len(index.terms)} 个词，{len(index.postings_docs)} 条倒排记录）")
+    elif args.command == "query":
+        index = SearchIndex(os.path.join(directory, f"v{columnar.version}"), columnar)
+        for movie in index.search(args.text):
+            print(f"{movie.id}\t{movie.title}\t{movie.original_title}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+import argparse
+import json
+import math
+import os
+import shutil
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from utils.catalog import MovieCatalog
+from utils.columnar import ColumnarCatalog
+from utils.models import MovieSummary
+from utils.search_index import tokenize
+
+
+class SimilarityIndex:
+    """基于内容的相似电影索引（TF-IDF稀疏向量）
+
+    每部电影表示为简介词（中文二元组/英文单词）、类型、主演和导演组成的稀疏向量，
+    权重为 (1 + log词频) × 字段权重 × IDF，并做L2归一化，两部电影的相似度即向量的余弦。
+    向量同时按行（电影→特征，CSR）和按列（特征→电影，CSC）保存为.npy文件并通过内存映射打开；
+    查询时取出若干部电影的向量求和，再沿特征的倒排列表一次性累加出所有电影的得分。
+
+    行号与同一版本的列式目录一致，索引写入以目录版本号命名的子目录。
+    """
+
+    # 各字段的权重
+    FIELD_WEIGHTS = {
+        "overview": 1.0,
+        "genre": 0.6,
+        "cast": 1.2,
+        "director": 1.5
+    }
+
+    # 只出现在一部电影中的特征对相似度没有贡献；出现在超过该比例电影中的特征区分度太低
+    MAX_DF_RATIO = 0.2
+
+    _default_instance = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, path: str, columnar: ColumnarCatalog):
+        """
+        打开已构建的索引
+
+        参数:
+            path: 索引的版本子目录
+            columnar: 索引对应的列式目录（用于把行号转换为电影记录）
+        """
+        self.path = path
+        self.columnar = columnar
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.version = self.meta["version"]
+        self.size = self.meta["size"]
+        arrays = {}
+        for name in ("row_offsets", "row_features", "row_weights",
+                     "feature_offsets", "feature_rows", "feature_weights"):
+            arrays[name] = np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+        self.row_offsets = arrays["row_offsets"]
+        self.row_features = arrays["row_features"]
+        self.row_weights = arrays["row_weights"]
+        self.feature_offsets = arrays["feature_offsets"]
+        self.feature_rows = arrays["feature_rows"]
+        self.feature_weights = arrays["feature_weights"]
+
+    @classmethod
+    def default(cls) -> Optional["SimilarityIndex"]:
+        """
+        获取与当前列式目录版本一致的共享索引（DATA_DIR/similarity）
+
+        返回:
+            SimilarityIndex实例，索引未构建或已落后于列式目录时返回None（调用方应回退到在线推荐）
+        """
+        columnar = ColumnarCatalog.default()
+        if columnar is None:
+            return None
+        path = os.path.join(os.environ.get("DATA_DIR", "data"), "similarity", f"v{columnar.version}")
+        with cls._default_lock:
+            instance = cls._default_instance
+            if instance is not None and instance.columnar is columnar:
+                return instance
+            if not os.path.exists(os.path.join(path, "meta.json")):
+                return None
+            instance = cls(path, columnar)
+            cls._default_instance = instance
+            return instance
+
+    @classmethod
+    def movie_features(cls, movie: Dict) -> Dict[str, float]:
+        """
+        把目录中的一部电影转换为稀疏特征
+
+        参数:
+            movie: MovieCatalog返回的电影字典
+
+        返回:
+            {特征: 字段加权词频}，特征带字段前缀（w:简介词、g:类型、c:主演、d:导演）
+        """
+        features: Dict[str, float] = {}
+        counts = Counter(tokenize(movie["overview"]))
+        weight = cls.FIELD_WEIGHTS["overview"]
+        for token, count in counts.items():
+            features[f"w:{token}"] = weight * (1 + math.log(count))
+        for genre_id in movie["genre_ids"]:
+            features[f"g:{genre_id}"] = cls.FIELD_WEIGHTS["genre"]
+        for name in movie["top_cast"]:
+            features[f"c:{name}"] = cls.FIELD_WEIGHTS["cast"]
+        for name in movie["directors"]:
+            features[f"d:{name}"] = cls.FIELD_WEIGHTS["director"]
+        return features
+
+    @classmethod
+    def build(cls,
+              catalog: MovieCatalog,
+              columnar: ColumnarCatalog,
+              directory: str,
+              keep_versions: int = 2) -> "SimilarityIndex":
+        """
+        从本地目录构建索引
+
+        简介、主演和导演来自SQLite目录（列式目录中没有主演和导演），
+        只收录列式目录中存在的电影，行号与列式目录一致。
+
+        参数:
+            catalog: SQLite目录
+            columnar: 同一版本的列式目录
+            directory: 索引根目录，索引写入以目录版本号命名的子目录
+            keep_versions: 保留的历史版本数
+
+        返回:
+            SimilarityIndex实例
+        """
+        size = len(columnar)
+        vocabulary: Dict[str, int] = {}
+        rows: List[np.ndarray] = []
+        features: List[np.ndarray] = []
+        weights: List[np.ndarray] = []
+        for movie in catalog.iter_movies():
+            row = columnar.index_of(movie["id"])
+            if row is None:
+                continue
+            movie_features = cls.movie_features(movie)
+            if not movie_features:
+                continue
+            rows.append(np.full(len(movie_features), row, dtype=np.int32))
+            features.append(np.fromiter(
+                (vocabulary.setdefault(feature, len(vocabulary)) for feature in movie_features),
+                dtype=np.int32, count=len(movie_features)
+            ))
+            weights.append(np.fromiter(movie_features.values(), dtype=np.float32, count=len(movie_features)))
+
+        if rows:
+            row_ids = np.concatenate(rows)
+            feature_ids = np.concatenate(features)
+            values = np.concatenate(weights)
+        else:
+            row_ids = np.zeros(0, dtype=np.int32)
+            feature_ids = np.zeros(0, dtype=np.int32)
+            values = np.zeros(0, dtype=np.float32)
+        del rows, features, weights
+
+        # 文档频率过滤和IDF加权
+        df = np.bincount(feature_ids, minlength=len(vocabulary))
+        keep_feature = (df >= 2) & (df <= max(2, cls.MAX_DF_RATIO * size))
+        keep = keep_feature[feature_ids]
+        row_ids, feature_ids, values = row_ids[keep], feature_ids[keep], values[keep]
+        idf = np.log((1 + size) / (1 + df)).astype(np.float32) + 1
+        values = values * idf[feature_ids]
+        # 保留的特征重新编号为连续整数
+        remap = np.cumsum(keep_feature, dtype=np.int64) - 1
+        feature_ids = remap[feature_ids].astype(np.int32)
+        feature_count = int(keep_feature.sum())
+
+        # 每行做L2归一化
+        norms = np.sqrt(np.bincount(row_ids, weights=values.astype(np.float64) ** 2, minlength=size))
+        values = (values / np.maximum(norms[row_ids], 1e-12)).astype(np.float32)
+
+        # 按行排序得到CSR，按特征排序得到CSC
+        by_row = np.lexsort((feature_ids, row_ids))
+        row_offsets = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(row_ids, minlength=size), out=row_offsets[1:])
+        by_feature = np.argsort(feature_ids, kind="stable")
+        feature_offsets = np.zeros(feature_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(feature_ids, minlength=feature_count), out=feature_offsets[1:])
+
+        name = f"v{columnar.version}"
+        target = os.path.join(directory, name)
+        staging = f"{target}.{os.getpid()}.tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        arrays = {
+            "row_offsets": row_offsets,
+            "row_features": feature_ids[by_row],
+            "row_weights": values[by_row],
+            "feature_offsets": feature_offsets,
+            "feature_rows": row_ids[by_feature],
+            "feature_weights": values[by_feature]
+        }
+        for array_name, array in arrays.items():
+            np.save(os.path.join(staging, f"{array_name}.npy"), array)
+        meta = {
+            "version": columnar.version,
+            "size": size,
+            "features": feature_count,
+            "entries": int(len(values)),
+            "field_weights": cls.FIELD_WEIGHTS
+        }
+        with open(os.path.join(staging, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(staging, target)
+        ColumnarCatalog.prune_versions(directory, keep_versions)
+        return cls(target, columnar)
+
+    @staticmethod
+    def _gather(offsets: np.ndarray, keys: np.ndarray) -> np.ndarray:
+        """取出若干个CSR/CSC片段拼接后的下标（不做Python层循环）"""
+        starts = offsets[keys]
+        lengths = (offsets[keys + 1] - starts).astype(np.int64)
+        total = int(lengths.sum())
+        if total == 0:
+            return np.zeros(0, dtype=np.int64)
+        # 每个片段内的位置 = 全局序号 - 片段在结果中的起点 + 片段在源数组中的起点
+        shifts = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        return np.arange(total, dtype=np.int64) + shifts
+
+    def similar_rows(self,
+                     movie_ids: Iterable[int],
+                     limit: int = 20,
+                     include_adult: bool = False) -> List[Tuple[int, float]]:
+        """
+        查找与一部或一组电影最相似的电影
+
+        一组电影的查询向量为各自向量之和，即与整组的平均余弦相似度。
+
+        参数:
+            movie_ids: 电影ID（不在索引中的ID被忽略）
+            limit: 最多返回的结果数
+            include_adult: 是否包含成人内容
+
+        返回:
+            [(列式目录行号, 相似度), ...]，按相似度从高到低排列，不包含输入的电影
+        """
+        query_rows = [row for row in map(self.columnar.index_of, movie_ids) if row is not None]
+        if not query_rows:
+            return []
+        query_rows = np.unique(np.array(query_rows, dtype=np.int64))
+
+        entries = self._gather(self.row_offsets, query_rows)
+        if len(entries) == 0:
+            return []
+        query_features, inverse = np.unique(self.row_features[entries], return_inverse=True)
+        query_weights = np.bincount(inverse, weights=self.row_weights[entries]) / len(query_rows)
+
+        postings = self._gather(self.feature_offsets, query_features)
+        lengths = np.diff(self.feature_offsets)[query_features]
+        scores = np.bincount(
+            self.feature_rows[postings],
+            weights=self.feature_weights[postings] * np.repeat(query_weights, lengths),
+            minlength=self.size
+        ).astype(np.float32)
+
+        scores[query_rows] = 0
+        if not include_adult:
+            scores[self.columnar.columns["adult"]] = 0
+        hits = np.flatnonzero(scores)
+        if len(hits) == 0:
+            return []
+        k = min(limit, len(hits))
+        top = np.argpartition(-scores[hits], k - 1)[:k]
+        top = top[np.argsort(-scores[hits][top], kind="stable")]
+        return [(int(hits[i]), float(scores[hits[i]])) for i in top]
+
+    def similar_to(self, movie_id: int, limit: int = 20, include_adult: bool = False) -> List[MovieSummary]:
+        """
+        与一部电影最相似的电影
+
+        参数:
+            movie_id: 电影ID
+            limit: 最多返回的结果数
+            include_adult: 是否包含成人内容
+
+        返回:
+            电影摘要列表（release_date只有年份精度），电影不在索引中时为空列表
+        """
+        return self.columnar.movies(row for row, _ in self.similar_rows([movie_id], limit, include_adult))
+
+    def similar_with_scores(self,
+                            movie_ids: Iterable[int],
+                            limit: int = 20,
+                            include_adult: bool = False) -> List[Tuple[MovieSummary, float]]:
+        """
+        与一组电影整体最相似的电影及其相似度（供打分器作为先验分）
+
+        参数:
+            movie_ids: 电影ID
+            limit: 最多返回的结果数
+            include_adult: 是否包含成人内容
+
+        返回:
+            [(电影摘要, 相似度), ...]，按相似度从高到低排列，不包含输入的电影
+        """
+        return [(self.columnar.movie(row), score) for row, score in self.similar_rows(movie_ids, limit, include_adult)]
+
+
+def main():
+    """命令行入口：python -m utils.similarity build"""
+    parser = argparse.ArgumentParser(description="基于内容的相似电影索引")
+    parser.add_argument("--db", help="SQLite目录路径，默认DATA_DIR/catalog.db")
+    parser.add_argument("--directory", help="索引根目录，默认DATA_DIR/similarity")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("build", help="从本地目录构建索引")
+    query = subparsers.add_parser("query", help="查询相似电影")
+    query.add_argument("movie_ids", type=int, nargs="+")
+    args = parser.parse_args()
+
+    columnar = ColumnarCatalog.default()
+    if columnar is None:
+        print("还没有列式目录，请先运行 python -m utils.columnar build")
+        return
+    directory = args.directory or os.path.join(os.environ.get("DATA_DIR", "data"), "similarity")
+    if args.command == "build":
+        catalog = MovieCatalog(args.db) if args.db else MovieCatalog.default()
+        index = SimilarityIndex.build(catalog, columnar, directory)
+        print(f"索引已构建: {index.path}（{index.meta['features']} 个特征，{index.meta['entries']} 个非零项）")
+    elif args.command == "query":
+        index = SimilarityIndex(os.path.join(directory, f"v{columnar.version}"), columnar)
+        for row, score in index.similar_rows(args.movie_ids):
+            print(f"{score:.3f}\t{index.columnar.get_string('title', row)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import threading
+from typing import Dict, Any, Callable
+
+
+class _Call:
+    """一次进行中的调用"""
+
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """请求合并：同一键的并发调用共享一次实际执行的结果"""
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            "calls": 0,
+            "executions": 0,
+            "coalesced": 0
+        }
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """
+        执行fn，若已有相同键的调用正在进行，则等待并共享其结果
+
+        参数:
+            key: 调用键（例如请求的缓存键）
+            fn: 实际执行的无参函数
+
+        返回:
+            fn的返回值；fn抛出的异常会传递给所有等待者
+        """
+        with self._lock:
+            self.stats["calls"] += 1
+            call = self._calls.get(key)
+            if call is not None:
+                self.stats["coalesced"] += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.stats["executions"] += 1
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        获取合并统计
+
+        返回:
+            包含调用总数、实际执行次数和被合并次数的字典
+        """
+        with self._lock:
+            stats = dict(self.stats)
+            stats["in_flight"] = len(self._calls)
+        return stats